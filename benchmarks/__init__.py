@@ -0,0 +1,6 @@
+"""Benchmarks for pyhik.
+
+Run from the repository root, e.g.::
+
+    python -m benchmarks.bench_stream_parser
+"""
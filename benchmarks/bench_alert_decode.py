@@ -0,0 +1,68 @@
+"""
+Compare alert decoding: ET.fromstring + repeated finds vs decode_alert.
+"""
+
+import argparse
+import time
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+from pyhik.constants import ID_TYPES, XML_NAMESPACE
+from pyhik.stream import decode_alert
+
+from benchmarks.bench_stream_parser import build_stream
+
+
+def legacy(payload):
+    """Replicate the lookups process_stream used to make on a full tree."""
+    tree = ET.fromstring(payload)
+    query = '{%s}%%s' % XML_NAMESPACE
+    etype = tree.find(query % 'eventType').text
+    estate = tree.find(query % 'eventState').text
+    echid = None
+    for idtype in ID_TYPES:
+        echid = tree.find(query % idtype)
+        if echid is not None:
+            try:
+                echid = int(echid.text)
+                break
+            except (ValueError, TypeError):
+                pass
+    ecount = tree.find(query % 'activePostCount').text
+    return etype, estate, echid, int(ecount)
+
+
+def decoded(payload):
+    event = decode_alert(payload)
+    return event.event_type, event.state, event.channel, event.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for padding in (0, 10, 100):
+        pad = build_stream(1, 1, padding)
+        pad = pad[pad.index(b'<EventNotificationAlert'):].rstrip()
+        payload = memoryview(pad)
+        assert legacy(payload) == decoded(payload)
+        results = []
+        for func in (legacy, decoded):
+            best = 0.0
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for _ in range(args.events):
+                    func(payload)
+                best = max(best, args.events / (time.perf_counter() - start))
+            results.append(best)
+        print('%6d bytes: legacy %8.0f/s  decode_alert %8.0f/s  (x%.2f)' % (
+            len(payload), results[0], results[1], results[1] / results[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Measure per-device overhead of AsyncHikCamera against threaded HikCamera.
+
+A child process serves an alertStream with a videoloss heartbeat on every
+connection. N cameras of each flavour are connected to it and the number of
+threads and traced Python memory per device are reported.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import threading
+import time
+import tracemalloc
+
+from pyhik.aio import AsyncHikCamera
+from pyhik.hikvision import HikCamera
+
+HEARTBEAT = (
+    b'--boundary\r\n'
+    b'Content-Type: application/xml; charset="UTF-8"\r\n\r\n'
+    b'<EventNotificationAlert version="2.0" '
+    b'xmlns="http://www.hikvision.com/ver20/XMLSchema">'
+    b'<channelID>1</channelID><eventType>videoloss</eventType>'
+    b'<eventState>inactive</eventState><activePostCount>0</activePostCount>'
+    b'</EventNotificationAlert>\r\n'
+)
+
+
+def serve(port_queue, interval):
+    """Serve an endless heartbeat stream on every connection."""
+
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\n'
+                         b'Content-Type: multipart/mixed; boundary=boundary\r\n'
+                         b'\r\n')
+            while True:
+                writer.write(HEARTBEAT)
+                await writer.drain()
+                await asyncio.sleep(interval)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0,
+                                            backlog=4096)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+class BenchMixin:
+    """Skip device discovery."""
+
+    def initialize(self):
+        self.name = 'bench'
+        self.cam_id = 'bench'
+
+
+class BenchAsyncCamera(BenchMixin, AsyncHikCamera):
+    pass
+
+
+class BenchCamera(BenchMixin, HikCamera):
+    pass
+
+
+def report(label, devices, threads, memory, elapsed):
+    print('%-6s %5d devices: %6.2f threads/device, %8.1f KiB/device, '
+          'connect %.2fs' % (label, devices, threads / devices,
+                             memory / devices / 1024, elapsed))
+
+
+async def run_async(port, devices, settle):
+    threads = threading.active_count()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    cameras = [BenchAsyncCamera(host='127.0.0.1', port=port)
+               for _ in range(devices)]
+    for camera in cameras:
+        camera.start_stream()
+    await asyncio.sleep(settle)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0] - base
+    report('async', devices, threading.active_count() - threads, memory,
+           elapsed)
+    tracemalloc.stop()
+    await asyncio.gather(*(camera.async_disconnect() for camera in cameras))
+
+
+def run_threads(port, devices, settle):
+    threads = threading.active_count()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    cameras = [BenchCamera(host='127.0.0.1', port=port)
+               for _ in range(devices)]
+    for camera in cameras:
+        camera.start_stream()
+    time.sleep(settle)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0] - base
+    report('thread', devices, threading.active_count() - threads, memory,
+           elapsed)
+    tracemalloc.stop()
+    for camera in cameras:
+        camera.kill_thrd.set()
+    for camera in cameras:
+        camera.thrd.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between heartbeats per connection')
+    parser.add_argument('--settle', type=float, default=3.0)
+    parser.add_argument('--skip-threads', action='store_true')
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve,
+                                     args=(port_queue, args.interval),
+                                     daemon=True)
+    server.start()
+    port = port_queue.get()
+    try:
+        asyncio.run(run_async(port, args.devices, args.settle))
+        if not args.skip_threads:
+            run_threads(port, args.devices, args.settle)
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
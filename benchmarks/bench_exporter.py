@@ -0,0 +1,72 @@
+"""
+Measure OpenMetricsExporter.render time for a fleet of devices.
+
+Each device has populated stream metrics, an ISAPIClient's request metrics
+and 8 channels of 4 event types.
+"""
+
+import argparse
+import random
+import time
+
+from pyhik.exporter import OpenMetricsExporter
+from pyhik.metrics import (
+    MetricsRegistry, RequestMetrics, STREAM_COUNTERS, StreamMetrics)
+from pyhik.state import EventStateTable
+
+EVENTS = ('Motion', 'Line Crossing', 'Video Loss', 'Tamper Detection')
+
+
+class FleetDevice(object):
+    """Camera stand-in holding metrics and event states."""
+
+    def __init__(self, name, channels, rand):
+        self.metrics = StreamMetrics(name)
+        for counter in STREAM_COUNTERS:
+            setattr(self.metrics, counter, rand.randrange(1 << 32))
+        for _ in range(100):
+            self.metrics.parse_time.observe(rand.random() * 0.001)
+            self.metrics.callback_time.observe(rand.random() * 0.01)
+            self.metrics.event_age.observe(rand.random() * 0.1)
+        self.requests = RequestMetrics(name)
+        self.requests.requests = rand.randrange(1000)
+        self.event_states = EventStateTable()
+        for event in EVENTS:
+            for channel in range(1, channels + 1):
+                self.event_states.add(event, channel, rand.random() < 0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, nargs='+',
+                        default=[100, 1000, 5000])
+    parser.add_argument('--channels', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rand = random.Random(1)
+    for count in args.devices:
+        streams = MetricsRegistry(StreamMetrics)
+        requests = MetricsRegistry(RequestMetrics)
+        devices = [FleetDevice('10.%d.%d.%d' % (i >> 16, (i >> 8) & 255,
+                                                 i & 255), args.channels, rand)
+                   for i in range(count)]
+        for device in devices:
+            streams.register(device.metrics)
+            requests.register(device.requests)
+        for with_states in (False, True):
+            exporter = OpenMetricsExporter(
+                streams, requests, cameras=devices if with_states else None)
+            exporter.render()
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                text = exporter.render()
+                best = min(best, time.perf_counter() - start)
+            print('%5d devices%s: %7.2f ms  %6d lines  %8d bytes' % (
+                count, ' + event states' if with_states else '',
+                best * 1e3, text.count('\n'), len(text)))
+
+
+if __name__ == '__main__':
+    main()
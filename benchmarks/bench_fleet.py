@@ -0,0 +1,137 @@
+"""
+Load-test pyhik against a fleet of simulated devices.
+
+Starts benchmarks.nvr_simulator with N virtual devices in a child process
+and measures, from this process:
+
+* HikCamera construction (deviceInfo, triggers, motionDetection) per device,
+  sequentially and with a thread pool
+* ISAPIClient.get_device_info + get_cameras per device
+* get_video_channels per device
+* steady state of all alertStreams: threads, RSS and CPU per second
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import multiprocessing
+import resource
+import threading
+import time
+
+from benchmarks.nvr_simulator import Simulator, make_devices
+from pyhik.fleet import disconnect_all
+from pyhik.hikvision import HikCamera, get_video_channels
+from pyhik.isapi import ISAPIClient
+
+
+def _serve(queue, count, kwargs):
+    async def main():
+        simulator = Simulator(make_devices(count, **kwargs))
+        queue.put(await simulator.start())
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def start_simulator(count, **kwargs):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve,
+                                      args=(queue, count, kwargs),
+                                      daemon=True)
+    process.start()
+    return process, queue.get(timeout=600)
+
+
+def timed(label, func, items, workers):
+    start = time.perf_counter()
+    failures = 0
+    results = []
+    if workers > 1:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            outcomes = list(pool.map(_capture(func), items))
+    else:
+        outcomes = [_capture(func)(item) for item in items]
+    for ok, value in outcomes:
+        if ok:
+            results.append(value)
+        else:
+            failures += 1
+    elapsed = time.perf_counter() - start
+    print('%-28s %5d devices, %3d workers: %7.2fs total, %7.2f ms/device, '
+          '%d failed' % (label, len(items), workers, elapsed,
+                         elapsed / max(1, len(items)) * 1e3, failures))
+    return results
+
+
+def _capture(func):
+    def run(item):
+        try:
+            return True, func(item)
+        except Exception as err:  # pylint: disable=broad-except
+            return False, err
+    return run
+
+
+def rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--auth', default='digest')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--settle', type=float, default=5.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    process, ports = start_simulator(
+        args.devices, channels=args.channels, auth=args.auth,
+        latency=args.latency, failure_rate=args.failure_rate)
+    print('simulator: %d devices started in %.2fs' % (
+        len(ports), time.perf_counter() - start))
+
+    def camera(port):
+        return HikCamera('127.0.0.1', port, 'admin', 'password')
+
+    def client(port):
+        with ISAPIClient('127.0.0.1', port, 'admin', 'password') as isapi:
+            isapi.get_device_info()
+            return isapi.get_cameras()
+
+    def channels(port):
+        return get_video_channels('127.0.0.1', port, 'admin', 'password')
+
+    try:
+        sample = ports[:min(len(ports), 50)]
+        timed('HikCamera (sequential)', camera, sample, 1)
+        cameras = timed('HikCamera (pool)', camera, ports, args.workers)
+        timed('ISAPIClient', client, ports, args.workers)
+        timed('get_video_channels', channels, ports, args.workers)
+
+        threads = threading.active_count()
+        rss = rss_mib()
+        for cam in cameras:
+            cam.start_stream()
+        time.sleep(args.settle)
+        cpu = time.process_time()
+        time.sleep(args.settle)
+        cpu = time.process_time() - cpu
+        print('steady state: %d streams, +%d threads, max RSS %.0f -> %.0f '
+              'MiB, %.1f%% CPU' % (len(cameras),
+                                   threading.active_count() - threads, rss,
+                                   rss_mib(), cpu / args.settle * 100))
+        start = time.perf_counter()
+        stuck = disconnect_all(cameras, timeout=30)
+        print('disconnect_all: %.2fs, %d stuck' % (
+            time.perf_counter() - start, len(stuck)))
+    finally:
+        process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Replay a recorded alertStream capture through HikCamera and report throughput.
+
+Record a capture from a live device with HikCamera.start_capture(path), or
+with the record sub-command below, then replay it as often as needed:
+
+    python -m benchmarks.bench_replay record http://nvr admin pass out.cap
+    python -m benchmarks.bench_replay replay out.cap --repeat 20
+    python -m benchmarks.bench_replay replay out.cap --realtime --speed 10
+"""
+
+import argparse
+import time
+
+from pyhik.capture import RECORD_DATA, load_capture, replay_into_camera
+from pyhik.constants import SENSOR_MAP
+from pyhik.hikvision import HikCamera
+
+
+class ReplayCamera(HikCamera):
+    """Camera that tracks every known event type without a device."""
+
+    def __init__(self, channels):
+        self._channels = channels
+        self.alerts = 0
+        super().__init__(host='replay')
+
+    def initialize(self):
+        self.name = 'replay'
+        self.cam_id = 'replay'
+        self.inject_events({etype: range(1, self._channels + 1)
+                            for etype in set(SENSOR_MAP.values())})
+
+    def process_event(self, event, pictures=0):
+        self.alerts += 1
+        super().process_event(event, pictures)
+
+
+def record(args):
+    camera = HikCamera(host=args.host, usr=args.user, pwd=args.password)
+    capture = camera.start_capture(args.output)
+    camera.start_stream()
+    try:
+        time.sleep(args.duration)
+    except KeyboardInterrupt:
+        pass
+    camera.disconnect()
+    camera.stop_capture()
+    print('captured %d records, %d bytes' % (capture.records, capture.bytes))
+
+
+def run_replay(args):
+    records = load_capture(args.capture)
+    data = sum(len(r.data) for r in records if r.kind == RECORD_DATA)
+    camera = ReplayCamera(args.channels)
+    cpu = time.process_time()
+    elapsed = 0.0
+    for _ in range(args.repeat):
+        elapsed += replay_into_camera(camera, records, args.realtime,
+                                      args.speed)['elapsed']
+    cpu = time.process_time() - cpu
+    print('%d records, %d bytes x %d: %d alerts in %.3fs, %.0f alerts/s, '
+          '%.1f MB/s, %.1f us cpu/alert' % (
+              len(records), data, args.repeat, camera.alerts, elapsed,
+              camera.alerts / elapsed, data * args.repeat / elapsed / 1e6,
+              cpu / max(1, camera.alerts) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record', help='capture a live alertStream')
+    rec.add_argument('host')
+    rec.add_argument('user')
+    rec.add_argument('password')
+    rec.add_argument('output')
+    rec.add_argument('--duration', type=float, default=60.0)
+    rec.set_defaults(func=record)
+    rep = sub.add_parser('replay', help='replay a capture')
+    rep.add_argument('capture')
+    rep.add_argument('--repeat', type=int, default=1)
+    rep.add_argument('--realtime', action='store_true',
+                     help='keep the recorded pacing')
+    rep.add_argument('--speed', type=float, default=1.0,
+                     help='pacing multiplier with --realtime')
+    rep.add_argument('--channels', type=int, default=32)
+    rep.set_defaults(func=run_replay)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Measure how ShardSupervisor scales alert processing with worker processes.
+
+Every device is a HikCamera fed a prebuilt alertStream body straight into
+feed_stream, so the numbers cover framing, decoding, state tracking and
+the batched channel back to the parent, without any network. Reports
+changes/s received by the parent for each worker count.
+"""
+
+import argparse
+import threading
+import time
+
+from benchmarks.bench_stream_parser import ALERT
+from pyhik.hikvision import HikCamera
+from pyhik.shard import ShardSupervisor
+from pyhik.stream import AlertStreamParser
+
+
+def build_stream(alerts, channels):
+    """Return a multipart body toggling every sensor on each pass."""
+    parts = []
+    for index in range(alerts):
+        payload = ALERT.format(
+            channel=(index % channels) + 1,
+            event='linedetection' if index % 3 else 'VMD', padding='')
+        if (index // channels) % 2:
+            payload = payload.replace('>active<', '>inactive<')
+        payload = payload.encode()
+        parts.append(b'--boundary\r\n'
+                     b'Content-Type: application/xml; charset="UTF-8"\r\n'
+                     b'Content-Length: %d\r\n\r\n' % len(payload)
+                     + payload + b'\r\n')
+    return b''.join(parts)
+
+
+class ReplayCamera(HikCamera):
+    """Camera replaying a stream body in a loop instead of connecting."""
+
+    def __init__(self, config):
+        self._alerts = config['alerts']
+        self._channels = config['channels']
+        self._stop = threading.Event()
+        super().__init__(host=config['host'])
+
+    def initialize(self):
+        self.name = self.cam_id = self.host
+        channels = range(1, self._channels + 1)
+        self.inject_events({'Motion': channels, 'Line Crossing': channels})
+
+    def start_stream(self):
+        threading.Thread(target=self._replay, daemon=True).start()
+
+    def _replay(self):
+        body = build_stream(self._alerts, self._channels)
+        parser = AlertStreamParser()
+        while not self._stop.is_set():
+            self.feed_stream(parser, body)
+
+    def stop_stream(self):
+        self._stop.set()
+
+    def join_stream(self, timeout=None):
+        return True
+
+
+def run(workers, devices, alerts, channels, seconds):
+    configs = [{'host': 'dev%d' % index, 'alerts': alerts,
+                'channels': channels} for index in range(devices)]
+    supervisor = ShardSupervisor(configs, workers=workers,
+                                 factory=ReplayCamera)
+    supervisor.start()
+    try:
+        time.sleep(1.0)
+        start, received = time.perf_counter(), supervisor.events_received
+        time.sleep(seconds)
+        elapsed = time.perf_counter() - start
+        return (supervisor.events_received - received) / elapsed
+    finally:
+        supervisor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', default='1,2,4',
+                        help='comma separated worker counts')
+    parser.add_argument('--devices', type=int, default=16)
+    parser.add_argument('--alerts', type=int, default=200,
+                        help='alerts per replayed body')
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in (int(item) for item in args.workers.split(',')):
+        rate = run(workers, args.devices, args.alerts, args.channels,
+                   args.seconds)
+        baseline = baseline or rate
+        print('%2d workers: %10.0f changes/s  (x%.2f)'
+              % (workers, rate, rate / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Compare alertStream framing throughput: legacy iter_lines vs AlertStreamParser.
+
+Both paths parse every framed alert with ElementTree so the numbers reflect
+events/sec per core for the whole framing + parse stage.
+"""
+
+import argparse
+import io
+import time
+import xml.etree.ElementTree as ET
+
+import requests
+
+from pyhik.constants import STREAM_CHUNK_SIZE
+from pyhik.stream import AlertStreamParser
+
+ALERT = (
+    '<EventNotificationAlert version="2.0" '
+    'xmlns="http://www.hikvision.com/ver20/XMLSchema">\r\n'
+    '<ipAddress>192.168.1.64</ipAddress>\r\n'
+    '<portNo>80</portNo>\r\n'
+    '<protocol>HTTP</protocol>\r\n'
+    '<macAddress>44:19:b6:00:00:00</macAddress>\r\n'
+    '<channelID>{channel}</channelID>\r\n'
+    '<dateTime>2026-10-16T12:00:00+00:00</dateTime>\r\n'
+    '<activePostCount>1</activePostCount>\r\n'
+    '<eventType>{event}</eventType>\r\n'
+    '<eventState>active</eventState>\r\n'
+    '<eventDescription>{event} alarm</eventDescription>\r\n'
+    '{padding}'
+    '</EventNotificationAlert>\r\n'
+)
+
+
+def build_stream(events, channels, padding):
+    """Return a multipart alertStream body with the given number of events."""
+    out = io.BytesIO()
+    pad = ''.join(
+        '<DetectionRegionEntry><regionID>{0}</regionID>'
+        '<sensitivityLevel>50</sensitivityLevel></DetectionRegionEntry>\r\n'
+        .format(i) for i in range(padding))
+    for i in range(events):
+        payload = ALERT.format(
+            channel=(i % channels) + 1,
+            event='linedetection' if i % 3 else 'VMD',
+            padding=pad).encode()
+        out.write(b'--boundary\r\n'
+                  b'Content-Type: application/xml; charset="UTF-8"\r\n'
+                  b'Content-Length: %d\r\n\r\n' % len(payload))
+        out.write(payload)
+        out.write(b'\r\n')
+    return out.getvalue()
+
+
+def legacy(data):
+    """Replicate the original iter_lines based framing loop."""
+    response = requests.models.Response()
+    response.raw = io.BytesIO(data)
+    count = 0
+    start_event = False
+    parse_string = ""
+    for line in response.iter_lines():
+        if line:
+            str_line = line.decode("utf-8", "ignore")
+            if str_line.find('<EventNotificationAlert') != -1:
+                start_event = True
+                parse_string = str_line
+            elif str_line.find('</EventNotificationAlert>') != -1:
+                parse_string += str_line
+                start_event = False
+                if parse_string:
+                    ET.fromstring(parse_string)
+                    count += 1
+                    parse_string = ""
+            else:
+                if start_event:
+                    parse_string += str_line
+    return count
+
+
+def incremental(data, chunk_size=STREAM_CHUNK_SIZE):
+    """Frame with AlertStreamParser reading fixed size chunks."""
+    parser = AlertStreamParser()
+    raw = io.BytesIO(data)
+    count = 0
+    while True:
+        chunk = raw.read1(chunk_size)
+        if not chunk:
+            return count
+        for _, payload in parser.feed(chunk):
+            ET.fromstring(payload)
+            count += 1
+
+
+def measure(func, data, events):
+    """Return events/sec for func over data."""
+    start = time.perf_counter()
+    count = func(data)
+    elapsed = time.perf_counter() - start
+    assert count == events, (func.__name__, count)
+    return events / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--channels', type=int, default=32)
+    parser.add_argument('--padding', type=int, default=0,
+                        help='extra XML elements per alert to grow its size')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = build_stream(args.events, args.channels, args.padding)
+    print('%d events, %.1f KiB/alert' % (
+        args.events, len(data) / args.events / 1024))
+    for func in (legacy, incremental):
+        rate = max(measure(func, data, args.events) for _ in range(args.repeat))
+        print('%-12s %10.0f events/s' % (func.__name__, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Measure alert_stream + process_event throughput against the load generator.
+
+Starts benchmarks.loadgen in a child process, connects threaded HikCamera
+instances to it and reports, for the measurement window:
+
+* alerts/s decoded and callbacks/s fired
+* p50/p99 latency from a chunk arriving in feed_stream to the callback
+* p50/p99 latency from the generator's send time (dateTime) to the callback
+* client CPU per alert
+* with --trace-alloc, traced bytes allocated per alert (tracemalloc peak
+  growth) and net allocated blocks per alert; tracing slows everything
+  down, so rates from that run are not comparable.
+"""
+
+import argparse
+import datetime
+import sys
+import time
+import tracemalloc
+
+from benchmarks.loadgen import DEFAULT_MIX, parse_mix, start_process
+from pyhik.constants import SENSOR_MAP
+from pyhik.hikvision import HikCamera
+
+
+class BenchCamera(HikCamera):
+    """Camera tracking the generator's event mix without discovery."""
+
+    def __init__(self, stats, channels, mix, **kwargs):
+        self._stats = stats
+        self._channels = channels
+        self._mix = mix
+        self._received = 0.0
+        self._sent = None
+        super().__init__(**kwargs)
+
+    def initialize(self):
+        self.name = 'bench'
+        self.cam_id = 'bench'
+        self.inject_events({SENSOR_MAP[event]: range(1, self._channels + 1)
+                            for event in self._mix})
+        self.add_update_callback(self._on_update, '*.*.*')
+
+    def feed_stream(self, parser, data):
+        self._received = time.perf_counter()
+        super().feed_stream(parser, data)
+
+    def process_event(self, event, pictures=0):
+        self._stats.alerts += 1
+        self._sent = event.date_time
+        super().process_event(event, pictures)
+
+    def _on_update(self, msg):
+        stats = self._stats
+        stats.callbacks += 1
+        if stats.recording:
+            stats.latency.append(time.perf_counter() - self._received)
+            if self._sent:
+                sent = datetime.datetime.fromisoformat(self._sent)
+                stats.wire.append(
+                    (datetime.datetime.now(datetime.timezone.utc)
+                     - sent).total_seconds())
+
+
+class Stats(object):
+    def __init__(self):
+        self.alerts = 0
+        self.callbacks = 0
+        self.recording = False
+        self.latency = []
+        self.wire = []
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(args):
+    mix = args.mix
+    process, port = start_process(rate=args.rate, channels=args.channels,
+                                  mix=mix)
+    stats = Stats()
+    cameras = [BenchCamera(stats, args.channels, mix, host='127.0.0.1',
+                           port=port, usr='admin', pwd='pass')
+               for _ in range(args.cameras)]
+    try:
+        for camera in cameras:
+            camera.start_stream()
+        time.sleep(args.warmup)
+
+        if args.trace_alloc:
+            tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+        alerts, callbacks = stats.alerts, stats.callbacks
+        cpu = time.process_time()
+        stats.recording = True
+        start = time.perf_counter()
+        time.sleep(args.duration)
+        stats.recording = False
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        alerts = stats.alerts - alerts
+        callbacks = stats.callbacks - callbacks
+        blocks = sys.getallocatedblocks() - blocks
+        if args.trace_alloc:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    finally:
+        for camera in cameras:
+            camera.stop_stream()
+        for camera in cameras:
+            camera.join_stream(5)
+        process.terminate()
+
+    offered = args.rate * args.cameras
+    print('%d cameras x %.0f alerts/s (%.0f offered), %d channels, mix %s'
+          % (args.cameras, args.rate, offered, args.channels,
+             ','.join('%s=%g' % item for item in mix.items())))
+    print('  alerts/s    %10.0f' % (alerts / elapsed))
+    print('  callbacks/s %10.0f' % (callbacks / elapsed))
+    print('  cpu/alert   %10.1f us' % (cpu / max(1, alerts) * 1e6))
+    print('  chunk->callback p50 %7.1f us  p99 %7.1f us' % (
+        percentile(stats.latency, 50) * 1e6,
+        percentile(stats.latency, 99) * 1e6))
+    print('  send->callback  p50 %7.2f ms  p99 %7.2f ms' % (
+        percentile(stats.wire, 50) * 1e3, percentile(stats.wire, 99) * 1e3))
+    print('  net blocks/alert %7.2f' % (blocks / max(1, alerts)))
+    if args.trace_alloc:
+        print('  traced peak bytes/alert %7.1f' % (peak / max(1, alerts)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=500.0,
+                        help='alerts per second per camera')
+    parser.add_argument('--channels', type=int, default=16)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='event weights, e.g. vmd=4,linedetection=2,'
+                             'videoloss=1,io=1')
+    parser.add_argument('--warmup', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--trace-alloc', action='store_true')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
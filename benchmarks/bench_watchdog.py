@@ -0,0 +1,104 @@
+"""
+Compare the shared-scheduler Watchdog with the old Timer-per-pet version.
+
+Each camera's watchdog is petted at a fixed rate from a single feeder thread,
+the way process_stream pets it for every tracked alert. The number of
+threads started and the process CPU time are reported for both.
+"""
+
+import argparse
+import threading
+import time
+
+from pyhik.scheduler import DeadlineScheduler
+from pyhik.watchdog import Watchdog
+
+
+class TimerWatchdog(object):
+    """The previous implementation: a new threading.Timer on every pet."""
+
+    def __init__(self, timeout, handler):
+        self.time = timeout
+        self.handler = handler
+        self._timer = None
+
+    def start(self):
+        self._timer = threading.Timer(self.time, self.handler)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def pet(self):
+        self.stop()
+        self.start()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+class ThreadCounter(object):
+    """Count Thread.start calls while active."""
+
+    def __init__(self):
+        self.count = 0
+        self._start = threading.Thread.start
+
+    def __enter__(self):
+        counter = self
+        original = self._start
+
+        def start(thread):
+            counter.count += 1
+            original(thread)
+
+        threading.Thread.start = start
+        return self
+
+    def __exit__(self, *exc):
+        threading.Thread.start = self._start
+
+
+def run(label, factory, cameras, pets, rate):
+    watchdogs = [factory() for _ in range(cameras)]
+    interval = 1.0 / rate
+    with ThreadCounter() as counter:
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        for watchdog in watchdogs:
+            watchdog.start()
+        for _ in range(pets):
+            for watchdog in watchdogs:
+                watchdog.pet()
+            time.sleep(interval)
+        for watchdog in watchdogs:
+            watchdog.stop()
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+    total = cameras * pets
+    print('%-9s %6d pets: %7d threads started, cpu %6.3fs (%5.1f us/pet), '
+          'wall %5.2fs' % (label, total, counter.count, cpu,
+                           cpu / total * 1e6, wall))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cameras', type=int, default=50)
+    parser.add_argument('--pets', type=int, default=100,
+                        help='pets per camera')
+    parser.add_argument('--rate', type=float, default=50.0,
+                        help='pet rounds per second')
+    args = parser.parse_args()
+
+    def handler():
+        pass
+
+    run('timer', lambda: TimerWatchdog(300.0, handler), args.cameras,
+        args.pets, args.rate)
+    scheduler = DeadlineScheduler()
+    run('scheduler', lambda: Watchdog(300.0, handler, scheduler=scheduler),
+        args.cameras, args.pets, args.rate)
+    scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
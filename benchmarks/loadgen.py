@@ -0,0 +1,194 @@
+"""
+Synthetic alertStream load generator.
+
+Serves an endless multipart EventNotificationAlert stream on every
+connection, at a configurable rate, event mix and channel count. Alerts for
+each event type and channel alternate between active and inactive so every
+tracked alert is a state change. Videoloss alerts are inactive heartbeats,
+like the ones real devices send. Each alert carries its send time in
+dateTime with microseconds.
+
+Run standalone to point real clients at it:
+
+    python -m benchmarks.loadgen --port 8080 --rate 200 --channels 16
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import multiprocessing
+import random
+
+DEFAULT_MIX = {'vmd': 4, 'linedetection': 2, 'videoloss': 1, 'io': 1}
+
+ALERT = (
+    '<EventNotificationAlert version="2.0" '
+    'xmlns="http://www.hikvision.com/ver20/XMLSchema">\r\n'
+    '<ipAddress>127.0.0.1</ipAddress>\r\n'
+    '<portNo>80</portNo>\r\n'
+    '<protocol>HTTP</protocol>\r\n'
+    '<macAddress>44:19:b6:00:00:00</macAddress>\r\n'
+    '<{id_tag}>{channel}</{id_tag}>\r\n'
+    '<dateTime>{{date_time}}</dateTime>\r\n'
+    '<activePostCount>{count}</activePostCount>\r\n'
+    '<eventType>{event}</eventType>\r\n'
+    '<eventState>{state}</eventState>\r\n'
+    '<eventDescription>{event} alarm</eventDescription>\r\n'
+    '</EventNotificationAlert>\r\n'
+)
+
+RESPONSE_HEAD = (b'HTTP/1.1 200 OK\r\n'
+                 b'Content-Type: multipart/mixed; boundary=boundary\r\n'
+                 b'Connection: close\r\n\r\n')
+
+# Alerts are written in batches this many times a second
+TICKS_PER_SECOND = 100
+
+
+def parse_mix(text):
+    """Parse 'vmd=4,io=1' into an event mix."""
+    mix = {}
+    for item in text.split(','):
+        event, _, weight = item.partition('=')
+        mix[event.strip()] = float(weight or 1)
+    return mix
+
+
+class AlertSource(object):
+    """Produce multipart alert parts for one connection."""
+
+    def __init__(self, channels=4, mix=None, seed=None):
+        self.channels = channels
+        self.mix = dict(mix or DEFAULT_MIX)
+        self._random = random.Random(seed)
+        self._events = list(self.mix)
+        self._weights = [self.mix[event] for event in self._events]
+        self._states = {}
+        self._templates = {}
+        self.sent = 0
+
+    def _template(self, event, channel, active):
+        key = (event, channel, active)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = ALERT.format(
+                id_tag='inputIOPortID' if event == 'io' else 'channelID',
+                channel=channel, event=event, count=int(active),
+                state='active' if active else 'inactive')
+        return template
+
+    def part(self, now=None):
+        """Return the next alert as a multipart part."""
+        event = self._random.choices(self._events, self._weights)[0]
+        channel = self._random.randint(1, self.channels)
+        if event == 'videoloss':
+            active = False
+        else:
+            active = not self._states.get((event, channel), False)
+            self._states[(event, channel)] = active
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        payload = self._template(event, channel, active).format(
+            date_time=now.isoformat()).encode()
+        self.sent += 1
+        return (b'--boundary\r\n'
+                b'Content-Type: application/xml; charset="UTF-8"\r\n'
+                b'Content-Length: %d\r\n\r\n' % len(payload)
+                + payload + b'\r\n')
+
+    def batch(self, count):
+        """Return count parts sharing one timestamp."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return b''.join(self.part(now) for _ in range(count))
+
+
+class LoadGenerator(object):
+    """asyncio HTTP stand-in serving alertStreams at a fixed rate."""
+
+    def __init__(self, rate=10.0, channels=4, mix=None, host='127.0.0.1',
+                 port=0, seed=None):
+        self.rate = rate
+        self.channels = channels
+        self.mix = mix
+        self.host = host
+        self.port = port
+        self._seeds = itertools.count(seed or 0)
+        self._server = None
+
+    async def start(self):
+        """Start listening and return the bound port."""
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        source = AlertSource(self.channels, self.mix, next(self._seeds))
+        loop = asyncio.get_running_loop()
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(RESPONSE_HEAD)
+            start = loop.time()
+            tick = 1.0 / TICKS_PER_SECOND
+            while True:
+                due = int((loop.time() - start) * self.rate) - source.sent
+                if due > 0:
+                    writer.write(source.batch(due))
+                    await writer.drain()
+                await asyncio.sleep(tick)
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+
+def _serve(port_queue, kwargs):
+    async def main():
+        generator = LoadGenerator(**kwargs)
+        port_queue.put(await generator.start())
+        await generator.serve_forever()
+
+    asyncio.run(main())
+
+
+def start_process(**kwargs):
+    """Run a LoadGenerator in a child process, returning (process, port)."""
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve,
+                                      args=(port_queue, kwargs), daemon=True)
+    process.start()
+    return process, port_queue.get(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--rate', type=float, default=10.0,
+                        help='alerts per second per connection')
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='event weights, e.g. vmd=4,linedetection=2,'
+                             'videoloss=1,io=1')
+    args = parser.parse_args()
+    generator = LoadGenerator(args.rate, args.channels, args.mix,
+                              args.host, args.port)
+    try:
+        asyncio.run(generator.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
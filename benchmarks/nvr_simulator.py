@@ -0,0 +1,644 @@
+"""
+Virtual Hikvision NVR/camera ISAPI simulator.
+
+Implements the endpoints pyhik uses (deviceInfo, Event/triggers,
+motionDetection, Streaming channels and pictures, ContentMgmt search,
+InputProxy channels, IO ports, Holidays, Storage, httpHosts, Smart event
+configs and the alertStream) with Basic or Digest authentication, latency
+injection and failure injection. Any number of devices can be served from
+one event loop, each on its own port:
+
+    python -m benchmarks.nvr_simulator --devices 2000 --base-port 20000 \\
+        --channels 16 --auth digest --latency 0.005 --failure-rate 0.01
+
+Use ``SimulatorThread`` to run devices in the background of a test or
+benchmark.
+"""
+
+import argparse
+import asyncio
+import base64
+import datetime
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.loadgen import AlertSource
+
+XMLNS = 'http://www.hikvision.com/ver20/XMLSchema'
+ISAPI_XMLNS = 'http://www.isapi.org/ver20/XMLSchema'
+
+AUTH_BASIC = 'basic'
+AUTH_DIGEST = 'digest'
+AUTH_NONE = 'none'
+
+# Failure modes
+FAIL_ERROR = 'error'      # 500 response
+FAIL_DROP = 'drop'        # close the connection without a response
+FAIL_HANG = 'hang'        # never respond
+
+# Smallest valid JPEG, enough for clients that only check the content type
+JPEG = bytes.fromhex(
+    'ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707'
+    '070909080a0c140d0c0b0b0c1912130f141d1a1f1e1d1a1c1c20242e2720222c231c'
+    '1c2837292c30313434341f27393d38323c2e333432ffc0000b080001000101011100'
+    'ffc4001f0000010501010101010100000000000000000102030405060708090a0bff'
+    'c400b5100002010303020403050504040000017d01020300041105122131410613'
+    '516107227114328191a1082342b1c11552d1f02433627282090a161718191a2526'
+    '2728292a3435363738393a434445464748494a535455565758595a636465666768'
+    '696a737475767778797a838485868788898a92939495969798999aa2a3a4a5a6a7'
+    'a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3'
+    'e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9faffda0008010100003f00fbd3ffd9')
+
+STATUS_TEXT = {200: 'OK', 401: 'Unauthorized', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+SMART_EVENTS = {
+    'LineDetection': 'LineDetection',
+    'FieldDetection': 'FieldDetection',
+    'RegionEntrance': 'RegionEntrance',
+    'RegionExiting': 'RegionExiting',
+    'SceneChangeDetection': 'SceneChangeDetection',
+    'FaceDetect': 'FaceDetection',
+}
+
+TRIGGER_EVENTS = ('VMD', 'linedetection', 'fielddetection', 'tamperdetection')
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class VirtualDevice(object):
+    """Configuration and state of one simulated device."""
+
+    def __init__(self, serial, channels=4, nvr=None, auth=AUTH_DIGEST,
+                 username='admin', password='password', latency=0.0,
+                 failure_rate=0.0, failure_mode=FAIL_ERROR, fail_paths=(),
+                 alert_rate=0.0, io_inputs=1, io_outputs=1, seed=None):
+        self.serial = serial
+        self.channels = channels
+        self.nvr = channels > 1 if nvr is None else nvr
+        self.auth = auth
+        self.username = username
+        self.password = password
+        # Seconds, or a (low, high) range
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.fail_paths = tuple(fail_paths)
+        self.alert_rate = alert_rate
+        self.io_inputs = io_inputs
+        self.io_outputs = io_outputs
+        self.realm = 'DS-%s' % serial
+        self.motion = {ch: True for ch in range(1, channels + 1)}
+        self.smart = {}
+        self.outputs = {port: False for port in range(1, io_outputs + 1)}
+        self.holiday = False
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._nonces = set()
+
+    # Injection
+
+    def delay(self):
+        if isinstance(self.latency, (tuple, list)):
+            return self._random.uniform(*self.latency)
+        return self.latency
+
+    def should_fail(self, path):
+        if any(path.startswith(prefix) for prefix in self.fail_paths):
+            return True
+        return self.failure_rate > 0 \
+            and self._random.random() < self.failure_rate
+
+    # Authentication
+
+    def challenge(self):
+        if self.auth == AUTH_BASIC:
+            return 'Basic realm="%s"' % self.realm
+        nonce = os.urandom(16).hex()
+        self._nonces.add(nonce)
+        if len(self._nonces) > 1024:
+            self._nonces.pop()
+        return ('Digest qop="auth", realm="%s", nonce="%s", '
+                'stale="FALSE"' % (self.realm, nonce))
+
+    def authorized(self, method, header):
+        if self.auth == AUTH_NONE:
+            return True
+        if not header:
+            return False
+        scheme, _, value = header.partition(' ')
+        scheme = scheme.lower()
+        if scheme == 'basic' and self.auth == AUTH_BASIC:
+            try:
+                user, _, pwd = base64.b64decode(value).decode().partition(':')
+            except ValueError:
+                return False
+            return user == self.username and pwd == self.password
+        if scheme == 'digest' and self.auth == AUTH_DIGEST:
+            fields = dict(re.findall(r'(\w+)="?([^",]*)"?', value))
+            if fields.get('nonce') not in self._nonces \
+                    or fields.get('username') != self.username:
+                return False
+            ha1 = _md5('%s:%s:%s' % (self.username, self.realm,
+                                     self.password))
+            ha2 = _md5('%s:%s' % (method, fields.get('uri', '')))
+            if fields.get('qop'):
+                expected = _md5(':'.join((ha1, fields['nonce'],
+                                          fields.get('nc', ''),
+                                          fields.get('cnonce', ''),
+                                          fields['qop'], ha2)))
+            else:
+                expected = _md5('%s:%s:%s' % (ha1, fields['nonce'], ha2))
+            return fields.get('response') == expected
+        return False
+
+    # Endpoints
+
+    def route(self, method, path, query, body):
+        """Return (status, content_type, body) for a request."""
+        parts = [part for part in path.split('/') if part]
+        if parts[:1] == ['ISAPI']:
+            parts = parts[1:]
+        key = '/'.join(parts)
+        if key == 'System/deviceInfo':
+            return self._xml(self.device_info())
+        if key == 'Event/triggers':
+            return self._xml(self.triggers())
+        if key == 'System/Video/inputs/channels':
+            if self.nvr:
+                return 404, 'text/plain', b''
+            return self._xml(self.video_inputs())
+        if key == 'ContentMgmt/InputProxy/channels':
+            if not self.nvr:
+                return 404, 'text/plain', b''
+            return self._xml(self.input_proxy())
+        if key == 'Streaming/channels':
+            return self._xml(self.streaming_channels())
+        if parts[-1:] == ['picture'] and (
+                parts[:-2] == ['Streaming', 'channels']
+                or parts[:-2] == ['ContentMgmt', 'StreamingProxy',
+                                  'channels']):
+            if self._stream_channel(parts[-2]) is None:
+                return 404, 'text/plain', b''
+            return 200, 'image/jpeg', JPEG
+        if len(parts) == 6 and parts[:4] == ['System', 'Video', 'inputs',
+                                             'channels'] \
+                and parts[5] in ('motionDetection', 'tamperDetection'):
+            return self._detection(method, parts[4], parts[5], body)
+        if len(parts) == 3 and parts[0] == 'Smart' \
+                and parts[1] in SMART_EVENTS:
+            return self._smart(method, parts[1], parts[2], body)
+        if key == 'Smart/capabilities':
+            return self._xml('<SmartCap xmlns="%s"><isSupportLineDetection>'
+                             'true</isSupportLineDetection></SmartCap>'
+                             % XMLNS)
+        if key == 'ContentMgmt/search' and method == 'POST':
+            return self._xml(self.search(body))
+        if key == 'ContentMgmt/Storage':
+            return self._xml(self.storage())
+        if key == 'System/IO/inputs':
+            return self._xml(self.io_ports('Input', self.io_inputs))
+        if key == 'System/IO/outputs':
+            return self._xml(self.io_ports('Output', self.io_outputs))
+        if len(parts) == 5 and parts[:3] == ['System', 'IO', 'outputs']:
+            return self._output(method, parts[3], parts[4], body)
+        if key == 'System/Holidays':
+            return self._holidays(method, body)
+        if key == 'Event/notification/httpHosts':
+            return self._xml(
+                '<HttpHostNotificationList xmlns="%s"><HttpHostNotification>'
+                '<id>1</id><url>/</url><protocolType>HTTP</protocolType>'
+                '<ipAddress>0.0.0.0</ipAddress><portNo>80</portNo>'
+                '</HttpHostNotification></HttpHostNotificationList>' % XMLNS)
+        if key == 'System/reboot' and method == 'PUT':
+            return self._ok()
+        return 404, 'text/plain', b''
+
+    def device_info(self):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<DeviceInfo version="2.0" xmlns="%s">'
+            '<deviceName>Virtual %s</deviceName>'
+            '<deviceID>%s</deviceID>'
+            '<model>%s</model>'
+            '<serialNumber>%s</serialNumber>'
+            '<macAddress>44:19:b6:%02x:%02x:%02x</macAddress>'
+            '<firmwareVersion>V4.62.210</firmwareVersion>'
+            '<deviceType>%s</deviceType>'
+            '</DeviceInfo>' % (
+                XMLNS, self.serial, self.serial,
+                'DS-7616NI-I2' if self.nvr else 'DS-2CD2385G1-I',
+                self.serial, hash(self.serial) & 0xff,
+                (hash(self.serial) >> 8) & 0xff,
+                (hash(self.serial) >> 16) & 0xff,
+                'NVR' if self.nvr else 'IPCamera'))
+
+    def triggers(self):
+        entries = []
+        for channel in range(1, self.channels + 1):
+            for event in TRIGGER_EVENTS:
+                entries.append(
+                    '<EventTrigger><id>%s-%d</id><eventType>%s</eventType>'
+                    '<videoInputChannelID>%d</videoInputChannelID>'
+                    '<EventTriggerNotificationList><EventTriggerNotification>'
+                    '<id>center</id><notificationMethod>center'
+                    '</notificationMethod></EventTriggerNotification>'
+                    '</EventTriggerNotificationList></EventTrigger>'
+                    % (event, channel, event, channel))
+        for port in range(1, self.io_inputs + 1):
+            entries.append(
+                '<EventTrigger><id>IO-%d</id><eventType>IO</eventType>'
+                '<inputIOPortID>%d</inputIOPortID>'
+                '<EventTriggerNotificationList><EventTriggerNotification>'
+                '<id>center</id><notificationMethod>center'
+                '</notificationMethod></EventTriggerNotification>'
+                '</EventTriggerNotificationList></EventTrigger>' % (port, port))
+        return ('<EventNotification version="2.0" xmlns="%s">'
+                '<EventTriggerList>%s</EventTriggerList>'
+                '</EventNotification>' % (XMLNS, ''.join(entries)))
+
+    def video_inputs(self):
+        return ('<VideoInputChannelList xmlns="%s">%s</VideoInputChannelList>'
+                % (XMLNS, ''.join(
+                    '<VideoInputChannel><id>%d</id><inputPort>%d</inputPort>'
+                    '<name>Camera %02d</name><videoInputEnabled>true'
+                    '</videoInputEnabled></VideoInputChannel>'
+                    % (ch, ch, ch) for ch in range(1, self.channels + 1))))
+
+    def input_proxy(self):
+        return ('<InputProxyChannelList xmlns="%s">%s</InputProxyChannelList>'
+                % (XMLNS, ''.join(
+                    '<InputProxyChannel><id>%d</id><name>Camera %02d</name>'
+                    '<sourceInputPortDescriptor><proxyProtocol>HIKVISION'
+                    '</proxyProtocol><ipAddress>10.0.0.%d</ipAddress>'
+                    '</sourceInputPortDescriptor></InputProxyChannel>'
+                    % (ch, ch, ch) for ch in range(1, self.channels + 1))))
+
+    def streaming_channels(self):
+        return ('<StreamingChannelList xmlns="%s">%s</StreamingChannelList>'
+                % (XMLNS, ''.join(
+                    '<StreamingChannel><id>%d%02d</id>'
+                    '<channelName>Camera %02d</channelName>'
+                    '<enabled>true</enabled></StreamingChannel>'
+                    % (ch, stream, ch)
+                    for ch in range(1, self.channels + 1)
+                    for stream in (1, 2))))
+
+    def search(self, body):
+        text = body.decode('utf-8', 'replace')
+        track = re.search(r'<trackID>(\d+)</trackID>', text)
+        times = re.findall(r'<(startTime|endTime)>([^<]+)</', text)
+        limit = re.search(r'<maxResults>(\d+)</maxResults>', text)
+        search_id = re.search(r'<searchID>([^<]*)</searchID>', text)
+        span = dict(times)
+        try:
+            start = datetime.datetime.fromisoformat(
+                span['startTime'].rstrip('Z'))
+            end = datetime.datetime.fromisoformat(span['endTime'].rstrip('Z'))
+        except (KeyError, ValueError):
+            return '<CMSearchResult xmlns="%s"><responseStatus>false' \
+                   '</responseStatus></CMSearchResult>' % XMLNS
+        track_id = int(track.group(1)) if track else 101
+        limit = int(limit.group(1)) if limit else 100
+        items = []
+        # One hour of recording every day at 08:00
+        day = start.replace(hour=8, minute=0, second=0, microsecond=0)
+        if day < start:
+            day += datetime.timedelta(days=1)
+        while day < end and len(items) < limit:
+            stop = day + datetime.timedelta(hours=1)
+            items.append(
+                '<searchMatchItem><sourceID>{%s}</sourceID>'
+                '<trackID>%d</trackID><timeSpan>'
+                '<startTime>%sZ</startTime><endTime>%sZ</endTime></timeSpan>'
+                '<mediaSegmentDescriptor><contentType>video</contentType>'
+                '<playbackURI>rtsp://127.0.0.1/Streaming/tracks/%d/'
+                '?starttime=%sZ</playbackURI></mediaSegmentDescriptor>'
+                '</searchMatchItem>' % (
+                    self.serial, track_id, day.isoformat(), stop.isoformat(),
+                    track_id, day.strftime('%Y%m%dT%H%M%S')))
+            day += datetime.timedelta(days=1)
+        return ('<CMSearchResult version="2.0" xmlns="%s">'
+                '<searchID>%s</searchID><responseStatus>true</responseStatus>'
+                '<responseStatusStrg>OK</responseStatusStrg>'
+                '<numOfMatches>%d</numOfMatches>'
+                '<matchList>%s</matchList></CMSearchResult>' % (
+                    XMLNS, search_id.group(1) if search_id else '',
+                    len(items), ''.join(items)))
+
+    def storage(self):
+        return ('<storage xmlns="%s"><hddList><hdd><id>1</id>'
+                '<hddName>hdd1</hddName><status>ok</status>'
+                '<capacity>3815447</capacity><freeSpace>1024</freeSpace>'
+                '</hdd></hddList></storage>' % XMLNS)
+
+    def io_ports(self, kind, count):
+        return ('<IO%sPortList xmlns="%s">%s</IO%sPortList>' % (
+            kind, XMLNS, ''.join(
+                '<IO%sPort><id>%d</id><%sName>%s %d</%sName></IO%sPort>' % (
+                    kind, port, kind.lower(), kind, port, kind.lower(), kind)
+                for port in range(1, count + 1)), kind))
+
+    def _detection(self, method, channel, name, body):
+        try:
+            channel = int(channel)
+        except ValueError:
+            return 404, 'text/plain', b''
+        if channel not in self.motion:
+            return 404, 'text/plain', b''
+        if name == 'tamperDetection':
+            return self._xml('<TamperDetection xmlns="%s"><enabled>false'
+                             '</enabled></TamperDetection>' % XMLNS)
+        if method == 'PUT':
+            match = re.search(rb'<enabled>(\w+)</enabled>', body)
+            if match is None:
+                return 400, 'text/plain', b''
+            self.motion[channel] = match.group(1) == b'true'
+            return self._ok()
+        return self._xml(
+            '<MotionDetection version="2.0" xmlns="%s"><enabled>%s</enabled>'
+            '<enableHighlight>false</enableHighlight>'
+            '<samplingInterval>2</samplingInterval></MotionDetection>'
+            % (XMLNS, 'true' if self.motion[channel] else 'false'))
+
+    def _smart(self, method, name, channel, body):
+        key = (name, channel)
+        if method == 'PUT':
+            match = re.search(rb'<enabled>(\w+)</enabled>', body)
+            self.smart[key] = bool(match and match.group(1) == b'true')
+            return self._ok()
+        tag = SMART_EVENTS[name]
+        return self._xml('<%s xmlns="%s"><id>%s</id><enabled>%s</enabled>'
+                         '</%s>' % (tag, XMLNS, channel,
+                                    'true' if self.smart.get(key) else 'false',
+                                    tag))
+
+    def _output(self, method, port, action, body):
+        try:
+            port = int(port)
+        except ValueError:
+            return 404, 'text/plain', b''
+        if port not in self.outputs:
+            return 404, 'text/plain', b''
+        if action == 'status':
+            return self._xml('<IOPortStatus xmlns="%s"><ioPortID>%d'
+                             '</ioPortID><ioPortType>output</ioPortType>'
+                             '<ioState>%s</ioState></IOPortStatus>' % (
+                                 XMLNS, port,
+                                 'active' if self.outputs[port]
+                                 else 'inactive'))
+        if action == 'trigger' and method == 'PUT':
+            self.outputs[port] = b'high' in body
+            return self._ok()
+        return 404, 'text/plain', b''
+
+    def _holidays(self, method, body):
+        if method == 'PUT':
+            match = re.search(rb'<enabled>(\w+)</enabled>', body)
+            self.holiday = bool(match and match.group(1) == b'true')
+            return self._ok()
+        return self._xml(
+            '<HolidayList version="2.0" xmlns="%s"><holiday><id>1</id>'
+            '<enabled>%s</enabled><holidayName>Holiday</holidayName>'
+            '<holidayMode>week</holidayMode></holiday></HolidayList>'
+            % (XMLNS, 'true' if self.holiday else 'false'))
+
+    def _stream_channel(self, stream_id):
+        try:
+            stream_id = int(stream_id)
+        except ValueError:
+            return None
+        # Cameras also accept bare stream numbers such as 1 and 2
+        channel = stream_id // 100 if stream_id >= 100 else 1
+        return channel if 1 <= channel <= self.channels else None
+
+    @staticmethod
+    def _xml(text):
+        return 200, 'application/xml; charset="UTF-8"', text.encode()
+
+    @staticmethod
+    def _ok():
+        return 200, 'application/xml', (
+            '<ResponseStatus version="2.0" xmlns="%s"><statusCode>1'
+            '</statusCode><statusString>OK</statusString></ResponseStatus>'
+            % ISAPI_XMLNS).encode()
+
+
+class Simulator(object):
+    """Serve many VirtualDevices from one asyncio loop, one port each."""
+
+    def __init__(self, devices: List[VirtualDevice], host='127.0.0.1',
+                 base_port=0):
+        self.devices = devices
+        self.host = host
+        self.base_port = base_port
+        self.ports: Dict[int, VirtualDevice] = {}
+        self._servers = []
+        self._tasks = set()
+
+    async def start(self):
+        """Listen for every device; port 0 picks free ports."""
+        for index, device in enumerate(self.devices):
+            port = self.base_port + index if self.base_port else 0
+            server = await asyncio.start_server(
+                lambda r, w, d=device: self._handle(d, r, w),
+                self.host, port, backlog=128)
+            self._servers.append(server)
+            self.ports[server.sockets[0].getsockname()[1]] = device
+        return list(self.ports)
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+
+    async def _handle(self, device, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    return
+                method, target, headers, body = request
+                device.requests += 1
+                path = urlsplit(target).path
+                delay = device.delay()
+                if delay:
+                    await asyncio.sleep(delay)
+                if device.should_fail(path):
+                    device.failures += 1
+                    if device.failure_mode == FAIL_DROP:
+                        return
+                    if device.failure_mode == FAIL_HANG:
+                        await reader.read()
+                        return
+                    _write_response(writer, 500, 'text/plain', b'')
+                    await writer.drain()
+                    continue
+                if not device.authorized(method, headers.get('authorization')):
+                    _write_response(writer, 401, 'text/html', b'',
+                                    {'WWW-Authenticate': device.challenge()})
+                    await writer.drain()
+                    continue
+                if path.endswith('/Event/notification/alertStream'):
+                    await self._alert_stream(device, writer)
+                    return
+                status, content_type, payload = device.route(
+                    method, path, urlsplit(target).query, body)
+                _write_response(writer, status, content_type, payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError):
+            pass
+        finally:
+            self._tasks.discard(task)
+            writer.close()
+
+    async def _alert_stream(self, device, writer):
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: multipart/mixed; boundary=boundary\r\n'
+                     b'Connection: close\r\n\r\n')
+        source = AlertSource(device.channels, seed=hash(device.serial))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        heartbeat = AlertSource(1, {'videoloss': 1})
+        next_heartbeat = start
+        while True:
+            now = loop.time()
+            if device.alert_rate:
+                due = int((now - start) * device.alert_rate) - source.sent
+                if due > 0:
+                    writer.write(source.batch(due))
+            if now >= next_heartbeat:
+                writer.write(heartbeat.batch(1))
+                next_heartbeat = now + 10
+            await writer.drain()
+            await asyncio.sleep(0.05 if device.alert_rate else 1)
+
+
+async def _read_request(reader) -> Optional[Tuple[str, str, Dict, bytes]]:
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode('latin-1').split('\r\n')
+    method, target, _ = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0) or 0)
+    body = await reader.readexactly(length) if length else b''
+    return method, target, headers, body
+
+
+def _write_response(writer, status, content_type, body, extra=None):
+    head = ['HTTP/1.1 %d %s' % (status, STATUS_TEXT.get(status, 'Error')),
+            'Content-Type: %s' % content_type,
+            'Content-Length: %d' % len(body)]
+    for name, value in (extra or {}).items():
+        head.append('%s: %s' % (name, value))
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+
+
+def make_devices(count, **kwargs):
+    """Return count VirtualDevices with serials DS0000001, DS0000002..."""
+    return [VirtualDevice('DS%07d' % (index + 1), seed=index, **kwargs)
+            for index in range(count)]
+
+
+class SimulatorThread(object):
+    """Run a Simulator on a background event loop thread."""
+
+    def __init__(self, devices, host='127.0.0.1', base_port=0):
+        self.simulator = Simulator(devices, host, base_port)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever,
+                                        name='nvr-simulator', daemon=True)
+
+    @property
+    def ports(self):
+        return list(self.simulator.ports)
+
+    def start(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(
+            self.simulator.start(), self.loop).result()
+        return self.ports
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(
+            self.simulator.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=20000)
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--auth', choices=(AUTH_BASIC, AUTH_DIGEST, AUTH_NONE),
+                        default=AUTH_DIGEST)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-mode', default=FAIL_ERROR,
+                        choices=(FAIL_ERROR, FAIL_DROP, FAIL_HANG))
+    parser.add_argument('--alert-rate', type=float, default=0.0,
+                        help='alerts per second on each alertStream')
+    args = parser.parse_args()
+
+    devices = make_devices(
+        args.devices, channels=args.channels, auth=args.auth,
+        username=args.username, password=args.password,
+        latency=args.latency, failure_rate=args.failure_rate,
+        failure_mode=args.failure_mode, alert_rate=args.alert_rate)
+
+    async def run():
+        simulator = Simulator(devices, args.host, args.base_port)
+        start = time.perf_counter()
+        ports = await simulator.start()
+        print('%d devices on %s:%d-%d (started in %.2fs)' % (
+            len(ports), args.host, min(ports), max(ports),
+            time.perf_counter() - start))
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
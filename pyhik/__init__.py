@@ -8,6 +8,13 @@ from pyhik.hikvision import (
     RecordingDay,
     VideoChannel,
 )
+from pyhik.aio import AsyncHikCamera, AsyncEventHub
+from pyhik.dispatch import DispatchExecutor
+from pyhik.endpoints import EndpointCache
+from pyhik.exporter import OpenMetricsExporter
+from pyhik.fleet import async_bootstrap, bootstrap, disconnect_all
+from pyhik.router import CallbackRouter, SensorEvent
+from pyhik.shard import ShardSupervisor
 from pyhik.constants import __version__, VALID_NOTIFICATION_METHODS
 from pyhik.isapi import (
     ISAPIClient,
@@ -35,6 +42,21 @@ __all__ = [
     'VideoChannel',
     'VALID_NOTIFICATION_METHODS',
     '__version__',
+    # asyncio event streams
+    'AsyncHikCamera',
+    'AsyncEventHub',
+    # Fleet operations
+    'bootstrap',
+    'async_bootstrap',
+    'disconnect_all',
+    'ShardSupervisor',
+    'EndpointCache',
+    # Callback dispatch
+    'DispatchExecutor',
+    'CallbackRouter',
+    'SensorEvent',
+    # Metrics
+    'OpenMetricsExporter',
     # ISAPI client
     'ISAPIClient',
     'ISAPIError',
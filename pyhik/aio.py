@@ -0,0 +1,597 @@
+"""
+pyhik.aio
+~~~~~~~~~~~~~~~~~~~~
+asyncio event stream engine for many Hikvision devices on one loop.
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import asyncio
+import base64
+import concurrent.futures
+import hashlib
+import logging
+import os
+import re
+import ssl
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from requests.auth import HTTPDigestAuth
+from requests.utils import parse_dict_header
+
+from pyhik.capture import NOTE_CONNECT
+from pyhik.constants import (
+    CONNECT_TIMEOUT, DISCONNECT_TIMEOUT, READ_TIMEOUT)
+from pyhik.endpoints import (
+    ALERT_STREAM, ALERT_STREAM_PATH, ALT_ALERT_STREAM_PATH)
+from pyhik.hikvision import HikCamera
+from pyhik.stream import AlertStreamParser
+
+_LOGGING = logging.getLogger(__name__)
+
+_DIGEST_PREFIX = re.compile(r'digest ', flags=re.IGNORECASE)
+_DIGEST_HASHES = {'MD5': hashlib.md5, 'SHA-256': hashlib.sha256}
+
+
+class LoopWatchdog(object):
+    """Watchdog timer driven by the running event loop.
+
+    Mirrors the start/pet/stop interface of pyhik.watchdog.Watchdog without
+    creating a thread per camera. Petting only records the time; the single
+    scheduled callback re-arms itself until the timeout has really elapsed.
+    """
+
+    def __init__(self, timeout, handler):
+        """Initialize watchdog variables."""
+        self.time = timeout
+        self.handler = handler
+        self._loop = None
+        self._handle = None
+        self._deadline = 0.0
+
+    def start(self):
+        """Start the watchdog timer."""
+        self._loop = asyncio.get_running_loop()
+        self._deadline = self._loop.time() + self.time
+        if self._handle is None:
+            self._handle = self._loop.call_at(self._deadline, self._expire)
+
+    def pet(self):
+        """Reset watchdog timer."""
+        if self._handle is None:
+            self.start()
+        else:
+            self._deadline = self._loop.time() + self.time
+
+    def stop(self):
+        """Stop the watchdog timer."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _expire(self):
+        if self._loop.time() < self._deadline:
+            self._handle = self._loop.call_at(self._deadline, self._expire)
+            return
+        self._handle = None
+        self.handler()
+
+
+class LoopScheduler(object):
+    """DeadlineScheduler interface on top of an asyncio event loop.
+
+    Lets stale event expiry of AsyncHikCamera run on the camera's loop
+    rather than on the shared scheduler thread.
+    """
+
+    def __init__(self, loop):
+        """Initialize scheduler for the given loop."""
+        self._loop = loop
+
+    def time(self):
+        """Return the loop clock."""
+        return self._loop.time()
+
+    def call_at(self, deadline, callback):
+        """Run callback at the given loop time."""
+        call = _LoopCall(self._loop, callback)
+        call.reschedule(deadline)
+        return call
+
+    def call_later(self, delay, callback):
+        """Run callback after delay seconds."""
+        return self.call_at(self._loop.time() + delay, callback)
+
+
+class _LoopCall(object):
+    """ScheduledCall counterpart for LoopScheduler."""
+
+    __slots__ = ('deadline', 'callback', 'cancelled', '_loop', '_handle')
+
+    def __init__(self, loop, callback):
+        self.deadline = 0.0
+        self.callback = callback
+        self.cancelled = False
+        self._loop = loop
+        self._handle = None
+
+    @property
+    def active(self):
+        return not self.cancelled and self._handle is not None
+
+    def reschedule(self, deadline):
+        self.deadline = deadline
+        self.cancelled = False
+        if self._handle is None or deadline < self._handle.when():
+            if self._handle is not None:
+                self._handle.cancel()
+            self._handle = self._loop.call_at(deadline, self._fire)
+
+    def cancel(self):
+        self.cancelled = True
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _fire(self):
+        if self._loop.time() < self.deadline:
+            # Postponed since the loop timer was armed.
+            self._handle = self._loop.call_at(self.deadline, self._fire)
+            return
+        self._handle = None
+        self.callback()
+
+
+class _DigestChallenge(object):
+    """Digest credentials for the stream request (RFC 7616).
+
+    The stream request is written by hand, so the challenge from its 401
+    is answered here rather than through a requests session.
+    """
+
+    def __init__(self, usr, pwd, challenge: str):
+        """Parse the WWW-Authenticate header of a 401 response."""
+        self.usr = usr
+        self.pwd = pwd
+        self.params = parse_dict_header(
+            _DIGEST_PREFIX.sub('', challenge, count=1))
+        self.nonce_count = 0
+
+    def header(self, method: str, url: str) -> Optional[str]:
+        """Return the Authorization value for a request, if supported."""
+        params = self.params
+        algorithm = params.get('algorithm') or 'MD5'
+        sess = algorithm.upper().endswith('-SESS')
+        hash_func = _DIGEST_HASHES.get(
+            algorithm.upper()[:-5] if sess else algorithm.upper())
+        qops = [qop.strip() for qop in params.get('qop', '').split(',')
+                if qop.strip()]
+        if hash_func is None or (qops and 'auth' not in qops):
+            _LOGGING.error('Unsupported digest challenge: %s %s',
+                           algorithm, params.get('qop'))
+            return None
+
+        def digest(*parts):
+            return hash_func(':'.join(parts).encode()).hexdigest()
+
+        parsed = urlparse(url)
+        uri = parsed.path or '/'
+        if parsed.query:
+            uri += '?' + parsed.query
+        realm = params.get('realm', '')
+        nonce = params.get('nonce', '')
+        cnonce = os.urandom(8).hex()
+        ha1 = digest(self.usr or '', realm, self.pwd or '')
+        if sess:
+            ha1 = digest(ha1, nonce, cnonce)
+        ha2 = digest(method, uri)
+
+        fields = ['username="%s"' % self.usr, 'realm="%s"' % realm,
+                  'nonce="%s"' % nonce, 'uri="%s"' % uri]
+        if qops:
+            self.nonce_count += 1
+            nc = '%08x' % self.nonce_count
+            fields.append('response="%s"' % digest(
+                ha1, nonce, nc, cnonce, 'auth', ha2))
+        else:
+            fields.append('response="%s"' % digest(ha1, nonce, ha2))
+        if 'opaque' in params:
+            fields.append('opaque="%s"' % params['opaque'])
+        fields.append('algorithm="%s"' % algorithm)
+        if qops:
+            fields.append('qop="auth", nc=%s, cnonce="%s"' % (nc, cnonce))
+        return 'Digest ' + ', '.join(fields)
+
+
+async def _cancel_task(task, timeout=None):
+    """Cancel task and wait up to timeout seconds for it to finish."""
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    while not task.done():
+        # Cancellation can be swallowed by a read finishing at the same
+        # moment, so keep cancelling until the task really stops.
+        remaining = 1 if deadline is None else min(1, deadline - loop.time())
+        if remaining <= 0:
+            break
+        task.cancel()
+        await asyncio.wait({task}, timeout=remaining)
+
+
+class AsyncHikCamera(HikCamera):
+    """HikCamera whose alertStream runs as a coroutine.
+
+    Device discovery and the request based API are inherited unchanged,
+    only the alertStream long-poll and reconnect loop are replaced, so
+    ``event_states`` and callbacks behave exactly as on HikCamera.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialize device."""
+        self._task = None
+        self._writer = None
+        self._reset = False
+        self._digest_auth = None
+        super().__init__(*args, **kwargs)
+        self.watchdog = LoopWatchdog(self.watchdog.time, self.watchdog_handler)
+        self._read_timeout = LoopWatchdog(READ_TIMEOUT, self._read_timeout_handler)
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        """Construct a camera without blocking the event loop.
+
+        Device initialization performs blocking HTTP requests, so it is run
+        in the loop's default executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: cls(*args, **kwargs))
+
+    @property
+    def is_streaming(self):
+        """Return True while the stream coroutine is running."""
+        return self._task is not None and not self._task.done()
+
+    def start_stream(self):
+        """Schedule the stream coroutine on the running event loop."""
+        if self.is_streaming:
+            return
+        loop = asyncio.get_running_loop()
+        for call in self._stale_calls.values():
+            call.cancel()
+        self._stale_calls.clear()
+        if self.coalescer is not None:
+            self.coalescer.reset()
+        self.scheduler = LoopScheduler(loop)
+        self._task = loop.create_task(self.async_alert_stream())
+
+    def disconnect(self, timeout=DISCONNECT_TIMEOUT):
+        """Cancel the stream coroutine.
+
+        From another thread this waits up to timeout seconds (None waits
+        forever) and returns True once the coroutine has finished. On the
+        event loop thread it cannot wait; use async_disconnect() there.
+        """
+        self.begin_disconnect()
+        return self.join_stream(timeout)
+
+    def stop_stream(self):
+        """Ask the stream coroutine to stop without waiting for it."""
+        task = self._task
+        if task is None or task.done():
+            return
+        if self._on_loop(task):
+            task.cancel()
+        else:
+            task.get_loop().call_soon_threadsafe(task.cancel)
+
+    def join_stream(self, timeout=None):
+        """Return True once the stream coroutine has finished.
+
+        Meant for after stop_stream, whose cancellation it repeats if a
+        read swallowed it. Waits up to timeout seconds when called from
+        another thread; on the event loop thread it returns at once.
+        """
+        task = self._task
+        if task is None or task.done():
+            return True
+        loop = task.get_loop()
+        if self._on_loop(task) or not loop.is_running():
+            return False
+        waiter = asyncio.run_coroutine_threadsafe(
+            _cancel_task(task, timeout), loop)
+        try:
+            waiter.result()
+        except concurrent.futures.CancelledError:
+            pass
+        if not task.done():
+            _LOGGING.warning('Event stream task for %s did not stop '
+                             'within %ss', self.name, timeout)
+            return False
+        return True
+
+    def publish_later(self, etype, echid, coalesce=True):
+        """Publish a change found by a timer on the event loop.
+
+        Stale expiry and coalescing already run on the loop while the
+        stream runs, so callbacks stay there like those of alerts.
+        """
+        task = self._task
+        if task is None or task.get_loop().is_closed():
+            super().publish_later(etype, echid, coalesce)
+            return
+        publish = self.publish_changes if coalesce else self.publish_now
+        if self._on_loop(task):
+            publish(etype, echid)
+        else:
+            task.get_loop().call_soon_threadsafe(publish, etype, echid)
+
+    @staticmethod
+    def _on_loop(task):
+        """Return True if called on the event loop running task."""
+        try:
+            return asyncio.get_running_loop() is task.get_loop()
+        except RuntimeError:
+            return False
+
+    async def async_disconnect(self):
+        """Cancel the stream coroutine and wait for it to finish."""
+        _LOGGING.debug('Disconnecting from stream: %s', self.name)
+        self.close_subscriptions()
+        task, self._task = self._task, None
+        if task is None:
+            return
+        await _cancel_task(task)
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGING.debug('Event stream task for %s failed: %s',
+                           self.name, task.exception())
+        _LOGGING.debug('Event stream task for %s is stopped', self.name)
+
+    def watchdog_handler(self):
+        """Drop the connection if the watchdog expires."""
+        _LOGGING.debug('%s Watchdog expired. Resetting connection.', self.name)
+        self.metrics.watchdog_fires += 1
+        self.watchdog.stop()
+        self._reset = True
+        self._close_writer()
+
+    def _read_timeout_handler(self):
+        _LOGGING.debug('%s No data for %ss. Resetting connection.',
+                       self.name, READ_TIMEOUT)
+        self._reset = True
+        self._close_writer()
+
+    def _close_writer(self):
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+
+    async def async_alert_stream(self):
+        """Open event stream and process it until cancelled."""
+        _LOGGING.debug('Stream Task Started: %s, %s', self.name, self.cam_id)
+        parser = AlertStreamParser()
+        fail_count = 0
+        path = self._endpoint(ALERT_STREAM, ALERT_STREAM_PATH)
+
+        try:
+            while True:
+                try:
+                    status, headers, reader = await self._open_stream(path)
+                    if status == 404:
+                        # Try alternate URL for stream
+                        self._forget_endpoint(ALERT_STREAM)
+                        path = ALT_ALERT_STREAM_PATH \
+                            if path == ALERT_STREAM_PATH else ALERT_STREAM_PATH
+                        status, headers, reader = await self._open_stream(path)
+
+                    if status != 200:
+                        raise ValueError('Connection unsucessful.')
+
+                    _LOGGING.debug('%s Connection Successful.', self.name)
+                    fail_count = 0
+                    self._remember_endpoints(alert_stream=path)
+                    self.watchdog.start()
+                    capture = self.capture
+                    if capture is not None:
+                        capture.note('%s %s%s' % (
+                            NOTE_CONNECT, self.root_url, path))
+
+                    async for chunk in _iter_body(reader, headers,
+                                                  self.stream_chunk_size,
+                                                  self._read_timeout):
+                        # Read once, stop_capture() may run on another
+                        # thread
+                        capture = self.capture
+                        if capture is not None:
+                            capture.write(chunk)
+                        self.feed_stream(parser, chunk)
+
+                    if self._reset:
+                        raise ValueError('Watchdog failed.')
+                    raise ValueError('Stream closed by device.')
+
+                except (ValueError, OSError, asyncio.TimeoutError,
+                        asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError) as err:
+                    fail_count += 1
+                    self.metrics.reconnects += 1
+                    self._reset = False
+                    _LOGGING.warning(
+                        '%s Connection Failed (count=%d). Waiting %ss. Err: %s',
+                        self.name, fail_count, (fail_count * 5) + 5, err)
+                    parser.reset()
+                    self.release_attachments()
+                    self.watchdog.stop()
+                    self._read_timeout.stop()
+                    self._close_writer()
+                    await asyncio.sleep(5)
+                    self.update_stale()
+                    await asyncio.sleep(fail_count * 5)
+        finally:
+            _LOGGING.debug('Stopping event stream task for %s', self.name)
+            self.watchdog.stop()
+            self._read_timeout.stop()
+            self._close_writer()
+
+    async def _open_stream(self, path):
+        """GET path and return (status, headers, reader).
+
+        Retries once with digest authentication if the device asks for it.
+        """
+        status, headers, reader = await self._request(path)
+        if status == 401:
+            challenge = headers.get('www-authenticate', '')
+            if challenge.lower().startswith('digest'):
+                _LOGGING.debug('%s Stream requires digest authentication.',
+                               self.name)
+                self._close_writer()
+                if not isinstance(self.hik_request_stream.auth,
+                                  HTTPDigestAuth):
+                    self.hik_request_stream.auth = HTTPDigestAuth(
+                        self.usr, self.pwd)
+                self._digest_auth = _DigestChallenge(
+                    self.usr, self.pwd, challenge)
+                status, headers, reader = await self._request(path)
+        if status != 200:
+            self._close_writer()
+        return status, headers, reader
+
+    async def _request(self, path):
+        """Send a single GET request and read the response head."""
+        parsed = urlparse(self.root_url)
+        secure = parsed.scheme == 'https'
+        port = parsed.port or (443 if secure else 80)
+        context = None
+        if secure:
+            context = ssl.create_default_context()
+            if not self.hik_request_stream.verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+
+        self._close_writer()
+        reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, port, ssl=context),
+            CONNECT_TIMEOUT)
+
+        lines = ['GET %s HTTP/1.1' % path,
+                 'Host: %s' % parsed.netloc,
+                 'Accept: */*',
+                 'Connection: keep-alive']
+        authorization = self._authorization(self.root_url + path)
+        if authorization:
+            lines.append('Authorization: %s' % authorization)
+        self._writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        await self._writer.drain()
+
+        self._read_timeout.start()
+        head = await reader.readuntil(b'\r\n\r\n')
+        status, headers = _parse_head(head)
+        return status, headers, reader
+
+    def _authorization(self, url):
+        """Build the Authorization header value for the stream request."""
+        auth = self.hik_request_stream.auth
+        if isinstance(auth, HTTPDigestAuth):
+            if self._digest_auth is None:
+                # No challenge yet, the device will send one with its 401.
+                return None
+            return self._digest_auth.header('GET', url)
+        if auth and auth[0] is not None:
+            token = ('%s:%s' % (auth[0], auth[1] or '')).encode('latin1')
+            return 'Basic ' + base64.b64encode(token).decode()
+        return None
+
+
+class AsyncEventHub(object):
+    """Run the alertStreams of many cameras on a single event loop."""
+
+    def __init__(self, cameras: Optional[Iterable[AsyncHikCamera]] = None):
+        """Initialize the hub.
+
+        Args:
+            cameras: Optional initial cameras to manage.
+        """
+        self._cameras: List[AsyncHikCamera] = list(cameras or [])
+
+    @property
+    def cameras(self) -> List[AsyncHikCamera]:
+        """Return the managed cameras."""
+        return list(self._cameras)
+
+    def add_camera(self, camera: AsyncHikCamera) -> None:
+        """Add a camera, starting its stream if the hub is running."""
+        self._cameras.append(camera)
+
+    async def add_device(self, *args, **kwargs) -> AsyncHikCamera:
+        """Create an AsyncHikCamera off-loop and add it to the hub."""
+        camera = await AsyncHikCamera.create(*args, **kwargs)
+        self.add_camera(camera)
+        return camera
+
+    def start(self) -> None:
+        """Start the stream coroutine of every camera."""
+        for camera in self._cameras:
+            camera.start_stream()
+
+    async def stop(self) -> None:
+        """Stop every stream and wait for them to finish."""
+        await asyncio.gather(
+            *(camera.async_disconnect() for camera in self._cameras))
+
+    async def __aenter__(self) -> 'AsyncEventHub':
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+
+def _parse_head(head: bytes) -> Tuple[int, Dict[str, str]]:
+    """Parse an HTTP response head into (status, lower-cased headers)."""
+    lines = head.decode('latin1').split('\r\n')
+    try:
+        status = int(lines[0].split(None, 2)[1])
+    except (IndexError, ValueError):
+        raise ValueError('Malformed status line: %r' % lines[0])
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+async def _iter_body(reader: asyncio.StreamReader, headers: Dict[str, str],
+                     chunk_size: int,
+                     idle: LoopWatchdog) -> AsyncIterator[bytes]:
+    """Yield the response body, decoding chunked transfer encoding.
+
+    ``idle`` is petted on every read; its handler is expected to close the
+    connection, which ends the body.
+    """
+    if 'chunked' not in headers.get('transfer-encoding', '').lower():
+        while True:
+            data = await reader.read(chunk_size)
+            if not data:
+                return
+            idle.pet()
+            yield data
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        idle.pet()
+        try:
+            remaining = int(line.split(b';', 1)[0], 16)
+        except ValueError:
+            raise ValueError('Malformed chunk size: %r' % line)
+        if remaining == 0:
+            return
+        while remaining:
+            data = await reader.read(min(remaining, chunk_size))
+            if not data:
+                return
+            idle.pet()
+            remaining -= len(data)
+            yield data
+        await reader.readexactly(2)
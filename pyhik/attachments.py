@@ -0,0 +1,295 @@
+"""
+pyhik.attachments
+~~~~~~~~~~~~~~~~~~~~
+Sinks for binary parts (snapshots) of the alertStream
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+from collections import deque
+import itertools
+import logging
+import mimetypes
+import mmap
+import os
+import re
+import threading
+from typing import Deque, NamedTuple, Optional, Tuple
+
+from pyhik.constants import (
+    ATTACHMENT_FILE_BYTES, ATTACHMENT_FILE_LIMIT, ATTACHMENT_SPOOL_SIZE)
+
+_LOGGING = logging.getLogger(__name__)
+
+# Smart events announce the pictures sent after them in the same stream
+_PICTURES_NUMBER = re.compile(
+    rb'<(?:\w+:)?detectionPicturesNumber>\s*(\d+)\s*<')
+_PICTURES_TRANS_TYPE = re.compile(
+    rb'<(?:\w+:)?detectionPictureTransType>\s*([^<\s]*)\s*<')
+
+
+def announced_pictures(payload) -> int:
+    """Return how many binary pictures follow a framed alert payload."""
+    match = _PICTURES_NUMBER.search(payload)
+    if match is None:
+        return 0
+    trans_type = _PICTURES_TRANS_TYPE.search(payload)
+    if trans_type is not None \
+            and trans_type.group(1).lower() != b'binary':
+        # Sent as URLs to fetch, not inside the stream
+        return 0
+    return int(match.group(1))
+
+
+class Attachment(NamedTuple):
+    """Where a binary alertStream part was stored.
+
+    location is the file path for a FileSink, or the buffer for a
+    BufferSink or SpoolSink with the part at [offset, offset + size).
+    """
+
+    content_type: str
+    size: int
+    location: object
+    offset: int = 0
+    generation: int = 0
+    sink: object = None
+
+    def read(self) -> bytes:
+        """Return the stored bytes.
+
+        Raises:
+            ValueError: A ring sink already overwrote the part.
+        """
+        return self.sink.read(self)
+
+
+class FileSink(object):
+    """Write each binary part to its own file in a directory.
+
+    At most max_files files and max_bytes bytes starting with prefix are
+    kept, including those left by earlier runs; the oldest are removed to
+    make room, counted in ``evicted``. Parts larger than max_bytes are
+    skipped and counted in ``skipped``. Attachment.read() raises
+    ValueError once its file was removed.
+    """
+
+    def __init__(self, directory: str, prefix: str = 'pyhik-',
+                 max_files: int = ATTACHMENT_FILE_LIMIT,
+                 max_bytes: int = ATTACHMENT_FILE_BYTES) -> None:
+        """Initialize the sink, creating directory if needed."""
+        if max_files < 1 or max_bytes < 1:
+            raise ValueError('max_files and max_bytes must be at least 1')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.skipped = 0
+        self.evicted = 0
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+        self._files: Deque[Tuple[str, int]] = deque()
+        self._bytes = 0
+        self._adopt()
+
+    def _adopt(self) -> None:
+        """Track files of earlier runs, oldest first."""
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(self.prefix) and entry.is_file():
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.path, stat.st_size))
+        with self._lock:
+            for _, path, size in sorted(found):
+                self._files.append((path, size))
+                self._bytes += size
+            self._evict(0)
+
+    def _evict(self, incoming: int) -> None:
+        # Caller holds the lock.
+        files = self._files
+        while files and (len(files) >= self.max_files
+                         or self._bytes + incoming > self.max_bytes):
+            path, size = files.popleft()
+            self._bytes -= size
+            self.evicted += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def open(self, content_type: str, size: int) -> Optional['_FileWriter']:
+        """Start storing a part of size bytes, or return None."""
+        if size > self.max_bytes:
+            self.skipped += 1
+            _LOGGING.debug('Skipping %d byte %s part, larger than '
+                           'max_bytes', size, content_type)
+            return None
+        extension = mimetypes.guess_extension(
+            content_type.partition(';')[0].strip()) or '.bin'
+        path = os.path.join(self.directory, '%s%d-%d%s' % (
+            self.prefix, os.getpid(), next(self._sequence), extension))
+        with self._lock:
+            self._evict(size)
+            # Reserved now so concurrent writers stay within the bounds
+            self._files.append((path, size))
+            self._bytes += size
+        return _FileWriter(self, path, content_type, size)
+
+    def _release(self, path: str) -> None:
+        """Stop tracking the file of an aborted part."""
+        with self._lock:
+            for index, (tracked, size) in enumerate(self._files):
+                if tracked == path:
+                    del self._files[index]
+                    self._bytes -= size
+                    return
+
+    def read(self, attachment: Attachment) -> bytes:
+        """Return the bytes of a stored part."""
+        try:
+            with open(attachment.location, 'rb') as handle:
+                return handle.read()
+        except FileNotFoundError:
+            raise ValueError('Attachment was evicted') from None
+
+
+class _FileWriter(object):
+    __slots__ = ('sink', 'path', 'content_type', 'size', '_file')
+
+    def __init__(self, sink: FileSink, path: str, content_type: str,
+                 size: int) -> None:
+        self.sink = sink
+        self.path = path
+        self.content_type = content_type
+        self.size = size
+        self._file = open(path, 'wb')
+
+    def write(self, data) -> None:
+        self._file.write(data)
+
+    def close(self) -> Attachment:
+        self._file.close()
+        return Attachment(self.content_type, self.size, self.path,
+                          sink=self.sink)
+
+    def abort(self) -> None:
+        self._file.close()
+        self.sink._release(self.path)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class BufferSink(object):
+    """Write binary parts back to back into a caller supplied buffer.
+
+    The buffer is used as a ring: a part that does not fit before the end
+    starts over at offset 0, overwriting the oldest parts, and parts larger
+    than the whole buffer are skipped and counted in ``skipped``.
+    Attachment.read() raises ValueError once its part was overwritten.
+    """
+
+    def __init__(self, buffer) -> None:
+        """Initialize the sink over any writable bytes-like object."""
+        view = memoryview(buffer)
+        if view.readonly:
+            raise ValueError('buffer must be writable')
+        self.buffer = buffer
+        self._view = view.cast('B')
+        self.capacity = len(self._view)
+        self.skipped = 0
+        # Next write offset, and how often the ring wrapped so far
+        self._offset = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def open(self, content_type: str, size: int) -> Optional['_BufferWriter']:
+        """Reserve room for a part of size bytes, or return None."""
+        if size > self.capacity:
+            self.skipped += 1
+            _LOGGING.debug('Skipping %d byte %s part, larger than the '
+                           'buffer', size, content_type)
+            return None
+        with self._lock:
+            if self._offset + size > self.capacity:
+                self._offset = 0
+                self._generation += 1
+            offset = self._offset
+            self._offset += size
+            generation = self._generation
+        return _BufferWriter(Attachment(
+            content_type, size, self.buffer, offset, generation, self),
+            self._view)
+
+    def valid(self, attachment: Attachment) -> bool:
+        """Return True if a part was not overwritten yet."""
+        with self._lock:
+            generation, offset = self._generation, self._offset
+        return attachment.generation == generation \
+            or (attachment.generation + 1 == generation
+                and offset <= attachment.offset)
+
+    def read(self, attachment: Attachment) -> bytes:
+        """Return a copy of a stored part."""
+        if not self.valid(attachment):
+            raise ValueError('Attachment was overwritten')
+        data = bytes(self._view[attachment.offset:
+                                attachment.offset + attachment.size])
+        # The writer may have lapped us while copying
+        if not self.valid(attachment):
+            raise ValueError('Attachment was overwritten')
+        return data
+
+    def close(self) -> None:
+        """Release the view held on the buffer."""
+        self._view.release()
+
+
+class _BufferWriter(object):
+    __slots__ = ('attachment', '_view', '_position')
+
+    def __init__(self, attachment: Attachment, view: memoryview) -> None:
+        self.attachment = attachment
+        self._view = view
+        self._position = attachment.offset
+
+    def write(self, data) -> None:
+        end = self._position + len(data)
+        self._view[self._position:end] = data
+        self._position = end
+
+    def close(self) -> Attachment:
+        return self.attachment
+
+    def abort(self) -> None:
+        pass
+
+
+class SpoolSink(BufferSink):
+    """BufferSink over a memory-mapped spool of a fixed size.
+
+    The spool is anonymous memory unless a path is given, in which case
+    the file is created or truncated to size bytes and can be read by
+    other processes.
+    """
+
+    def __init__(self, size: int = ATTACHMENT_SPOOL_SIZE,
+                 path: Optional[str] = None) -> None:
+        """Map the spool."""
+        self.path = path
+        if path is None:
+            spool = mmap.mmap(-1, size)
+        else:
+            with open(path, 'w+b') as handle:
+                handle.truncate(size)
+                spool = mmap.mmap(handle.fileno(), size)
+        super().__init__(spool)
+
+    def close(self) -> None:
+        """Unmap the spool."""
+        super().close()
+        self.buffer.close()
@@ -0,0 +1,184 @@
+"""
+pyhik.capture
+~~~~~~~~~~~~~~~~~~~~
+Record and replay raw alertStream bytes
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+from typing import (
+    BinaryIO, Callable, Dict, Iterator, NamedTuple, Optional, Union)
+
+from pyhik.stream import AlertStreamParser
+
+_LOGGING = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b'PYHIKCAP'
+CAPTURE_VERSION = 1
+
+# Record kinds
+RECORD_DATA = 0
+RECORD_NOTE = 1
+
+# kind, wall clock timestamp, payload length
+_RECORD = struct.Struct('<BdI')
+
+# Note written when a stream (re)connects; replay starts a new parser
+NOTE_CONNECT = 'connect'
+
+
+class CaptureRecord(NamedTuple):
+    """One record of a capture file."""
+
+    kind: int
+    timestamp: float
+    data: bytes
+
+    @property
+    def note(self) -> str:
+        """Return the text of a note record."""
+        return self.data.decode('utf-8', 'replace')
+
+
+class CaptureWriter(object):
+    """Append timestamped alertStream chunks to a capture file.
+
+    Safe to share between threads. Chunks are written as received, so a
+    capture keeps the device's multipart framing and TCP segmentation.
+    """
+
+    def __init__(self, target: Union[str, BinaryIO]) -> None:
+        """Open a capture file, or wrap a binary file object."""
+        if isinstance(target, (str, bytes, os.PathLike)):
+            self._file = open(target, 'wb')
+            self._owned = True
+        else:
+            self._file = target
+            self._owned = False
+        self._lock = threading.Lock()
+        self._file.write(CAPTURE_MAGIC + bytes((CAPTURE_VERSION,)))
+        self.records = 0
+        self.bytes = 0
+
+    def write(self, data, timestamp: Optional[float] = None) -> None:
+        """Record a chunk of stream bytes."""
+        self._append(RECORD_DATA, bytes(data), timestamp)
+        self.bytes += len(data)
+
+    def note(self, text: str, timestamp: Optional[float] = None) -> None:
+        """Record a marker such as a (re)connect to a stream URL."""
+        self._append(RECORD_NOTE, text.encode('utf-8'), timestamp)
+
+    def close(self) -> None:
+        """Flush and close the capture."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            if self._owned:
+                self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'CaptureWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _append(self, kind: int, data: bytes,
+                timestamp: Optional[float]) -> None:
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(_RECORD.pack(kind, timestamp, len(data)))
+            self._file.write(data)
+            self.records += 1
+
+
+def read_capture(source: Union[str, BinaryIO]) -> Iterator[CaptureRecord]:
+    """Iterate over the records of a capture file."""
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, 'rb') as capture:
+            yield from read_capture(capture)
+        return
+    header = source.read(len(CAPTURE_MAGIC) + 1)
+    if header[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+        raise ValueError('Not a pyhik capture file')
+    if header[-1] != CAPTURE_VERSION:
+        raise ValueError('Unsupported capture version: %d' % header[-1])
+    while True:
+        head = source.read(_RECORD.size)
+        if len(head) < _RECORD.size:
+            if head:
+                _LOGGING.warning('Capture ends with a truncated record')
+            return
+        kind, timestamp, length = _RECORD.unpack(head)
+        data = source.read(length)
+        if len(data) < length:
+            _LOGGING.warning('Capture ends with a truncated record')
+            return
+        yield CaptureRecord(kind, timestamp, data)
+
+
+def load_capture(source: Union[str, BinaryIO]) -> list:
+    """Read a whole capture into memory, e.g. to replay it repeatedly."""
+    return list(read_capture(source))
+
+
+def replay(records, feed: Callable[[bytes], None],
+           on_note: Optional[Callable[[str], None]] = None,
+           realtime: bool = False, speed: float = 1.0) -> Dict[str, float]:
+    """Feed captured chunks to a callable.
+
+    With realtime the original gaps between chunks are reproduced, divided
+    by speed; otherwise chunks are fed back to back. Returns the number of
+    chunks and bytes fed and the elapsed wall time.
+    """
+    if isinstance(records, (str, bytes, os.PathLike)) \
+            or hasattr(records, 'read'):
+        records = read_capture(records)
+    chunks = 0
+    size = 0
+    start = time.perf_counter()
+    first = None
+    for record in records:
+        if realtime:
+            if first is None:
+                first = record.timestamp
+            delay = (record.timestamp - first) / speed \
+                - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        if record.kind == RECORD_DATA:
+            feed(record.data)
+            chunks += 1
+            size += len(record.data)
+        elif record.kind == RECORD_NOTE and on_note is not None:
+            on_note(record.note)
+    return {'chunks': chunks, 'bytes': size,
+            'elapsed': time.perf_counter() - start}
+
+
+def replay_into_camera(camera, records, realtime: bool = False,
+                       speed: float = 1.0) -> Dict[str, float]:
+    """Replay a capture through a camera's framing and event processing.
+
+    A fresh parser is used after every recorded (re)connect, as in
+    alert_stream.
+    """
+    parser = AlertStreamParser()
+
+    def on_note(text):
+        if text.startswith(NOTE_CONNECT):
+            parser.reset()
+
+    return replay(records, lambda data: camera.feed_stream(parser, data),
+                  on_note, realtime, speed)
+
@@ -0,0 +1,144 @@
+"""
+pyhik.coalesce
+~~~~~~~~~~~~~~~~~~~~
+Debounce and hold-down of published state changes
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+_LOGGING = logging.getLogger(__name__)
+
+# Publish the first change at once, then at most one change per window
+MODE_HOLD_DOWN = 'hold-down'
+# Publish once the state has been quiet for a whole window
+MODE_DEBOUNCE = 'debounce'
+MODES = (MODE_HOLD_DOWN, MODE_DEBOUNCE)
+
+
+class _Sensor(object):
+    """Coalescing state of one event type on one channel."""
+
+    __slots__ = ('published', 'pending', 'call')
+
+    def __init__(self, published: bool) -> None:
+        self.published = published
+        self.pending = False
+        self.call = None
+
+
+class EventCoalescer(object):
+    """Cut the rate of published changes for flapping sensors.
+
+    Sits between a camera's event states and its callbacks. States are
+    always updated as alerts arrive; only publishing is held back. When a
+    window closes, the current state is published if it differs from the
+    last published one, so the latest state wins and a flap that returns to
+    the published state is not published at all.
+
+    Windows are set per event type; event types without one are published
+    immediately.
+    """
+
+    def __init__(self, camera, windows: Dict[str, float],
+                 mode: str = MODE_HOLD_DOWN) -> None:
+        """Initialize coalescer for a camera."""
+        if mode not in MODES:
+            raise ValueError('Unknown coalescing mode: %s' % mode)
+        self.camera = camera
+        self.windows = dict(windows)
+        self.mode = mode
+        self.transitions: Dict[str, int] = {}
+        self.published: Dict[str, int] = {}
+        self._sensors: Dict[Tuple[str, object], _Sensor] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, etype: str, channel) -> None:
+        """Handle a state change, publishing it now or later."""
+        window = self.windows.get(etype)
+        if window is None:
+            self.camera.publish_now(etype, channel)
+            return
+        state = self._state(etype, channel)
+        publish = False
+        with self._lock:
+            self.transitions[etype] = self.transitions.get(etype, 0) + 1
+            key = (etype, channel)
+            sensor = self._sensors.get(key)
+            if sensor is None:
+                sensor = self._sensors[key] = _Sensor(not state)
+            scheduler = self.camera.scheduler
+            deadline = scheduler.time() + window
+            if self.mode == MODE_DEBOUNCE:
+                sensor.pending = True
+                self._arm(sensor, etype, channel, deadline)
+            elif sensor.call is not None and sensor.call.active:
+                sensor.pending = True
+            else:
+                publish = True
+                sensor.published = state
+                self._count(etype)
+                self._arm(sensor, etype, channel, deadline)
+        if publish:
+            self.camera.publish_now(etype, channel)
+
+    def suppressed(self, etype: Optional[str] = None) -> int:
+        """Return the number of changes never published."""
+        if etype is not None:
+            return self.transitions.get(etype, 0) \
+                - self.published.get(etype, 0)
+        return sum(self.transitions.values()) - sum(self.published.values())
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return transition, published and suppressed counts by type."""
+        with self._lock:
+            return {etype: {'transitions': count,
+                            'published': self.published.get(etype, 0),
+                            'suppressed': count - self.published.get(etype, 0)}
+                    for etype, count in self.transitions.items()}
+
+    def reset(self) -> None:
+        """Cancel pending windows without publishing."""
+        with self._lock:
+            for sensor in self._sensors.values():
+                if sensor.call is not None:
+                    sensor.call.cancel()
+            self._sensors.clear()
+
+    def _state(self, etype, channel) -> bool:
+        record = self.camera.fetch_attributes(etype, channel)
+        return bool(record and record.state)
+
+    def _count(self, etype) -> None:
+        # Caller holds the lock.
+        self.published[etype] = self.published.get(etype, 0) + 1
+
+    def _arm(self, sensor, etype, channel, deadline) -> None:
+        # Caller holds the lock.
+        if sensor.call is None:
+            sensor.call = self.camera.scheduler.call_at(
+                deadline, lambda: self._close(etype, channel))
+        else:
+            sensor.call.reschedule(deadline)
+
+    def _close(self, etype, channel) -> None:
+        """Publish the latest state when a window closes."""
+        state = self._state(etype, channel)
+        with self._lock:
+            sensor = self._sensors.get((etype, channel))
+            if sensor is None or not sensor.pending:
+                return
+            sensor.pending = False
+            if state == sensor.published:
+                return
+            sensor.published = state
+            self._count(etype)
+            if self.mode == MODE_HOLD_DOWN:
+                # Keep holding while the sensor is still flapping
+                self._arm(sensor, etype, channel,
+                          self.camera.scheduler.time() + self.windows[etype])
+        # Runs on the scheduler thread, which must not run callbacks
+        self.camera.publish_later(etype, channel, coalesce=False)
@@ -14,9 +14,58 @@ __version__ = '{}.{}.{}'.format(
 
 CONNECT_TIMEOUT = 10
 READ_TIMEOUT = 60
+# Seconds disconnect() waits for the stream thread by default. Reads are
+# interrupted right away, only a connect in progress can take longer.
+DISCONNECT_TIMEOUT = CONNECT_TIMEOUT + 5
 SNAPSHOT_TIMEOUT = 10
 RECORDING_SEARCH_TIMEOUT = 30
 
+# Maximum bytes read from the alertStream socket at once
+STREAM_CHUNK_SIZE = 65536
+
+# Seconds without an "active" alert before an event is considered inactive
+STALE_EVENT_TIMEOUT = 5
+
+# Pending callback batches held by a DispatchExecutor before its overflow
+# policy applies
+DISPATCH_QUEUE_SIZE = 1024
+
+# Alerts kept per event type and channel, and sensors kept per camera, by
+# an EventHistory
+HISTORY_CAPACITY = 256
+HISTORY_MAX_SENSORS = 1024
+
+# EventJournal commits at most this many records at once, at least this
+# often in seconds, and drops new records beyond the queue size
+JOURNAL_BATCH_SIZE = 1000
+JOURNAL_FLUSH_INTERVAL = 0.5
+JOURNAL_QUEUE_SIZE = 100000
+
+# Devices pyhik.fleet.bootstrap initializes at once by default
+BOOTSTRAP_WORKERS = 32
+
+# Records a Subscription keeps for a slow consumer before dropping the
+# oldest
+SUBSCRIPTION_QUEUE_SIZE = 1024
+
+# ShardSupervisor workers send at most this many changes at once, at least
+# this often in seconds, and are reassigned after this many restarts
+# within the window in seconds
+SHARD_BATCH_SIZE = 512
+SHARD_BATCH_INTERVAL = 0.05
+SHARD_MAX_RESTARTS = 3
+SHARD_RESTART_WINDOW = 60.0
+
+# Sensors (device, event type, channel) a SharedStateTable has room for
+SHARED_STATE_CAPACITY = 4096
+
+# Bytes preallocated by a SpoolSink for binary alertStream parts
+ATTACHMENT_SPOOL_SIZE = 16 * 1024 * 1024
+
+# Files and bytes a FileSink keeps before removing the oldest parts
+ATTACHMENT_FILE_LIMIT = 1000
+ATTACHMENT_FILE_BYTES = 256 * 1024 * 1024
+
 DEFAULT_PORT = 80
 DEFAULT_RTSP_PORT = 554
 XML_ENCODING = 'UTF-8'
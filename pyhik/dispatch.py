@@ -0,0 +1,226 @@
+"""
+pyhik.dispatch
+~~~~~~~~~~~~~~~~~~~~
+Bounded off-thread callback dispatch
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+from collections import deque
+import logging
+import os
+import threading
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+from pyhik.constants import DISPATCH_QUEUE_SIZE
+
+_LOGGING = logging.getLogger(__name__)
+
+# Overflow policies
+POLICY_BLOCK = 'block'
+POLICY_DROP_OLDEST = 'drop-oldest'
+POLICY_COALESCE = 'coalesce'
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COALESCE)
+
+
+class _Shard(object):
+    """Queue and counters served by a single worker thread."""
+
+    __slots__ = ('queue', 'pending', 'cond', 'thread', 'submitted',
+                 'completed', 'dropped', 'coalesced', 'max_depth')
+
+    def __init__(self) -> None:
+        self.queue: Deque[list] = deque()
+        self.pending: Dict[Hashable, list] = {}
+        self.cond = threading.Condition(threading.Lock())
+        self.thread: Optional[threading.Thread] = None
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+
+class DispatchExecutor(object):
+    """Run update callbacks on worker threads behind a bounded queue.
+
+    Work is routed to a worker by key, so all callbacks for one sensor run
+    in submission order while different sensors proceed in parallel. When
+    a worker's queue is full the overflow policy decides what happens:
+
+    * ``block``: the submitter waits for space.
+    * ``drop-oldest``: the oldest queued item is discarded.
+    * ``coalesce``: an item whose key is already queued replaces the
+      queued one in place; new keys fall back to ``drop-oldest``.
+
+    Workers are started with the first submission. One executor may be
+    shared by many cameras.
+    """
+
+    def __init__(self, workers: int = 1, maxsize: int = DISPATCH_QUEUE_SIZE,
+                 policy: str = POLICY_BLOCK,
+                 name: str = 'pyhik-dispatch') -> None:
+        """Initialize executor."""
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        if policy not in POLICIES:
+            raise ValueError('Unknown overflow policy: %s' % policy)
+        self.workers = workers
+        self.maxsize = maxsize
+        self.policy = policy
+        self._name = name
+        self._shards: List[_Shard] = [_Shard() for _ in range(workers)]
+        # Split the bound so the total never exceeds maxsize
+        self._shard_size = max(1, maxsize // workers)
+        self._stopped = False
+
+    def submit(self, key: Hashable, func: Callable[..., Any],
+               *args: Any) -> bool:
+        """Queue func(*args) behind earlier work for the same key.
+
+        Returns False if the executor is shut down.
+        """
+        shard = self._shards[hash(key) % self.workers]
+        with shard.cond:
+            if self._stopped:
+                return False
+            if shard.thread is None:
+                self._start(shard)
+            shard.submitted += 1
+            if self.policy == POLICY_COALESCE:
+                entry = shard.pending.get(key)
+                if entry is not None:
+                    entry[1] = func
+                    entry[2] = args
+                    shard.coalesced += 1
+                    return True
+            queue = shard.queue
+            if len(queue) >= self._shard_size:
+                if self.policy != POLICY_BLOCK:
+                    self._drop_oldest(shard)
+                elif shard.thread is not threading.current_thread():
+                    # A callback submitting to its own worker must not wait
+                    # on itself, so it is allowed past the bound.
+                    while len(queue) >= self._shard_size \
+                            and not self._stopped:
+                        shard.cond.wait()
+                    if self._stopped:
+                        return False
+            entry = [key, func, args]
+            queue.append(entry)
+            if self.policy == POLICY_COALESCE:
+                shard.pending[key] = entry
+            if len(queue) > shard.max_depth:
+                shard.max_depth = len(queue)
+            shard.cond.notify_all()
+        return True
+
+    @property
+    def depth(self) -> int:
+        """Return the number of queued callbacks."""
+        return sum(len(shard.queue) for shard in self._shards)
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue depth and submission counters."""
+        stats = {'depth': 0, 'max_depth': 0, 'submitted': 0, 'completed': 0,
+                 'dropped': 0, 'coalesced': 0}
+        for shard in self._shards:
+            with shard.cond:
+                stats['depth'] += len(shard.queue)
+                stats['max_depth'] = max(stats['max_depth'], shard.max_depth)
+                stats['submitted'] += shard.submitted
+                stats['completed'] += shard.completed
+                stats['dropped'] += shard.dropped
+                stats['coalesced'] += shard.coalesced
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work and stop the workers.
+
+        Queued callbacks still run unless wait is False, in which case
+        they are discarded.
+        """
+        self._stopped = True
+        for shard in self._shards:
+            with shard.cond:
+                if not wait:
+                    shard.dropped += len(shard.queue)
+                    shard.queue.clear()
+                    shard.pending.clear()
+                shard.cond.notify_all()
+        if wait:
+            for shard in self._shards:
+                thread = shard.thread
+                if thread is not None \
+                        and thread is not threading.current_thread():
+                    thread.join()
+
+    def _start(self, shard: _Shard) -> None:
+        index = self._shards.index(shard)
+        shard.thread = threading.Thread(
+            target=self._run, args=(shard,),
+            name='%s-%d' % (self._name, index))
+        shard.thread.daemon = True
+        shard.thread.start()
+
+    @staticmethod
+    def _drop_oldest(shard: _Shard) -> None:
+        # Caller holds the shard lock.
+        entry = shard.queue.popleft()
+        if shard.pending.get(entry[0]) is entry:
+            del shard.pending[entry[0]]
+        shard.dropped += 1
+
+    def _run(self, shard: _Shard) -> None:
+        queue = shard.queue
+        while True:
+            with shard.cond:
+                while not queue:
+                    if self._stopped:
+                        return
+                    shard.cond.wait()
+                entry = queue.popleft()
+                if shard.pending.get(entry[0]) is entry:
+                    del shard.pending[entry[0]]
+                shard.cond.notify_all()
+            _, func, args = entry
+            try:
+                func(*args)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGING.exception('Error in dispatched callback %s', func)
+            with shard.cond:
+                shard.completed += 1
+
+
+_PUBLISHER: Optional[DispatchExecutor] = None
+_PUBLISHER_LOCK = threading.Lock()
+
+
+def get_publisher() -> DispatchExecutor:
+    """Return the process-wide executor publishing timer changes.
+
+    Changes found by the shared scheduler are published from this single
+    thread, so a slow callback holds up neither the scheduler nor the
+    stream threads. Queued publishes of one sensor are coalesced; the
+    publish reads the current state anyway.
+    """
+    global _PUBLISHER  # pylint: disable=global-statement
+    if _PUBLISHER is None:
+        with _PUBLISHER_LOCK:
+            if _PUBLISHER is None:
+                _PUBLISHER = DispatchExecutor(policy=POLICY_COALESCE,
+                                              name='pyhik-publish')
+    return _PUBLISHER
+
+
+def _reset_after_fork() -> None:
+    # The inherited publisher's worker thread does not exist in the child.
+    global _PUBLISHER, _PUBLISHER_LOCK  # pylint: disable=global-statement
+    _PUBLISHER = None
+    _PUBLISHER_LOCK = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,175 @@
+"""
+pyhik.endpoints
+~~~~~~~~~~~~~~~~~~~~
+Remembered auth scheme and endpoint variants per device
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+_LOGGING = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+DEVICE_INFO_PATH = '/ISAPI/System/deviceInfo'
+ALT_DEVICE_INFO_PATH = '/System/deviceInfo'
+ALERT_STREAM_PATH = '/ISAPI/Event/notification/alertStream'
+ALT_ALERT_STREAM_PATH = '/Event/notification/alertStream'
+PICTURE_PATH = '/ISAPI/Streaming/channels/%d/picture'
+PROXY_PICTURE_PATH = '/ISAPI/ContentMgmt/StreamingProxy/channels/%d/picture'
+
+AUTH_BASIC = 'basic'
+AUTH_DIGEST = 'digest'
+
+# Remembered choices
+AUTH = 'auth'
+DEVICE_INFO = 'device_info'
+ALERT_STREAM = 'alert_stream'
+SNAPSHOT = 'snapshot'
+
+# Values a choice may take. Anything else read from the file is ignored,
+# so a damaged cache cannot point requests elsewhere.
+CHOICES = {
+    AUTH: (AUTH_BASIC, AUTH_DIGEST),
+    DEVICE_INFO: (DEVICE_INFO_PATH, ALT_DEVICE_INFO_PATH),
+    ALERT_STREAM: (ALERT_STREAM_PATH, ALT_ALERT_STREAM_PATH),
+    SNAPSHOT: (PICTURE_PATH, PROXY_PICTURE_PATH),
+}
+
+SERIAL = 'serial'
+FIRMWARE = 'firmware'
+
+
+class EndpointCache(object):
+    """Auth scheme and endpoint variants that worked for each device.
+
+    Devices are keyed by root URL, and each entry records the serial
+    number and firmware it was learned from; a different device or a
+    firmware upgrade at the same address starts the entry over. Choices
+    are removed as soon as they fail, so the camera probes again.
+
+    With a path the cache is loaded from and saved to a JSON file after
+    every change. One process should own a file; the cache may be shared
+    by cameras on different threads.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Load the cache from path, if given."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._devices: Dict[str, dict] = self._load() if path else {}
+        self.hits = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __contains__(self, device) -> bool:
+        return device in self._devices
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, encoding='utf-8') as cache_file:
+                data = json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as err:
+            _LOGGING.warning('Ignoring endpoint cache %s: %s', self.path, err)
+            return {}
+        if not isinstance(data, dict) \
+                or data.get('version') != FORMAT_VERSION \
+                or not isinstance(data.get('devices'), dict):
+            _LOGGING.warning('Ignoring endpoint cache %s: unknown format',
+                             self.path)
+            return {}
+        return {device: entry for device, entry in data['devices'].items()
+                if isinstance(entry, dict)}
+
+    def _save(self) -> None:
+        # Caller holds the lock.
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            handle, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(handle, 'w', encoding='utf-8') as cache_file:
+                    json.dump({'version': FORMAT_VERSION,
+                               'devices': self._devices}, cache_file,
+                              indent=1, sort_keys=True)
+                os.replace(temp, self.path)
+            except BaseException:
+                os.unlink(temp)
+                raise
+        except OSError as err:
+            _LOGGING.warning('Unable to save endpoint cache %s: %s',
+                             self.path, err)
+
+    def get(self, device: str, name: str, default=None):
+        """Return the remembered choice name of device, or default."""
+        with self._lock:
+            value = self._devices.get(device, {}).get(name)
+            if value not in CHOICES[name]:
+                return default
+            self.hits += 1
+            return value
+
+    def identify(self, device: str, serial: Optional[str],
+                 firmware: Optional[str]) -> bool:
+        """Record which device answers at device.
+
+        Returns False if the entry was learned from another serial number
+        or firmware and has been cleared.
+        """
+        with self._lock:
+            entry = self._devices.setdefault(device, {})
+            if SERIAL in entry and (entry[SERIAL], entry.get(FIRMWARE)) \
+                    == (serial, firmware):
+                return True
+            kept = SERIAL not in entry
+            if not kept:
+                _LOGGING.debug('%s is now %s %s, forgetting its endpoints',
+                               device, serial, firmware)
+                self.invalidations += 1
+                entry.clear()
+            entry.update({SERIAL: serial, FIRMWARE: firmware})
+            self._save()
+            return kept
+
+    def remember(self, device: str, **choices) -> None:
+        """Store choices that just worked for device."""
+        for name, value in choices.items():
+            if value not in CHOICES[name]:
+                raise ValueError('Invalid %s: %r' % (name, value))
+        with self._lock:
+            entry = self._devices.setdefault(device, {})
+            if all(entry.get(name) == value
+                   for name, value in choices.items()):
+                return
+            entry.update(choices)
+            self._save()
+
+    def forget(self, device: str, name: Optional[str] = None) -> bool:
+        """Drop a failed choice, or every choice, of device.
+
+        Returns True if something was remembered.
+        """
+        with self._lock:
+            entry = self._devices.get(device)
+            if entry is None:
+                return False
+            if name is None:
+                del self._devices[device]
+            elif entry.pop(name, None) is None:
+                return False
+            _LOGGING.debug('Forgetting %s of %s', name or 'endpoints',
+                           device)
+            self.invalidations += 1
+            self._save()
+            return True
@@ -0,0 +1,298 @@
+"""
+pyhik.exporter
+~~~~~~~~~~~~~~~~~~~~
+OpenMetrics text exporter for stream and ISAPI request metrics
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+from operator import attrgetter
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import weakref
+
+from pyhik.metrics import (
+    Histogram, Metrics, MetricsRegistry, REGISTRY, REQUEST_REGISTRY,
+    aggregate)
+
+_LOGGING = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+DEFAULT_EXPORTER_PORT = 9464
+
+# Label values beyond these limits are folded into OVERFLOW_LABEL
+MAX_DEVICES = 10000
+MAX_CHANNELS = 64
+MAX_EVENT_TYPES = 32
+OVERFLOW_LABEL = 'other'
+
+STREAM_HELP = {
+    'bytes_read': 'Bytes read from the alert stream.',
+    'alerts': 'Alert parts framed from the alert stream.',
+    'heartbeats': 'Videoloss keep-alives handled without decoding.',
+    'filtered': 'Alerts dropped by the ingest filter without decoding.',
+    'parse_errors': 'Alerts that could not be decoded.',
+    'unknown_sensors': 'Alerts with an unknown event type.',
+    'attachments': 'Binary parts stored by the attachment sink.',
+    'reconnects': 'Alert stream connection failures.',
+    'watchdog_fires': 'Connections reset by the watchdog.',
+    'stale_expiries': 'Active events expired for going stale.',
+    'callbacks': 'Update callbacks called.',
+    'parse_time': 'Time to decode one alert.',
+    'callback_time': 'Time to run the callbacks of one change.',
+    'event_age': 'Time a change waited for its callbacks to start.',
+}
+
+REQUEST_HELP = {
+    'requests': 'ISAPI requests sent.',
+    'failures': 'ISAPI requests that failed.',
+    'connection_errors': 'ISAPI requests that failed to connect.',
+    'auth_errors': 'ISAPI requests rejected with 401 or 403.',
+    'not_found': 'ISAPI requests answered with 404.',
+    'request_time': 'Time to complete one ISAPI request.',
+}
+
+
+def escape_label(value) -> str:
+    """Escape a label value for the text format."""
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def _active(records) -> int:
+    if len(records) == 1:
+        return int(records[0].state is True)
+    return sum(record.state is True for record in records)
+
+
+def _format_float(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class OpenMetricsExporter(object):
+    """Render pyhik metrics in the OpenMetrics text format.
+
+    Stream and request metrics are labelled by device. Pass cameras to
+    also export their event states labelled by event type and channel.
+    Every label is capped; devices, channels and event types beyond the
+    caps are summed into a single 'other' label value, so a scrape has a
+    bounded number of series however large the fleet gets.
+
+    Per-device histograms are off by default: they multiply the series
+    count by the number of buckets. Fleet-wide histograms are always
+    exported.
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY,
+                 request_registry: MetricsRegistry = REQUEST_REGISTRY,
+                 cameras: Optional[Iterable] = None,
+                 namespace: str = 'pyhik',
+                 max_devices: int = MAX_DEVICES,
+                 max_channels: int = MAX_CHANNELS,
+                 max_event_types: int = MAX_EVENT_TYPES,
+                 device_histograms: bool = False) -> None:
+        """Initialize the exporter."""
+        self.registry = registry
+        self.request_registry = request_registry
+        self._cameras: 'weakref.WeakSet' = weakref.WeakSet(cameras or ())
+        self.namespace = namespace
+        self.max_devices = max_devices
+        self.max_channels = max_channels
+        self.max_event_types = max_event_types
+        self.device_histograms = device_histograms
+        self._labels: Dict[str, str] = {}
+        self._series: 'weakref.WeakKeyDictionary' = \
+            weakref.WeakKeyDictionary()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def add_camera(self, camera) -> None:
+        """Export the event states of a camera."""
+        self._cameras.add(camera)
+
+    def remove_camera(self, camera) -> None:
+        """Stop exporting the event states of a camera."""
+        self._cameras.discard(camera)
+
+    def render(self) -> str:
+        """Return all metrics as OpenMetrics text."""
+        lines: List[str] = []
+        self._render_metrics(lines, 'stream', self.registry, STREAM_HELP)
+        self._render_metrics(lines, 'isapi', self.request_registry,
+                             REQUEST_HELP)
+        self._render_event_states(lines)
+        lines.append('# EOF\n')
+        return '\n'.join(lines)
+
+    def _label(self, device: str) -> str:
+        """Return the cached, escaped device label of a metrics name."""
+        label = self._labels.get(device)
+        if label is None:
+            if len(self._labels) >= self.max_devices * 2:
+                self._labels.clear()
+            label = self._labels[device] = 'device="%s"' % escape_label(
+                device)
+        return label
+
+    def _devices(self, registry: MetricsRegistry) -> List[Tuple[str, Metrics]]:
+        """Group metrics by device name, folding overflow into 'other'."""
+        groups: Dict[str, List[Metrics]] = {}
+        for metrics in registry:
+            group = groups.get(metrics.name)
+            if group is None:
+                if len(groups) >= self.max_devices:
+                    group = groups.setdefault(OVERFLOW_LABEL, [])
+                else:
+                    group = groups[metrics.name] = []
+            group.append(metrics)
+        return sorted(
+            (name, group[0] if len(group) == 1
+             else aggregate(group, name, registry.kind))
+            for name, group in groups.items())
+
+    def _render_metrics(self, lines: List[str], prefix: str,
+                        registry: MetricsRegistry,
+                        help_text: Dict[str, str]) -> None:
+        kind = registry.kind
+        devices = self._devices(registry)
+        labels = [self._label(name) for name, _ in devices]
+        metrics_list = [metrics for _, metrics in devices]
+        for counter in kind.COUNTERS:
+            family = '%s_%s_%s' % (self.namespace, prefix, counter)
+            lines.append('# TYPE %s counter' % family)
+            lines.append('# HELP %s %s' % (family, help_text[counter]))
+            head = family + '_total{'
+            lines.extend([f'{head}{label}}} {value}' for label, value in zip(
+                labels, map(attrgetter(counter), metrics_list))])
+        for name in kind.HISTOGRAMS:
+            family = '%s_%s_%s_seconds' % (self.namespace, prefix, name)
+            lines.append('# TYPE %s histogram' % family)
+            lines.append('# HELP %s %s' % (family, help_text[name]))
+            histograms = list(map(attrgetter(name), metrics_list))
+            if self.device_histograms:
+                for label, histogram in zip(labels, histograms):
+                    self._render_histogram(lines, family, label, histogram)
+            else:
+                self._render_histogram(lines, family, '',
+                                       Histogram.total(histograms))
+
+    @staticmethod
+    def _render_histogram(lines: List[str], family: str, label: str,
+                          histogram: Histogram) -> None:
+        sep = ',' if label else ''
+        count = 0
+        for bound, count in histogram.cumulative():
+            lines.append('%s_bucket{%s%sle="%s"} %d' % (
+                family, label, sep, _format_float(bound), count))
+        braces = '{%s}' % label if label else ''
+        lines.append('%s_count%s %d' % (family, braces, count))
+        lines.append('%s_sum%s %s' % (family, braces,
+                                      _format_float(histogram.sum)))
+
+    def _state_series(self, camera, device: str) -> list:
+        """Return a camera's (labels, records) pairs, capped and cached.
+
+        Rebuilt only when the camera's name or tracked channels change.
+        """
+        table = camera.event_states
+        version = (device, id(table), table.record_count())
+        cached = self._series.get(camera)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        groups: Dict[Tuple[str, str], List] = {}
+        event_types = set()
+        channels = set()
+        for event, record in table.records():
+            if event not in event_types \
+                    and len(event_types) >= self.max_event_types:
+                event = OVERFLOW_LABEL
+            event_types.add(event)
+            channel = str(record.channel)
+            if channel not in channels and len(channels) >= self.max_channels:
+                channel = OVERFLOW_LABEL
+            channels.add(channel)
+            groups.setdefault((event, channel), []).append(record)
+        series = [('%s,event_type="%s",channel="%s"' % (
+            self._label(device), escape_label(event), escape_label(channel)),
+            records) for (event, channel), records in sorted(groups.items())]
+        self._series[camera] = (version, series)
+        return series
+
+    def _render_event_states(self, lines: List[str]) -> None:
+        family = '%s_event_active' % self.namespace
+        lines.append('# TYPE %s gauge' % family)
+        lines.append('# HELP %s Events currently active per device, '
+                     'event type and channel.' % family)
+        by_device: Dict[str, List] = {}
+        for camera in list(self._cameras):
+            device = camera.metrics.name
+            if device not in by_device and len(by_device) >= self.max_devices:
+                device = OVERFLOW_LABEL
+            by_device.setdefault(device, []).append(camera)
+        head = family + '{'
+        for device, cameras in sorted(by_device.items()):
+            if len(cameras) == 1:
+                series = self._state_series(cameras[0], device)
+            else:
+                # Several cameras share the label, sum them per series
+                merged: Dict[str, List] = {}
+                for camera in cameras:
+                    for labels, records in self._state_series(camera, device):
+                        merged.setdefault(labels, []).extend(records)
+                series = sorted(merged.items())
+            lines.extend([f'{head}{labels}}} {_active(records)}'
+                          for labels, records in series])
+
+    def serve(self, host: str = '127.0.0.1',
+              port: int = DEFAULT_EXPORTER_PORT) -> Tuple[str, int]:
+        """Serve /metrics from a daemon thread and return its address."""
+        if self._server is not None:
+            return self._server.server_address[:2]
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Answer scrapes of /metrics."""
+
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # pylint: disable=redefined-builtin
+                _LOGGING.debug('Metrics scrape: ' + format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='pyhik-metrics',
+            daemon=True)
+        self._thread.start()
+        _LOGGING.debug('Serving metrics on %s:%s',
+                       *self._server.server_address[:2])
+        return self._server.server_address[:2]
+
+    def shutdown(self) -> None:
+        """Stop serving metrics."""
+        server, self._server = self._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            self._thread.join()
+            self._thread = None
+
+
+def render(cameras: Optional[Iterable] = None) -> str:
+    """Return the metrics of every camera and ISAPIClient as text."""
+    return OpenMetricsExporter(cameras=cameras).render()
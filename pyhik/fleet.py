@@ -0,0 +1,208 @@
+"""
+pyhik.fleet
+~~~~~~~~~~~~~~~~~~~~
+Operations across many cameras
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import time
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+from pyhik.constants import BOOTSTRAP_WORKERS, DISCONNECT_TIMEOUT
+from pyhik.shard import device_key
+
+_LOGGING = logging.getLogger(__name__)
+
+
+class BootstrapResult(NamedTuple):
+    """Outcome of initializing one device."""
+
+    device: str
+    config: dict
+    camera: object
+    error: Optional[str]
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        """Return True if the device was initialized."""
+        return self.error is None
+
+
+def create_deferred(config: dict):
+    """Build a HikCamera from a device config without contacting it."""
+    from pyhik.hikvision import HikCamera
+    kwargs = {name: value for name, value in config.items() if name != 'key'}
+    return HikCamera(defer_init=True, **kwargs)
+
+
+def create_deferred_async(config: dict):
+    """Build an AsyncHikCamera from a device config without contacting it."""
+    from pyhik.aio import AsyncHikCamera
+    kwargs = {name: value for name, value in config.items() if name != 'key'}
+    return AsyncHikCamera(defer_init=True, **kwargs)
+
+
+def _initialize(config: dict, factory: Callable) -> BootstrapResult:
+    """Build and initialize one camera, catching every failure."""
+    key = device_key(config)
+    start = time.monotonic()
+    camera = None
+    error = None
+    try:
+        camera = factory(config)
+        camera.initialize()
+        if camera.event_states is None:
+            error = 'Unable to read device info'
+    except Exception as err:  # pylint: disable=broad-except
+        error = str(err) or type(err).__name__
+    return BootstrapResult(key, config, camera, error,
+                           time.monotonic() - start)
+
+
+def _report(result: BootstrapResult, progress, completed: int,
+            total: int) -> None:
+    if result.ok:
+        _LOGGING.debug('Initialized %s in %.2fs (%d/%d)', result.device,
+                       result.elapsed, completed, total)
+    else:
+        _LOGGING.warning('Unable to initialize %s: %s', result.device,
+                         result.error)
+    if progress is not None:
+        try:
+            progress(result, completed, total)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGING.exception('Bootstrap progress callback failed')
+
+
+def _timed_out(config: dict, elapsed: float) -> BootstrapResult:
+    return BootstrapResult(device_key(config), config, None, 'Timed out',
+                           elapsed)
+
+
+def bootstrap(configs: Iterable[dict], workers: int = BOOTSTRAP_WORKERS,
+              progress: Optional[Callable] = None,
+              timeout: Optional[float] = None,
+              factory: Callable = create_deferred) -> List[BootstrapResult]:
+    """Initialize many devices concurrently on a bounded thread pool.
+
+    configs hold HikCamera keyword arguments, plus an optional 'key'
+    naming the device. factory builds an uninitialized camera from a
+    config. progress(result, completed, total) is called on the calling
+    thread as each device finishes. Devices still initializing after
+    timeout seconds are reported as failed.
+
+    Returns a BootstrapResult per config, in the order given; cameras are
+    not started.
+    """
+    configs = list(configs)
+    total = len(configs)
+    start = time.monotonic()
+    results: List[Optional[BootstrapResult]] = [None] * total
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, min(workers, total or 1)),
+        thread_name_prefix='pyhik-bootstrap')
+    try:
+        futures = {executor.submit(_initialize, config, factory): index
+                   for index, config in enumerate(configs)}
+        completed = 0
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout):
+                result = future.result()
+                results[futures[future]] = result
+                completed += 1
+                _report(result, progress, completed, total)
+        except concurrent.futures.TimeoutError:
+            for index, config in enumerate(configs):
+                if results[index] is None:
+                    results[index] = _timed_out(
+                        config, time.monotonic() - start)
+                    completed += 1
+                    _report(results[index], progress, completed, total)
+    finally:
+        # Stragglers finish in the background without holding us up
+        executor.shutdown(wait=False, cancel_futures=True)
+    _LOGGING.info('Initialized %d of %d devices in %.2fs',
+                  sum(result.ok for result in results), total,
+                  time.monotonic() - start)
+    return results
+
+
+async def async_bootstrap(configs: Iterable[dict],
+                          concurrency: int = BOOTSTRAP_WORKERS,
+                          progress: Optional[Callable] = None,
+                          timeout: Optional[float] = None,
+                          factory: Callable = create_deferred_async
+                          ) -> List[BootstrapResult]:
+    """bootstrap() for an event loop.
+
+    Devices are initialized on a dedicated pool of concurrency threads,
+    as the loop's default executor may have fewer; the default factory
+    builds AsyncHikCamera instances.
+    """
+    configs = list(configs)
+    total = len(configs)
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, min(concurrency, total or 1)),
+        thread_name_prefix='pyhik-bootstrap')
+    start = time.monotonic()
+    completed = 0
+
+    async def run(config):
+        nonlocal completed
+        result = await loop.run_in_executor(
+            executor, _initialize, config, factory)
+        completed += 1
+        _report(result, progress, completed, total)
+        return result
+
+    tasks = [asyncio.ensure_future(run(config)) for config in configs]
+    try:
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+    finally:
+        # Stragglers finish in the background without holding us up
+        executor.shutdown(wait=False, cancel_futures=True)
+    results = []
+    for task, config in zip(tasks, configs):
+        if task.done():
+            results.append(task.result())
+        else:
+            task.cancel()
+            completed += 1
+            result = _timed_out(config, time.monotonic() - start)
+            _report(result, progress, completed, total)
+            results.append(result)
+    return results
+
+
+def disconnect_all(cameras: Iterable, timeout: float = DISCONNECT_TIMEOUT
+                   ) -> List:
+    """Disconnect many cameras in parallel within one shared deadline.
+
+    Every camera is disconnected like HikCamera.disconnect(), but each
+    stream is told to stop and has its socket shut down before any thread
+    is waited on, so the whole fleet stops in about the time of the
+    slowest camera rather than the sum of all of them.
+
+    Returns the cameras whose stream thread was still running at the
+    deadline.
+    """
+    cameras = list(cameras)
+    deadline = time.monotonic() + timeout
+    for camera in cameras:
+        camera.begin_disconnect()
+    stuck = []
+    for camera in cameras:
+        remaining = max(0.0, deadline - time.monotonic())
+        if not camera.join_stream(remaining):
+            stuck.append(camera)
+    if stuck:
+        _LOGGING.warning('%d of %d event streams did not stop within %ss',
+                         len(stuck), len(cameras), timeout)
+    return stuck
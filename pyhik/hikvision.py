@@ -11,8 +11,10 @@ http://oversea-download.hikvision.com/uploadfile/Leaflet/ISAPI/HIKVISION%20ISAPI
 Imaging:
 http://oversea-download.hikvision.com/uploadfile/Leaflet/ISAPI/HIKVISION%20ISAPI_2.0-Image%20Service.pdf
 """
+import asyncio
 import time
 import datetime
+import functools
 from dataclasses import dataclass
 import logging
 import uuid
@@ -34,13 +36,37 @@ try:
 except ImportError:
     dispatcher = None
 
+from pyhik.attachments import Attachment, announced_pictures
+from pyhik.capture import CaptureWriter, NOTE_CONNECT
+from pyhik.coalesce import EventCoalescer, MODE_HOLD_DOWN
+from pyhik.dispatch import get_publisher
+from pyhik.endpoints import (
+    ALERT_STREAM, ALERT_STREAM_PATH, ALT_ALERT_STREAM_PATH,
+    ALT_DEVICE_INFO_PATH, AUTH, AUTH_BASIC, AUTH_DIGEST, DEVICE_INFO,
+    DEVICE_INFO_PATH, PICTURE_PATH, PROXY_PICTURE_PATH, SNAPSHOT)
+from pyhik.history import EventHistory
+from pyhik.ingest import ACCEPT, HEARTBEAT, IngestFilter
+from pyhik.journal import SOURCE_STALE, journal_device
+from pyhik.hooks import (
+    DISPATCH, FRAME, HOOKS, PARSE, STATE_UPDATE, XML_PARSE, install_hooks,
+    timed)
+from pyhik.metrics import REGISTRY, StreamMetrics
+from pyhik.router import CallbackRouter, SensorEvent
+from pyhik.scheduler import get_scheduler
+from pyhik.state import EventStateTable
+from pyhik.subscription import EventRecord, Subscription
 from pyhik.watchdog import Watchdog
 from pyhik.constants import (
     DEFAULT_PORT, DEFAULT_RTSP_PORT, DEFAULT_HEADERS, XML_NAMESPACE, SENSOR_MAP,
     CAM_DEVICE, NVR_DEVICE, CONNECT_TIMEOUT, READ_TIMEOUT, SNAPSHOT_TIMEOUT,
     RECORDING_SEARCH_TIMEOUT, CONTEXT_INFO, CONTEXT_TRIG, CONTEXT_MOTION,
-    CONTEXT_ALERT, CHANNEL_NAMES, ID_TYPES, VALID_NOTIFICATION_METHODS,
+    CONTEXT_ALERT, CHANNEL_NAMES, VALID_NOTIFICATION_METHODS,
+    STREAM_CHUNK_SIZE, STALE_EVENT_TIMEOUT, DISCONNECT_TIMEOUT,
+    HISTORY_CAPACITY, HISTORY_MAX_SENSORS, SUBSCRIPTION_QUEUE_SIZE,
     __version__)
+from pyhik.stream import (
+    AlertEvent, AlertStreamParser, decode_alert, iter_stream_chunks,
+    shutdown_response)
 
 # Register the default namespace to avoid ns0: prefixes in serialized XML
 ET.register_namespace('', XML_NAMESPACE)
@@ -95,17 +121,41 @@ report IR status and allow
 class HikCamera(object):
     """Creates a new Hikvision api device."""
 
+    # Optional EndpointCache, normally set by __init__. The class default
+    # keeps cameras built without it, e.g. through __new__, probing.
+    endpoint_cache = None
+
     def __init__(self, host=None, port=DEFAULT_PORT,
-                 usr=None, pwd=None, verify_ssl=True):
-        """Initialize device."""
+                 usr=None, pwd=None, verify_ssl=True, defer_init=False,
+                 endpoint_cache=None):
+        """Initialize device.
+
+        With defer_init the device is not contacted; call initialize()
+        later, e.g. through pyhik.fleet.bootstrap. An EndpointCache lets
+        the camera skip probing auth and URL variants it already knows.
+        """
 
         _LOGGING.debug("pyHik %s initializing new hikvision device at: %s",
                        __version__, host)
 
-        self.event_states = {}
+        self.event_states = EventStateTable()
+
+        # Events that only post "active" are expired by per-sensor timers
+        self.scheduler = get_scheduler()
+        self.stale_timeout = STALE_EVENT_TIMEOUT
+        self.stale_timeouts = {}
+        self._stale_calls = {}
+        self._state_lock = threading.RLock()
 
         self.watchdog = Watchdog(300.0, self.watchdog_handler)
 
+        # Stream health counters and timings, aggregated by REGISTRY
+        self.metrics = REGISTRY.register(StreamMetrics(str(host or '')))
+
+        # Optional EndpointCache of the auth scheme and URL variants that
+        # worked, shared by cameras and kept across restarts
+        self.endpoint_cache = endpoint_cache
+
         if not host:
             _LOGGING.error('Host not specified! Cannot continue.')
             return
@@ -119,6 +169,7 @@ class HikCamera(object):
         self.usr = usr
         self.pwd = pwd
         self.cam_id = 0
+        self.serial = None
         self.name = ''
         self.device_type = None
         self.motion_detection = None
@@ -142,6 +193,7 @@ class HikCamera(object):
         self.hik_request.verify = verify_ssl
         self.hik_request.auth = (usr, pwd)
         self.hik_request.headers.update(DEFAULT_HEADERS)
+        install_hooks(self.hik_request)
 
         # Separate session for the alert stream daemon thread.
         # requests.Session is NOT thread-safe, so the stream thread
@@ -150,6 +202,7 @@ class HikCamera(object):
         self.hik_request_stream.verify = verify_ssl
         self.hik_request_stream.auth = (usr, pwd)
         self.hik_request_stream.headers.update(DEFAULT_HEADERS)
+        install_hooks(self.hik_request_stream)
 
         # Define event stream processing thread
         self.kill_thrd = threading.Event()
@@ -157,11 +210,44 @@ class HikCamera(object):
         self.thrd = threading.Thread(
             target=self.alert_stream, args=(self.reset_thrd, self.kill_thrd,))
         self.thrd.daemon = False
-
-        # Callbacks
-        self._updateCallbacks = []
-
-        self.initialize()
+        self.stream_chunk_size = STREAM_CHUNK_SIZE
+        self._stream_response = None
+        self._stream_lock = threading.Lock()
+        # Optional CaptureWriter receiving the raw stream bytes
+        self.capture = None
+
+        # Callbacks, routed by sensor. May be shared by several cameras.
+        self.callback_router = CallbackRouter()
+        self._sensor_events = {}
+        # Optional DispatchExecutor running callbacks off the stream thread
+        self.dispatch_executor = None
+        # Serializes callbacks run without a dispatch executor
+        self._publish_lock = threading.RLock()
+        # Optional EventCoalescer holding back flapping sensors
+        self.coalescer = None
+        # Skips decoding alerts that would be discarded; None decodes all
+        self.ingest_filter = IngestFilter()
+        # Optional EventHistory of recent alerts per sensor
+        self.history = None
+        # Optional EventJournal receiving every processed alert
+        self.journal = None
+        self._journal_device = None
+        # Optional SharedStateTable mirroring event states for other
+        # processes
+        self.shared_state = None
+        self._shared_device = None
+        # Optional sink storing binary parts (snapshots) of the stream
+        self.attachment_sink = None
+        self._attachments = {}
+        # Change held back until the pictures its alert announced arrive
+        self._held = None
+        self._held_attachments = []
+        # Subscriptions of events() and aevents() consumers
+        self._subscriptions = ()
+        self._subscription_lock = threading.Lock()
+
+        if not defer_init:
+            self.initialize()
 
     @property
     def get_id(self):
@@ -178,6 +264,19 @@ class HikCamera(object):
         """Return device type."""
         return self.device_type
 
+    @property
+    def event_states(self):
+        """Return the event state table."""
+        return self._event_states
+
+    @event_states.setter
+    def event_states(self, states):
+        """Replace event states, accepting a legacy dictionary."""
+        if states is None or isinstance(states, EventStateTable):
+            self._event_states = states
+        else:
+            self._event_states = EventStateTable.from_dict(states)
+
     @property
     def current_event_states(self):
         """Return Event states dictionary"""
@@ -213,7 +312,7 @@ class HikCamera(object):
             return self.motion_detection
 
         try:
-            tree = ET.fromstring(response.text)
+            tree = timed(XML_PARSE, response.url, ET.fromstring, response.text)
             self.fetch_namespace(tree, CONTEXT_MOTION)
             enabled = tree.find(self.element_query('enabled', CONTEXT_MOTION))
 
@@ -283,7 +382,7 @@ class HikCamera(object):
             return None
 
         try:
-            tree = ET.fromstring(response.text)
+            tree = timed(XML_PARSE, response.url, ET.fromstring, response.text)
         except ET.ParseError:
             _LOGGING.debug('Unable to parse videoEncryption response.')
             return None
@@ -314,20 +413,26 @@ class HikCamera(object):
         else:
             stream_channel = 1
 
-        url = '%s/ISAPI/Streaming/channels/%d/picture' % (
-            self.root_url, stream_channel)
+        path = PICTURE_PATH
+        if self.device_type == NVR_DEVICE:
+            path = self._endpoint(SNAPSHOT, PICTURE_PATH)
 
         try:
-            response = self.hik_request.get(url, timeout=SNAPSHOT_TIMEOUT)
+            response = self.hik_request.get(
+                self.root_url + path % stream_channel,
+                timeout=SNAPSHOT_TIMEOUT)
             if (self.device_type == NVR_DEVICE
                     and response.status_code not in (
                         requests.codes.ok,
                         requests.codes.unauthorized,
                         requests.codes.forbidden)):
-                url = ('%s/ISAPI/ContentMgmt/StreamingProxy/channels/'
-                       '%d/picture') % (self.root_url, stream_channel)
+                # Some NVRs only serve pictures through the StreamingProxy
+                self._forget_endpoint(SNAPSHOT)
+                path = PROXY_PICTURE_PATH if path == PICTURE_PATH \
+                    else PICTURE_PATH
                 response = self.hik_request.get(
-                    url, timeout=SNAPSHOT_TIMEOUT)
+                    self.root_url + path % stream_channel,
+                    timeout=SNAPSHOT_TIMEOUT)
         except requests.exceptions.Timeout:
             _LOGGING.warning('Timeout fetching snapshot from %s', self.name)
             return None
@@ -344,6 +449,8 @@ class HikCamera(object):
             _LOGGING.debug('Unable to fetch snapshot: %s', response.status_code)
             return None
 
+        if self.device_type == NVR_DEVICE:
+            self._remember_endpoints(snapshot=path)
         return response.content
 
     def get_stream_url(self, channel=1, protocol='rtsp', stream_type=1):
@@ -410,17 +517,157 @@ class HikCamera(object):
         return sorted(list(channels))
 
     def add_update_callback(self, callback, sensor):
-        """Register as callback for when a matching device sensor changes."""
-        self._updateCallbacks.append([callback, sensor])
+        """Register as callback for when a matching device sensor changes.
+
+        sensor is 'cam_id.event_type.channel'; any part may be '*'.
+        """
+        self.callback_router.add(callback, sensor)
         _LOGGING.debug('Added update callback to %s on %s', callback, sensor)
 
+    def remove_update_callback(self, callback, sensor=None):
+        """Unregister a callback from a sensor, or from all sensors."""
+        removed = self.callback_router.remove(callback, sensor)
+        _LOGGING.debug('Removed %d update callbacks to %s', removed, callback)
+        return removed
+
+    def set_coalescing(self, windows, mode=MODE_HOLD_DOWN):
+        """Coalesce published changes per event type.
+
+        windows maps event types (e.g. 'Motion') to seconds. Pass None or
+        an empty dict to publish every change again.
+        """
+        if self.coalescer is not None:
+            self.coalescer.reset()
+        self.coalescer = EventCoalescer(self, windows, mode) if windows \
+            else None
+
+    def set_history(self, capacity=HISTORY_CAPACITY,
+                    max_sensors=HISTORY_MAX_SENSORS):
+        """Keep the last capacity alerts of each event type and channel.
+
+        Pass a capacity of 0 or None to stop keeping history.
+        """
+        self.history = EventHistory(capacity, max_sensors) if capacity \
+            else None
+        return self.history
+
+    def set_journal(self, journal):
+        """Write every processed alert to an EventJournal, or stop with None.
+
+        Alerts are journaled under the serial number, or the host if the
+        device did not report one, so set the journal after initialize().
+        """
+        self.journal = journal
+        self._journal_device = journal_device(self) if journal else None
+
+    def set_shared_state(self, table):
+        """Mirror event states into a SharedStateTable, or stop with None.
+
+        States are stored under the same device name as the journal, so
+        set the table after initialize(). Current states are written right away.
+        """
+        self.shared_state = table
+        self._shared_device = journal_device(self) \
+            if table is not None else None
+        if table is not None:
+            with self._state_lock:
+                table.write_camera(self._shared_device, self)
+
+    def restore_from_journal(self):
+        """Restore tracked event states from the journal after a restart.
+
+        Returns the number of sensors restored. No callbacks are fired.
+        """
+        restored = 0
+        states = self.journal.latest_states(self._journal_device)
+        for (etype, channel), entry in states.items():
+            record = self.fetch_attributes(etype, channel)
+            if not record:
+                continue
+            with self._state_lock:
+                record.state = entry.state
+                if entry.count is not None:
+                    record.count = entry.count
+                if self.shared_state is not None:
+                    self.shared_state.write(self._shared_device, etype,
+                                            channel, record.state,
+                                            record.count)
+                if entry.state:
+                    # Expires as usual unless the device confirms it
+                    self._schedule_stale(etype, record)
+            restored += 1
+        _LOGGING.debug('%s Restored %d event states from journal',
+                       self.name, restored)
+        return restored
+
+    def subscribe(self, maxsize=SUBSCRIPTION_QUEUE_SIZE, loop=None):
+        """Return a new Subscription receiving every processed alert."""
+        subscription = Subscription(maxsize, loop)
+        with self._subscription_lock:
+            self._subscriptions += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop feeding a Subscription and close it."""
+        with self._subscription_lock:
+            self._subscriptions = tuple(
+                item for item in self._subscriptions
+                if item is not subscription)
+        subscription.close()
+
+    def close_subscriptions(self):
+        """Close every Subscription, ending events() iterators."""
+        with self._subscription_lock:
+            subscriptions, self._subscriptions = self._subscriptions, ()
+        for subscription in subscriptions:
+            subscription.close()
+
+    def events(self, maxsize=SUBSCRIPTION_QUEUE_SIZE, timeout=None):
+        """Yield an EventRecord for every processed alert.
+
+        Records are buffered per consumer, up to maxsize; a Lagged is
+        yielded in place of records dropped because the consumer fell
+        behind. Ends when no record arrives within timeout seconds, or
+        once the camera disconnects.
+        """
+        subscription = self.subscribe(maxsize)
+        try:
+            while True:
+                item = subscription.get(timeout)
+                if item is None:
+                    return
+                yield item
+        finally:
+            self.unsubscribe(subscription)
+
+    async def aevents(self, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        """Async iterator version of events() for the running loop."""
+        subscription = self.subscribe(maxsize, asyncio.get_running_loop())
+        try:
+            async for item in subscription:
+                yield item
+        finally:
+            self.unsubscribe(subscription)
+
+    def _notify_subscriptions(self, etype, echid, estate, count,
+                              device_time=None):
+        """Queue a processed alert for every Subscription."""
+        record = EventRecord(etype, echid, estate, count, device_time,
+                             time.time())
+        for subscription in self._subscriptions:
+            subscription.put(record)
+
     def _do_update_callback(self, msg):
-        """Call registered callback functions."""
-        for callback, sensor in self._updateCallbacks:
-            if sensor == msg:
-                _LOGGING.debug('Update callback %s for sensor %s',
-                               callback, sensor)
-                callback(msg)
+        """Call registered callback functions, returning how many ran."""
+        return self.callback_router.route(msg)
+
+    def sensor_event(self, etype, echid):
+        """Return the SensorEvent published for an event type and channel."""
+        key = (self.cam_id, etype, echid)
+        event = self._sensor_events.get(key)
+        if event is None:
+            event = self._sensor_events[key] = SensorEvent(*key)
+        return event
 
     def element_query(self, element, context):
         """Build tree query for a given element and context."""
@@ -472,6 +719,8 @@ class HikCamera(object):
         for key in device_info:
             if key == 'deviceName':
                 self.name = device_info[key]
+            elif key == 'serialNumber':
+                self.serial = device_info[key]
             elif key == 'deviceID':
                 if len(device_info[key]) > 10:
                     self.cam_id = device_info[key]
@@ -486,9 +735,8 @@ class HikCamera(object):
                         # Tracking videoloss events causes problems since they are used
                         # as the watchdog so ignore them if they are enabled in the triggers.
                         if event.lower() != 'videoloss':
-                            self.event_states.setdefault(
-                                SENSOR_MAP[event.lower()], []).append(
-                                    [False, channel, 0, datetime.datetime.now()])
+                            self.event_states.add(
+                                SENSOR_MAP[event.lower()], channel)
                     except KeyError:
                         # Sensor type doesn't have a known friendly name
                         # We can't reliably handle it at this time...
@@ -501,35 +749,88 @@ class HikCamera(object):
 
         self.get_motion_detection()
 
+    def _endpoint(self, name, default):
+        """Return the remembered variant of an endpoint, or default."""
+        if self.endpoint_cache is None:
+            return default
+        return self.endpoint_cache.get(self.root_url, name, default)
+
+    def _remember_endpoints(self, **choices):
+        """Store endpoint variants that just worked."""
+        if self.endpoint_cache is not None:
+            self.endpoint_cache.remember(self.root_url, **choices)
+
+    def _forget_endpoint(self, name=None):
+        """Drop a remembered variant that failed, or all of them."""
+        if self.endpoint_cache is not None:
+            self.endpoint_cache.forget(self.root_url, name)
+
+    def _use_digest(self):
+        """Switch both sessions to digest authentication."""
+        self.hik_request.auth = HTTPDigestAuth(self.usr, self.pwd)
+        self.hik_request_stream.auth = HTTPDigestAuth(self.usr, self.pwd)
+
+    def _request_known_device_info(self):
+        """GET deviceInfo the way that worked last time.
+
+        Returns (response, path), or None if nothing is remembered or the
+        remembered way failed and the device must be probed again.
+        """
+        path = self._endpoint(DEVICE_INFO, None)
+        if path is None:
+            return None
+        digest = self._endpoint(AUTH, AUTH_BASIC) == AUTH_DIGEST
+        if digest:
+            self._use_digest()
+        response = self.hik_request.get(self.root_url + path,
+                                        timeout=CONNECT_TIMEOUT)
+        if response.status_code == requests.codes.ok:
+            return response, path
+        _LOGGING.debug('Remembered endpoints of %s failed with %s, probing.',
+                       self.root_url, response.status_code)
+        self._forget_endpoint()
+        if digest:
+            self.hik_request.auth = (self.usr, self.pwd)
+            self.hik_request_stream.auth = (self.usr, self.pwd)
+        return None
+
+    def _probe_device_info(self):
+        """Find the auth scheme and URL deviceInfo answers on.
+
+        Returns (response, path).
+        """
+        path = DEVICE_INFO_PATH
+        using_digest = False
+
+        response = self.hik_request.get(self.root_url + path,
+                                        timeout=CONNECT_TIMEOUT)
+        if response.status_code == requests.codes.unauthorized:
+            _LOGGING.debug('Basic authentication failed. Using digest.')
+            self._use_digest()
+            using_digest = True
+            response = self.hik_request.get(self.root_url + path)
+
+        if response.status_code == requests.codes.not_found:
+            # Try alternate URL for deviceInfo
+            _LOGGING.debug('Using alternate deviceInfo URL.')
+            path = ALT_DEVICE_INFO_PATH
+            response = self.hik_request.get(self.root_url + path)
+            # Seems to be difference between camera and nvr, they can't seem to
+            # agree if they should 404 or 401 first
+            if not using_digest and response.status_code == requests.codes.unauthorized:
+                _LOGGING.debug('Basic authentication failed. Using digest.')
+                self._use_digest()
+                response = self.hik_request.get(self.root_url + path)
+
+        return response, path
+
     def get_device_info(self):
         """Parse deviceInfo into dictionary."""
         device_info = {}
-        url = '%s/ISAPI/System/deviceInfo' % self.root_url
-        using_digest = False
 
         try:
-            response = self.hik_request.get(url, timeout=CONNECT_TIMEOUT)
-            if response.status_code == requests.codes.unauthorized:
-                _LOGGING.debug('Basic authentication failed. Using digest.')
-                self.hik_request.auth = HTTPDigestAuth(self.usr, self.pwd)
-                self.hik_request_stream.auth = HTTPDigestAuth(self.usr, self.pwd)
-                using_digest = True
-                response = self.hik_request.get(url)
-
-            if response.status_code == requests.codes.not_found:
-                # Try alternate URL for deviceInfo
-                _LOGGING.debug('Using alternate deviceInfo URL.')
-                url = '%s/System/deviceInfo' % self.root_url
-                response = self.hik_request.get(url)
-                # Seems to be difference between camera and nvr, they can't seem to
-                # agree if they should 404 or 401 first
-                if not using_digest and response.status_code == requests.codes.unauthorized:
-                    _LOGGING.debug('Basic authentication failed. Using digest.')
-                    self.hik_request.auth = HTTPDigestAuth(self.usr, self.pwd)
-                    self.hik_request_stream.auth = HTTPDigestAuth(self.usr, self.pwd)
-                    using_digest = True
-                    response = self.hik_request.get(url)
-
+            response, path = self._request_known_device_info() \
+                or self._probe_device_info()
         except (requests.exceptions.RequestException,
                 requests.exceptions.ConnectionError) as err:
             _LOGGING.error('Unable to fetch deviceInfo, error: %s', err)
@@ -545,13 +846,21 @@ class HikCamera(object):
             return None
 
         try:
-            tree = ET.fromstring(response.text)
+            tree = timed(XML_PARSE, response.url, ET.fromstring, response.text)
             self.fetch_namespace(tree, CONTEXT_INFO)
  
             for item in tree:
                 tag = item.tag.split('}')[1]
                 device_info[tag] = item.text
 
+            if self.endpoint_cache is not None:
+                self.endpoint_cache.identify(
+                    self.root_url, device_info.get('serialNumber'),
+                    device_info.get('firmwareVersion'))
+                digest = isinstance(self.hik_request.auth, HTTPDigestAuth)
+                self._remember_endpoints(
+                    auth=AUTH_DIGEST if digest else AUTH_BASIC,
+                    device_info=path)
             return device_info
 
         except AttributeError as err:
@@ -606,7 +915,7 @@ class HikCamera(object):
 
         # pylint: disable=too-many-nested-blocks
         try:
-            content = ET.fromstring(response.text)
+            content = timed(XML_PARSE, response.url, ET.fromstring, response.text)
             self.fetch_namespace(content, CONTEXT_TRIG)
 
             if content[0].find(self.element_query('EventTrigger', CONTEXT_TRIG)):
@@ -674,16 +983,53 @@ class HikCamera(object):
     def watchdog_handler(self):
         """Take care of threads if wachdog expires."""
         _LOGGING.debug('%s Watchdog expired. Resetting connection.', self.name)
+        self.metrics.watchdog_fires += 1
         self.watchdog.stop()
         self.reset_thrd.set()
+        self._close_stream()
+
+    def disconnect(self, timeout=DISCONNECT_TIMEOUT):
+        """Disconnect from event stream.
+
+        Waits up to timeout seconds (None waits forever) for the stream
+        thread and returns True once it has stopped.
+        """
+        self.begin_disconnect()
+        return self.join_stream(timeout)
+
+    def begin_disconnect(self):
+        """Stop the stream and end events() iterators without waiting.
 
-    def disconnect(self):
-        """Disconnect from event stream."""
+        The non-blocking half of disconnect(); join_stream() waits for the
+        rest.
+        """
         _LOGGING.debug('Disconnecting from stream: %s', self.name)
+        self.stop_stream()
+        self.close_subscriptions()
+
+    def stop_stream(self):
+        """Ask the stream thread to stop without waiting for it."""
         self.kill_thrd.set()
-        self.thrd.join()
+        self._close_stream()
+
+    def join_stream(self, timeout=None):
+        """Wait for the stream thread to stop after stop_stream."""
+        if self.thrd.ident is not None:
+            self.thrd.join(timeout)
+        if self.thrd.is_alive():
+            _LOGGING.warning('Event stream thread for %s did not stop '
+                             'within %ss', self.name, timeout)
+            return False
         _LOGGING.debug('Event stream thread for %s is stopped', self.name)
         self.kill_thrd.clear()
+        return True
+
+    def _close_stream(self):
+        """Shut down the open stream socket, interrupting a blocked read."""
+        with self._stream_lock:
+            response = self._stream_response
+        if response is not None:
+            shutdown_response(response)
 
     def start_stream(self):
         """Start thread to process event stream."""
@@ -693,56 +1039,42 @@ class HikCamera(object):
     def alert_stream(self, reset_event, kill_event):
         """Open event stream."""
         _LOGGING.debug('Stream Thread Started: %s, %s', self.name, self.cam_id)
-        start_event = False
-        parse_string = ""
+        parser = AlertStreamParser()
         fail_count = 0
 
-        url = '%s/ISAPI/Event/notification/alertStream' % self.root_url
+        path = self._endpoint(ALERT_STREAM, ALERT_STREAM_PATH)
 
         # pylint: disable=too-many-nested-blocks
-        while True:
+        while not kill_event.is_set():
 
             try:
-                stream = self.hik_request_stream.get(url, stream=True,
-                                                     timeout=(CONNECT_TIMEOUT,
-                                                              READ_TIMEOUT))
+                url = self.root_url + path
+                stream = self._open_stream(url)
                 if stream.status_code == requests.codes.not_found:
                     # Try alternate URL for stream
-                    url = '%s/Event/notification/alertStream' % self.root_url
-                    stream = self.hik_request_stream.get(url, stream=True)
+                    self._forget_endpoint(ALERT_STREAM)
+                    path = ALT_ALERT_STREAM_PATH \
+                        if path == ALERT_STREAM_PATH else ALERT_STREAM_PATH
+                    url = self.root_url + path
+                    stream = self._open_stream(url)
 
                 if stream.status_code != requests.codes.ok:
                     raise ValueError('Connection unsucessful.')
                 else:
                     _LOGGING.debug('%s Connection Successful.', self.name)
                     fail_count = 0
+                    self._remember_endpoints(alert_stream=path)
                     self.watchdog.start()
+                    capture = self.capture
+                    if capture is not None:
+                        capture.note('%s %s' % (NOTE_CONNECT, url))
 
-                for line in stream.iter_lines():
-                    # _LOGGING.debug('Processing line from %s', self.name)
-                    # filter out keep-alive new lines
-                    if line:
-                        str_line = line.decode("utf-8", "ignore")
-                        # New events start with --boundry
-                        if str_line.find('<EventNotificationAlert') != -1:
-                            # Start of event message
-                            start_event = True
-                            parse_string = str_line
-                        elif str_line.find('</EventNotificationAlert>') != -1:
-                            # Message end found found
-                            parse_string += str_line
-                            start_event = False
-                            if parse_string:
-                                try:
-                                    tree = ET.fromstring(parse_string)
-                                    self.process_stream(tree)
-                                    self.update_stale()
-                                except ET.ParseError as err:
-                                    _LOGGING.warning('XML parse error in stream.')
-                                parse_string = ""
-                        else:
-                            if start_event:
-                                parse_string += str_line
+                for chunk in iter_stream_chunks(stream, self.stream_chunk_size):
+                    # Read once, stop_capture() may run on another thread
+                    capture = self.capture
+                    if capture is not None:
+                        capture.write(chunk)
+                    self.feed_stream(parser, chunk)
 
                     if kill_event.is_set():
                         # We were asked to stop the thread so lets do so.
@@ -752,132 +1084,380 @@ class HikCamera(object):
                         raise ValueError('Watchdog failed.')
 
                 if kill_event.is_set():
-                    # We were asked to stop the thread so lets do so.
-                    _LOGGING.debug('Stopping event stream thread for %s',
-                                   self.name)
-                    self.watchdog.stop()
-                    self.hik_request_stream.close()
-                    return
+                    break
                 elif reset_event.is_set():
                     # We need to reset the connection.
                     raise ValueError('Watchdog failed.')
 
-            except (ValueError,
-                    requests.exceptions.ConnectionError,
-                    requests.exceptions.ChunkedEncodingError) as err:
+            except (ValueError, OSError,
+                    requests.exceptions.RequestException) as err:
+                if kill_event.is_set():
+                    # Socket was shut down by disconnect()
+                    break
                 fail_count += 1
+                self.metrics.reconnects += 1
                 reset_event.clear()
                 _LOGGING.warning('%s Connection Failed (count=%d). Waiting %ss. Err: %s',
                                  self.name, fail_count, (fail_count * 5) + 5, err)
-                parse_string = ""
+                parser.reset()
+                self.release_attachments()
                 self.watchdog.stop()
-                self.hik_request_stream.close()
-                time.sleep(5)
+                self._release_stream()
+                if kill_event.wait(5):
+                    break
                 self.update_stale()
-                time.sleep(fail_count * 5)
+                if kill_event.wait(fail_count * 5):
+                    break
                 continue
 
+        # We were asked to stop the thread so lets do so.
+        _LOGGING.debug('Stopping event stream thread for %s', self.name)
+        self.watchdog.stop()
+        self._release_stream()
+
+    def _open_stream(self, url):
+        """Open the alert stream and publish it for _close_stream."""
+        self._release_stream()
+        stream = self.hik_request_stream.get(
+            url, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        with self._stream_lock:
+            self._stream_response = stream
+        if self.kill_thrd.is_set():
+            # disconnect() ran while connecting
+            shutdown_response(stream)
+        return stream
+
+    def _release_stream(self):
+        """Close the current stream response and the stream session."""
+        with self._stream_lock:
+            response, self._stream_response = self._stream_response, None
+        if response is not None:
+            response.close()
+        self.hik_request_stream.close()
+
+    def start_capture(self, target):
+        """Tee the raw alert stream into a capture file or file object."""
+        self.stop_capture()
+        self.capture = CaptureWriter(target)
+        return self.capture
+
+    def stop_capture(self):
+        """Stop capturing the alert stream and close the capture."""
+        capture, self.capture = self.capture, None
+        if capture is not None:
+            capture.close()
+
+    def feed_stream(self, parser, data):
+        """Frame raw alertStream bytes and process each complete alert."""
+        self.metrics.bytes_read += len(data)
+        parser.sink = self.attachment_sink
+        if HOOKS.enabled:
+            self._feed_stream_hooked(parser, data)
+            return
+        for content_type, payload in parser.feed(data):
+            if content_type is None or b'xml' in content_type:
+                self.process_payload(payload)
+            elif isinstance(payload, Attachment):
+                self.process_attachment(payload)
+
+    def _feed_stream_hooked(self, parser, data):
+        """feed_stream reporting the time spent framing each part."""
+        parts = parser.feed(data)
+        while True:
+            start = time.perf_counter()
+            part = next(parts, None)
+            HOOKS.emit(FRAME, self, start, time.perf_counter())
+            if part is None:
+                return
+            content_type, payload = part
+            if content_type is None or b'xml' in content_type:
+                self.process_payload(payload)
+            elif isinstance(payload, Attachment):
+                self.process_attachment(payload)
+
+    def process_payload(self, payload):
+        """Decode a single framed alert payload and process it."""
+        metrics = self.metrics
+        metrics.alerts += 1
+        if self._held is not None:
+            # Any pictures of the previous alert came before this one
+            self.release_attachments()
+        ingest = self.ingest_filter
+        if ingest is not None:
+            action = ingest.classify(payload)
+            if action is not ACCEPT:
+                if action is not HEARTBEAT:
+                    metrics.filtered += 1
+                    return
+                if not self._video_loss_active():
+                    metrics.heartbeats += 1
+                    self.watchdog.pet()
+                    return
+        start = time.perf_counter()
+        try:
+            event = decode_alert(payload)
+        except ET.ParseError:
+            metrics.parse_errors += 1
+            _LOGGING.warning('XML parse error in stream.')
+            return
+        end = time.perf_counter()
+        metrics.parse_time.observe(end - start)
+        if HOOKS.enabled:
+            HOOKS.emit(PARSE, self, start, end)
+        pictures = 0 if self.attachment_sink is None \
+            else announced_pictures(payload)
+        if pictures:
+            self.process_event(event, pictures)
+        else:
+            # Subclasses may override process_event(event)
+            self.process_event(event)
+
+    def process_attachment(self, attachment):
+        """Add a stored binary part to the alert it was sent with."""
+        self.metrics.attachments += 1
+        if self._held is None:
+            _LOGGING.debug('%s Attachment without a pending alert: %s',
+                           self.name, attachment)
+            return
+        self._held_attachments.append(attachment)
+        if len(self._held_attachments) >= self._held[2]:
+            self.release_attachments()
+
+    def release_attachments(self):
+        """Publish a change held back for its pictures with those received."""
+        held, self._held = self._held, None
+        if held is None:
+            return
+        etype, echid, _, changed = held
+        attachments = tuple(self._held_attachments)
+        self._held_attachments = []
+        if attachments:
+            self._attachments[(etype, echid)] = attachments
+        else:
+            self._attachments.pop((etype, echid), None)
+        if changed:
+            self.publish_changes(etype, echid)
+
+    def _video_loss_active(self):
+        """Return True if a tracked Video Loss sensor is active."""
+        if self.event_states is None:
+            # initialize() failed, nothing is tracked
+            return False
+        records = self.event_states.get('Video Loss')
+        return bool(records) and any(record.state for record in records)
+
     def process_stream(self, tree):
         """Process incoming event stream packets."""
-        if not self.namespace[CONTEXT_ALERT]:
-            self.fetch_namespace(tree, CONTEXT_ALERT)
+        self.process_event(AlertEvent.from_tree(tree))
 
-        try:
-            etype = SENSOR_MAP[tree.find(
-                self.element_query('eventType', CONTEXT_ALERT)).text.lower()]
-            
-            # Since this pasing is different and not really usefull for now, just return without error.
-            if len(etype) > 0 and etype == 'Ongoing Events':
-                return
-            
-            estate = tree.find(
-                self.element_query('eventState', CONTEXT_ALERT)).text
+    def process_event(self, event, pictures=0):
+        """Process a decoded alert.
 
-            for idtype in ID_TYPES:
-                echid = tree.find(self.element_query(idtype, CONTEXT_ALERT))
-                if echid is not None:
-                    try:
-                        # Need to make sure this is actually a number
-                        echid = int(echid.text)
-                        break
-                    except (ValueError, TypeError) as err:
-                        # Field must not be an integer or is blank
-                        pass
+        pictures is the number of binary parts the alert announced; the
+        published change waits for them to be attached.
+        """
+        if not self.namespace[CONTEXT_ALERT]:
+            nmsp = event.namespace
+            self.namespace[CONTEXT_ALERT] = nmsp if nmsp.startswith('http') else XML_NAMESPACE
+            _LOGGING.debug('Device alerts namespace: %s', self.namespace[CONTEXT_ALERT])
+
+        if event.event_type is None or event.state is None \
+                or event.count is None:
+            self.metrics.parse_errors += 1
+            _LOGGING.error('Problem finding attribute: %s', event)
+            return
 
-            ecount = tree.find(
-                self.element_query('activePostCount', CONTEXT_ALERT)).text
-        except (AttributeError, KeyError, IndexError) as err:
+        try:
+            etype = SENSOR_MAP[event.event_type.lower()]
+        except KeyError as err:
+            self.metrics.unknown_sensors += 1
             _LOGGING.error('Problem finding attribute: %s', err)
             return
 
+        # Since this pasing is different and not really usefull for now, just return without error.
+        if etype == 'Ongoing Events':
+            return
+
+        echid = event.channel
+        estate = (event.state == 'active')
+
+        if self.journal is not None:
+            self.journal.append(self._journal_device, etype, echid, estate,
+                                event.count, event.date_time)
+        if self._subscriptions:
+            self._notify_subscriptions(etype, echid, estate, event.count,
+                                       event.date_time)
+
         # Take care of keep-alive
-        if len(etype) > 0 and etype == 'Video Loss':
+        if etype == 'Video Loss':
             self.watchdog.pet()
 
         # Track state if it's in the event list.
-        if len(etype) > 0:
-            state = self.fetch_attributes(etype, echid)
-            if state:
-                # Determine if state has changed
-                # If so, publish, otherwise do nothing
-                estate = (estate == 'active')
-                old_state = state[0]
-                attr = [estate, echid, int(ecount),
-                        datetime.datetime.now()]
-                self.update_attributes(etype, echid, attr)
-
+        record = self.fetch_attributes(etype, echid)
+        if record:
+            # Determine if state has changed
+            # If so, publish, otherwise do nothing
+            hooked = HOOKS.enabled
+            if hooked:
+                start = time.perf_counter()
+            with self._state_lock:
+                old_state = record.state
+                record.state = estate
+                record.count = event.count
+                record.last_update = datetime.datetime.now()
+                if self.history is not None:
+                    self.history.record(etype, echid, estate)
+                if self.shared_state is not None:
+                    self.shared_state.write(self._shared_device, etype,
+                                            echid, estate, event.count)
+                if estate:
+                    self._schedule_stale(etype, record)
+                else:
+                    self._cancel_stale(etype, record)
+            if hooked:
+                HOOKS.emit(STATE_UPDATE, self, start, time.perf_counter())
+
+            if pictures:
+                self._held = (etype, echid, pictures, estate != old_state)
+            else:
+                if self._attachments:
+                    self._attachments.pop((etype, echid), None)
                 if estate != old_state:
                     self.publish_changes(etype, echid)
-                self.watchdog.pet()
+            self.watchdog.pet()
 
     def update_stale(self):
-        """Update stale active statuses"""
+        """Update stale active statuses that are already due."""
+        # Expiry normally fires from the scheduler on its own, this only
+        # catches up on anything that is overdue right now.
+        now = self.scheduler.time()
+        for (etype, channel), call in list(self._stale_calls.items()):
+            if call.active and call.deadline <= now:
+                call.cancel()
+                record = self.fetch_attributes(etype, channel)
+                if record is not None:
+                    self._expire_stale(etype, record)
+
+    def _schedule_stale(self, etype, record):
+        """(Re)start the stale timer of an active event."""
         # Some events don't post an inactive XML, only active.
-        # If we don't get an active update for 5 seconds we can
+        # If we don't get an active update within the window we can
         # assume the event is no longer active and update accordingly.
-        for etype, echannels in self.event_states.items():
-            for eprop in echannels:
-                if eprop[3] is not None:
-                    sec_elap = ((datetime.datetime.now()-eprop[3])
-                                .total_seconds())
-                    # print('Seconds since last update: {}'.format(sec_elap))
-                    if sec_elap > 5 and eprop[0] is True:
-                        _LOGGING.debug('Updating stale event %s on CH(%s)',
-                                       etype, eprop[1])
-                        attr = [False, eprop[1], eprop[2],
-                                datetime.datetime.now()]
-                        self.update_attributes(etype, eprop[1], attr)
-                        self.publish_changes(etype, eprop[1])
+        deadline = self.scheduler.time() + self.stale_timeouts.get(
+            etype, self.stale_timeout)
+        key = (etype, record.channel)
+        call = self._stale_calls.get(key)
+        if call is None:
+            self._stale_calls[key] = self.scheduler.call_at(
+                deadline,
+                functools.partial(self._expire_stale, etype, record, True))
+        else:
+            call.reschedule(deadline)
+
+    def _cancel_stale(self, etype, record):
+        """Stop the stale timer of an event that went inactive."""
+        call = self._stale_calls.get((etype, record.channel))
+        if call is not None:
+            call.cancel()
+
+    def _expire_stale(self, etype, record, from_timer=False):
+        """Mark an event inactive once its stale window passed."""
+        with self._state_lock:
+            if record.state is not True \
+                    or self._stale_calls[(etype, record.channel)].active:
+                # Went inactive or was refreshed in the meantime
+                return
+            _LOGGING.debug('Updating stale event %s on CH(%s)',
+                           etype, record.channel)
+            record.state = False
+            record.last_update = datetime.datetime.now()
+            if self.history is not None:
+                self.history.record(etype, record.channel, False)
+            if self.shared_state is not None:
+                self.shared_state.write(self._shared_device, etype,
+                                        record.channel, False, record.count)
+            self._attachments.pop((etype, record.channel), None)
+        if self.journal is not None:
+            self.journal.append(self._journal_device, etype, record.channel,
+                                False, record.count, source=SOURCE_STALE)
+        if self._subscriptions:
+            self._notify_subscriptions(etype, record.channel, False,
+                                       record.count)
+        self.metrics.stale_expiries += 1
+        if from_timer:
+            self.publish_later(etype, record.channel)
+        else:
+            self.publish_changes(etype, record.channel)
 
     def publish_changes(self, etype, echid):
         """Post updates for specified event type."""
+        if self.coalescer is not None:
+            self.coalescer.submit(etype, echid)
+        else:
+            self.publish_now(etype, echid)
+
+    def publish_later(self, etype, echid, coalesce=True):
+        """Publish a change found by a timer, off the scheduler thread.
+
+        One scheduler runs the timers of every camera, so callbacks must
+        not run on it. They are queued to the dispatch executor, or to the
+        publishing thread shared by all cameras if there is none.
+        """
+        publish = self.publish_changes if coalesce else self.publish_now
+        if self.dispatch_executor is not None:
+            # Only queues the callbacks
+            publish(etype, echid)
+        else:
+            get_publisher().submit((id(self), etype, echid), publish, etype,
+                                   echid)
+
+    def publish_now(self, etype, echid):
+        """Post updates for specified event type, bypassing coalescing."""
         _LOGGING.debug('%s Update: %s, %s',
                        self.name, etype, self.fetch_attributes(etype, echid))
-        signal = 'ValueChanged.{}'.format(self.cam_id)
-        sender = '{}.{}'.format(etype, echid)
+        event = self.sensor_event(etype, echid)
+        attachments = self._attachments.get((etype, echid))
+        if attachments:
+            event = event.with_attachments(attachments)
+        published = time.perf_counter()
+        if self.dispatch_executor is not None:
+            self.dispatch_executor.submit(
+                (id(self), event.key), self._publish, event, published)
+        else:
+            with self._publish_lock:
+                self._publish(event, published)
+
+    def _publish(self, event, published=None):
+        """Send change notifications for a SensorEvent."""
+        metrics = self.metrics
+        start = time.perf_counter()
+        if published is not None:
+            # Time spent queued for a dispatch worker
+            metrics.event_age.observe(start - published)
         if dispatcher:
-            dispatcher.send(signal=signal, sender=sender)
+            dispatcher.send(signal=event.signal, sender=event.sender)
 
-        self._do_update_callback('{}.{}.{}'.format(self.cam_id, etype, echid))
+        metrics.callbacks += self._do_update_callback(event)
+        end = time.perf_counter()
+        metrics.callback_time.observe(end - start)
+        if HOOKS.enabled:
+            HOOKS.emit(DISPATCH, self, start, end)
 
     def fetch_attributes(self, event, channel):
         """Returns attribute list for a given event/channel."""
         try:
-            for sensor in self.event_states[event]:
-                if sensor[1] == int(channel):
-                    return sensor
-        except (KeyError, TypeError):
+            return self.event_states.lookup(event, channel)
+        except AttributeError:
             return None
 
     def update_attributes(self, event, channel, attr):
         """Update attribute list for current event/channel."""
-        try:
-            for i, sensor in enumerate(self.event_states[event]):
-                if sensor[1] == int(channel):
-                    self.event_states[event][i] = attr
-        except (KeyError, TypeError):
+        record = self.fetch_attributes(event, channel)
+        if record is None:
             _LOGGING.debug('Error updating attributes for: (%s, %s)',
                            event, channel)
+            return
+        record.state, _, record.count, record.last_update = attr
 
     def inject_events(self, events):
         """Inject discovered events into the camera's event_states.
@@ -891,19 +1471,8 @@ class HikCamera(object):
         """
         for event_name, channels in events.items():
             for channel in channels:
-                # Only add if not already present
-                if event_name not in self.event_states:
-                    self.event_states[event_name] = []
-
-                # Check if this channel is already tracked
-                channel_exists = any(
-                    sensor[1] == channel for sensor in self.event_states[event_name]
-                )
-                if not channel_exists:
-                    # Add the event state: [is_active, channel, count, last_update_time]
-                    self.event_states[event_name].append(
-                        [False, channel, 0, datetime.datetime.now()]
-                    )
+                # Already tracked channels are left untouched
+                self.event_states.add(event_name, channel)
 
     def get_recording_days(self, track_id, start_date, end_date):
         """Get days with recordings available.
@@ -964,7 +1533,7 @@ class HikCamera(object):
                     current_start = current_end
                     continue
 
-                root = ET.fromstring(response.text)
+                root = timed(XML_PARSE, response.url, ET.fromstring, response.text)
 
                 # Find all searchMatchItem elements (handle namespace)
                 for match in root.iter():
@@ -1069,7 +1638,7 @@ class HikCamera(object):
             )
 
             if response.status_code == requests.codes.ok:
-                root = ET.fromstring(response.text)
+                root = timed(XML_PARSE, response.url, ET.fromstring, response.text)
                 recordings = self._parse_recording_results(root)
 
         except (requests.exceptions.RequestException,
@@ -0,0 +1,232 @@
+"""
+pyhik.history
+~~~~~~~~~~~~~~~~~~~~
+Bounded per-sensor event history
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+from array import array
+import logging
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pyhik.constants import HISTORY_CAPACITY, HISTORY_MAX_SENSORS
+
+_LOGGING = logging.getLogger(__name__)
+
+# Bytes per entry: a double timestamp and a state byte
+ENTRY_SIZE = 9
+
+
+class RingBuffer(object):
+    """Fixed size ring of (monotonic timestamp, state) entries.
+
+    Timestamps are appended in order, so range lookups are a binary search
+    over the ring. Once full the oldest entry is overwritten.
+    """
+
+    __slots__ = ('capacity', 'times', 'states', 'start', 'size', 'total')
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY) -> None:
+        """Preallocate storage for capacity entries."""
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.states = bytearray(capacity)
+        self.start = 0
+        self.size = 0
+        # Entries ever appended, including overwritten ones
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        """Return the bytes used by the entry storage."""
+        return self.capacity * ENTRY_SIZE
+
+    def append(self, timestamp: float, state: bool) -> None:
+        """Add an entry, overwriting the oldest one when full."""
+        capacity = self.capacity
+        if self.size < capacity:
+            index = (self.start + self.size) % capacity
+            self.size += 1
+        else:
+            index = self.start
+            self.start = (index + 1) % capacity
+        self.times[index] = timestamp
+        self.states[index] = state
+        self.total += 1
+
+    def _time(self, position: int) -> float:
+        return self.times[(self.start + position) % self.capacity]
+
+    def _bisect(self, timestamp: float) -> int:
+        """Return the first position with a time >= timestamp."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._time(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def span(self, start: Optional[float] = None,
+             end: Optional[float] = None) -> Tuple[int, int]:
+        """Return the positions of entries in [start, end)."""
+        first = 0 if start is None else self._bisect(start)
+        last = self.size if end is None else self._bisect(end)
+        return first, max(first, last)
+
+    def entries(self, start: Optional[float] = None,
+                end: Optional[float] = None) -> Iterator[Tuple[float, bool]]:
+        """Yield (timestamp, state) in [start, end), oldest first."""
+        first, last = self.span(start, end)
+        capacity = self.capacity
+        for position in range(first, last):
+            index = (self.start + position) % capacity
+            yield self.times[index], bool(self.states[index])
+
+    def count(self, start: Optional[float] = None,
+              end: Optional[float] = None,
+              state: Optional[bool] = True) -> int:
+        """Count entries in [start, end), optionally with a given state."""
+        first, last = self.span(start, end)
+        if state is None:
+            return last - first
+        # Count straight off the state bytes, in at most two slices
+        begin = (self.start + first) % self.capacity
+        length = last - first
+        stop = begin + length
+        states = self.states
+        if stop <= self.capacity:
+            active = states.count(1, begin, stop)
+        else:
+            active = states.count(1, begin) \
+                + states.count(1, 0, stop - self.capacity)
+        return active if state else length - active
+
+    def last(self) -> Optional[Tuple[float, bool]]:
+        """Return the newest entry."""
+        if not self.size:
+            return None
+        index = (self.start + self.size - 1) % self.capacity
+        return self.times[index], bool(self.states[index])
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self.start = 0
+        self.size = 0
+
+
+class EventHistory(object):
+    """Recent alerts of a camera, one RingBuffer per event type and channel.
+
+    Buffers are allocated on a sensor's first alert; at most max_sensors are
+    kept, so memory is bounded by max_sensors * capacity * 9 bytes. Times
+    are time.monotonic() values. Queries take an absolute [start, end)
+    range or a window of seconds back from now. A channel of None queries
+    all channels of the event type.
+    """
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY,
+                 max_sensors: int = HISTORY_MAX_SENSORS) -> None:
+        """Initialize an empty history."""
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = capacity
+        self.max_sensors = max_sensors
+        self.clock = time.monotonic
+        self._buffers: Dict[Tuple[str, int], RingBuffer] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def max_bytes(self) -> int:
+        """Return the most entry storage this history can use."""
+        return self.max_sensors * self.capacity * ENTRY_SIZE
+
+    @property
+    def nbytes(self) -> int:
+        """Return the entry storage currently allocated."""
+        return len(self._buffers) * self.capacity * ENTRY_SIZE
+
+    def sensors(self) -> List[Tuple[str, int]]:
+        """Return the (event type, channel) pairs with history."""
+        return list(self._buffers)
+
+    def record(self, etype: str, channel: int, state: bool,
+               timestamp: Optional[float] = None) -> None:
+        """Append an alert to its sensor's buffer."""
+        if timestamp is None:
+            timestamp = self.clock()
+        key = (etype, channel)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                if len(self._buffers) >= self.max_sensors:
+                    if not self.dropped:
+                        _LOGGING.warning('Event history is full at %d '
+                                         'sensors, ignoring %s on CH(%s)',
+                                         self.max_sensors, etype, channel)
+                    self.dropped += 1
+                    return
+                buffer = self._buffers[key] = RingBuffer(self.capacity)
+            buffer.append(timestamp, state)
+
+    def _range(self, start, end, window):
+        if window is not None:
+            start = (self.clock() if end is None else end) - window
+        return start, end
+
+    def _matching(self, etype: str, channel) -> List[RingBuffer]:
+        if channel is not None:
+            buffer = self._buffers.get((etype, channel))
+            return [buffer] if buffer is not None else []
+        return [buffer for (event, _), buffer in self._buffers.items()
+                if event == etype]
+
+    def events(self, etype: str, channel: Optional[int] = None,
+               start: Optional[float] = None, end: Optional[float] = None,
+               window: Optional[float] = None) -> List[Tuple[float, bool]]:
+        """Return (timestamp, state) entries in a range, oldest first."""
+        start, end = self._range(start, end, window)
+        with self._lock:
+            entries = [entry for buffer in self._matching(etype, channel)
+                       for entry in buffer.entries(start, end)]
+        if channel is None:
+            entries.sort()
+        return entries
+
+    def count(self, etype: str, channel: Optional[int] = None,
+              start: Optional[float] = None, end: Optional[float] = None,
+              window: Optional[float] = None,
+              state: Optional[bool] = True) -> int:
+        """Count alerts in a range; active ones unless state says otherwise."""
+        start, end = self._range(start, end, window)
+        with self._lock:
+            return sum(buffer.count(start, end, state)
+                       for buffer in self._matching(etype, channel))
+
+    def rate(self, etype: str, channel: Optional[int] = None,
+             window: float = 60.0, state: Optional[bool] = True) -> float:
+        """Return alerts per second over the last window seconds."""
+        return self.count(etype, channel, window=window, state=state) \
+            / window
+
+    def last(self, etype: str, channel: int) -> Optional[Tuple[float, bool]]:
+        """Return the newest (timestamp, state) of a sensor."""
+        with self._lock:
+            buffer = self._buffers.get((etype, channel))
+            return buffer.last() if buffer is not None else None
+
+    def clear(self) -> None:
+        """Drop all history and release its buffers."""
+        with self._lock:
+            self._buffers.clear()
+            self.dropped = 0
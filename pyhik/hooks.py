@@ -0,0 +1,180 @@
+"""
+pyhik.hooks
+~~~~~~~~~~~~~~~~~~~~
+Timing hooks for the stages of requests and alert stream processing
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_LOGGING = logging.getLogger(__name__)
+
+# HTTP request stages, subject is the request URL
+REQUEST_START = 'request_start'
+CONNECT = 'connect'
+FIRST_BYTE = 'first_byte'
+BODY_READ = 'body_read'
+XML_PARSE = 'xml_parse'
+
+# Alert stream stages, subject is the camera
+FRAME = 'frame'
+PARSE = 'parse'
+STATE_UPDATE = 'state_update'
+DISPATCH = 'dispatch'
+
+REQUEST_STAGES = (REQUEST_START, CONNECT, FIRST_BYTE, BODY_READ, XML_PARSE)
+STREAM_STAGES = (FRAME, PARSE, STATE_UPDATE, DISPATCH)
+STAGES = REQUEST_STAGES + STREAM_STAGES
+
+# hook(stage, subject, start, end) with perf_counter timestamps
+Hook = Callable[[str, object, float, float], None]
+
+
+class HookRegistry(object):
+    """Hooks called with the start and end time of each stage.
+
+    Call sites test ``enabled`` before taking any timestamps, so with no
+    hooks registered instrumentation costs one attribute lookup. Hooks run
+    on the thread doing the work and should be quick; exceptions they
+    raise are logged and swallowed.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self.enabled = False
+        self._hooks: Dict[str, Tuple[Hook, ...]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, hook: Hook,
+                 stages: Optional[Iterable[str]] = None) -> Hook:
+        """Call hook for the given stages, or for every stage."""
+        stages = STAGES if stages is None else tuple(stages)
+        for stage in stages:
+            if stage not in STAGES:
+                raise ValueError('Unknown stage: %s' % stage)
+        with self._lock:
+            hooks = dict(self._hooks)
+            for stage in stages:
+                if hook not in hooks.get(stage, ()):
+                    hooks[stage] = hooks.get(stage, ()) + (hook,)
+            self._publish(hooks)
+        return hook
+
+    def unregister(self, hook: Hook) -> None:
+        """Stop calling hook for any stage."""
+        with self._lock:
+            hooks = {}
+            for stage, registered in self._hooks.items():
+                registered = tuple(item for item in registered
+                                   if item != hook)
+                if registered:
+                    hooks[stage] = registered
+            self._publish(hooks)
+
+    def clear(self) -> None:
+        """Remove every hook."""
+        with self._lock:
+            self._publish({})
+
+    def emit(self, stage: str, subject, start: float, end: float) -> None:
+        """Report a finished stage to its hooks."""
+        for hook in self._hooks.get(stage, ()):
+            try:
+                hook(stage, subject, start, end)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGING.exception('Hook %s failed for %s', hook, stage)
+
+    def _publish(self, hooks: Dict[str, Tuple[Hook, ...]]) -> None:
+        # Caller holds the lock.
+        self._hooks = hooks
+        self.enabled = bool(hooks)
+
+
+# Hooks for every device in the process
+HOOKS = HookRegistry()
+
+
+def timed(stage: str, subject, func, *args):
+    """Call func(*args), reporting its duration as stage if hooked."""
+    if not HOOKS.enabled:
+        return func(*args)
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        HOOKS.emit(stage, subject, start, time.perf_counter())
+
+
+class _HookedConnectionMixin(object):
+    """Report the time spent establishing a new connection."""
+
+    def connect(self):
+        if not HOOKS.enabled:
+            return super().connect()
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            HOOKS.emit(CONNECT, '%s:%s' % (self.host, self.port), start,
+                       time.perf_counter())
+
+
+class _HookedHTTPConnection(_HookedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _HookedHTTPSConnection(_HookedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _HookedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _HookedHTTPConnection
+
+
+class _HookedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _HookedHTTPSConnection
+
+
+class HookedAdapter(HTTPAdapter):
+    """HTTPAdapter reporting request stages to HOOKS.
+
+    Emits request_start, connect (new connections only), first_byte (the
+    response headers arrived) and, unless the request streams its body,
+    body_read. Behaves like a plain HTTPAdapter when nothing is hooked.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _HookedHTTPConnectionPool,
+            'https': _HookedHTTPSConnectionPool,
+        }
+
+    def send(self, request, stream=False, **kwargs):
+        if not HOOKS.enabled:
+            return super().send(request, stream=stream, **kwargs)
+        url = request.url
+        start = time.perf_counter()
+        HOOKS.emit(REQUEST_START, url, start, start)
+        response = super().send(request, stream=stream, **kwargs)
+        first_byte = time.perf_counter()
+        HOOKS.emit(FIRST_BYTE, url, start, first_byte)
+        if not stream:
+            # The session would read it next anyway
+            response.content  # pylint: disable=pointless-statement
+            HOOKS.emit(BODY_READ, url, first_byte, time.perf_counter())
+        return response
+
+
+def install_hooks(session) -> None:
+    """Mount HookedAdapter on a requests session."""
+    session.mount('http://', HookedAdapter())
+    session.mount('https://', HookedAdapter())
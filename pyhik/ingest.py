@@ -0,0 +1,91 @@
+"""
+pyhik.ingest
+~~~~~~~~~~~~~~~~~~~~
+Classify framed alerts from their raw bytes before decoding them
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import re
+from typing import FrozenSet, Iterable, Optional
+
+from pyhik.constants import SENSOR_MAP
+
+# Actions returned by IngestFilter.classify
+ACCEPT = 'accept'
+HEARTBEAT = 'heartbeat'
+DROP = 'drop'
+
+HEARTBEAT_EVENT = b'videoloss'
+ONGOING_EVENT = b'duration'
+
+# Tolerates namespace prefixes and whitespace around the value
+_EVENT_TYPE = re.compile(rb'<(?:\w+:)?eventType>\s*([^<\s]*)\s*<')
+_EVENT_STATE = re.compile(rb'<(?:\w+:)?eventState>\s*([^<\s]*)\s*<')
+
+
+def raw_event_types(names: Iterable[str]) -> FrozenSet[bytes]:
+    """Map SENSOR_MAP names ('Motion') or raw types ('VMD') to raw bytes."""
+    raw = set()
+    for name in names:
+        lowered = name.lower()
+        sensors = {event for event, sensor in SENSOR_MAP.items()
+                   if sensor.lower() == lowered}
+        raw.update(sensors or (lowered,))
+    return frozenset(event.encode() for event in raw)
+
+
+class IngestFilter(object):
+    """Decide from the raw bytes whether an alert is worth decoding.
+
+    Only eventType, and eventState for videoloss, are looked at. Alerts
+    that process_event would discard anyway are dropped: 'duration'
+    (Ongoing Events) messages, event types missing from SENSOR_MAP and
+    types listed in ignore. Inactive videoloss alerts, the keep-alives
+    most devices send every few seconds, are reported as heartbeats, as
+    are all videoloss alerts when videoloss is ignored.
+    Alerts without a recognizable eventType are accepted so decoding can
+    report them.
+    """
+
+    def __init__(self, heartbeats: bool = True, ongoing: bool = True,
+                 unknown: bool = True,
+                 ignore: Optional[Iterable[str]] = None) -> None:
+        """Initialize the filter.
+
+        Args:
+            heartbeats: Report inactive videoloss alerts as heartbeats.
+            ongoing: Drop 'duration' alerts.
+            unknown: Drop event types missing from SENSOR_MAP.
+            ignore: Event types to drop, as SENSOR_MAP names such as
+                'Motion' or raw eventType values such as 'VMD'.
+        """
+        self.heartbeats = heartbeats
+        self.ongoing = ongoing
+        self.unknown = unknown
+        self.ignore = raw_event_types(ignore or ())
+        self._known = frozenset(event.encode() for event in SENSOR_MAP)
+
+    def classify(self, payload) -> str:
+        """Return ACCEPT, HEARTBEAT or DROP for a framed alert payload."""
+        match = _EVENT_TYPE.search(payload)
+        if match is None:
+            return ACCEPT
+        event = match.group(1).lower()
+        if event == HEARTBEAT_EVENT:
+            # Ignored or not, videoloss keeps feeding the watchdog
+            if event in self.ignore:
+                return HEARTBEAT
+            if self.heartbeats:
+                state = _EVENT_STATE.search(payload)
+                if state is not None \
+                        and state.group(1).lower() == b'inactive':
+                    return HEARTBEAT
+        elif event == ONGOING_EVENT:
+            if self.ongoing:
+                return DROP
+        elif self.unknown and event not in self._known:
+            return DROP
+        if event in self.ignore:
+            return DROP
+        return ACCEPT
@@ -11,6 +11,7 @@ Licensed under the MIT license.
 from dataclasses import dataclass, field
 from enum import Enum
 import logging
+import time
 from typing import Any, Dict, List, Optional, Union
 from urllib.parse import quote, urlparse, urlunparse
 
@@ -22,6 +23,9 @@ try:
 except ImportError:
     xmltodict = None
 
+from pyhik.hooks import XML_PARSE, install_hooks, timed
+from pyhik.metrics import REQUEST_REGISTRY, RequestMetrics
+
 _LOGGER = logging.getLogger(__name__)
 
 # ISAPI Endpoints
@@ -209,9 +213,11 @@ class ISAPIClient:
 
         self._session = requests.Session()
         self._session.verify = verify_ssl
+        install_hooks(self._session)
         self._auth: Optional[Union[HTTPBasicAuth, HTTPDigestAuth]] = None
         self._device_info: Dict[str, Any] = {}
         self._capabilities: Optional[DeviceCapabilities] = None
+        self.metrics = REQUEST_REGISTRY.register(RequestMetrics(self.host))
 
     def _detect_auth_method(self) -> None:
         """Detect the authentication method (Basic or Digest)."""
@@ -281,6 +287,9 @@ class ISAPIClient:
         self._detect_auth_method()
 
         url = f"{self.base_url}{endpoint}"
+        metrics = self.metrics
+        metrics.requests += 1
+        start = time.perf_counter()
 
         try:
             if method == HTTPMethod.GET:
@@ -314,27 +323,38 @@ class ISAPIClient:
                     method.value, url, auth=self._auth, timeout=REQUEST_TIMEOUT
                 )
 
-        except requests.exceptions.ConnectionError as err:
-            raise ISAPIConnectionError(f"Cannot connect to {self.host}") from err
-        except requests.exceptions.Timeout as err:
-            raise ISAPIConnectionError(f"Timeout connecting to {self.host}") from err
         except requests.exceptions.RequestException as err:
+            metrics.failures += 1
+            metrics.connection_errors += 1
+            if isinstance(err, requests.exceptions.ConnectionError):
+                raise ISAPIConnectionError(f"Cannot connect to {self.host}") from err
+            if isinstance(err, requests.exceptions.Timeout):
+                raise ISAPIConnectionError(f"Timeout connecting to {self.host}") from err
             raise ISAPIConnectionError(f"Request failed: {err}") from err
-
-        if response.status_code == 401:
+        finally:
+            metrics.request_time.observe(time.perf_counter() - start)
+
+        status = response.status_code
+        if status >= 400:
+            metrics.failures += 1
+            if status in (401, 403):
+                metrics.auth_errors += 1
+            elif status == 404:
+                metrics.not_found += 1
+        if status == 401:
             raise ISAPIAuthError("Invalid credentials")
-        if response.status_code == 403:
+        if status == 403:
             raise ISAPIAuthError("Insufficient permissions")
-        if response.status_code == 404:
+        if status == 404:
             raise ISAPINotFoundError(f"Endpoint not found: {endpoint}")
-        if response.status_code >= 400:
-            raise ISAPIError(f"Request failed with status {response.status_code}")
+        if status >= 400:
+            raise ISAPIError(f"Request failed with status {status}")
 
         content_type = response.headers.get("content-type", "")
         if "image" in content_type or "octet-stream" in content_type:
             return response.content
 
-        return self._parse_xml(response.text)
+        return timed(XML_PARSE, url, self._parse_xml, response.text)
 
     def get_device_info(self) -> Dict[str, Any]:
         """Get device information."""
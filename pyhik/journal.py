@@ -0,0 +1,249 @@
+"""
+pyhik.journal
+~~~~~~~~~~~~~~~~~~~~
+Append-only SQLite journal of processed alerts
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import collections
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pyhik.constants import (
+    JOURNAL_BATCH_SIZE, JOURNAL_FLUSH_INTERVAL, JOURNAL_QUEUE_SIZE)
+
+_LOGGING = logging.getLogger(__name__)
+
+# Record sources
+SOURCE_ALERT = 0
+SOURCE_STALE = 1
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS events ('
+    ' id INTEGER PRIMARY KEY,'
+    ' time REAL NOT NULL,'
+    ' device TEXT NOT NULL,'
+    ' event_type TEXT NOT NULL,'
+    ' channel INTEGER,'
+    ' state INTEGER NOT NULL,'
+    ' count INTEGER,'
+    ' device_time TEXT,'
+    ' source INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX IF NOT EXISTS events_time ON events (time)',
+    'CREATE INDEX IF NOT EXISTS events_sensor'
+    ' ON events (device, event_type, channel, time)',
+)
+
+_INSERT = ('INSERT INTO events (time, device, event_type, channel, state,'
+           ' count, device_time, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+
+_COLUMNS = ('time, device, event_type, channel, state, count, device_time,'
+            ' source')
+
+
+class JournalRecord(NamedTuple):
+    """One journaled alert."""
+
+    time: float
+    device: str
+    event_type: str
+    channel: Optional[int]
+    state: bool
+    count: Optional[int]
+    device_time: Optional[str]
+    source: int = SOURCE_ALERT
+
+    @classmethod
+    def from_row(cls, row) -> 'JournalRecord':
+        """Build a record from a selected row."""
+        return cls(row[0], row[1], row[2], row[3], bool(row[4]), *row[5:])
+
+
+class EventJournal(object):
+    """Append-only journal of alerts in an SQLite database in WAL mode.
+
+    append() only queues the record, so it never waits on disk. A writer
+    thread commits queued records in batches of up to batch_size, at least
+    every flush_interval seconds. When more than maxsize records are
+    waiting, new ones are dropped and counted in ``dropped``. One journal
+    can be shared by every camera of a fleet.
+    """
+
+    def __init__(self, path: str, batch_size: int = JOURNAL_BATCH_SIZE,
+                 flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+                 maxsize: int = JOURNAL_QUEUE_SIZE) -> None:
+        """Open or create the journal and start its writer."""
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.maxsize = maxsize
+        self.written = 0
+        self.dropped = 0
+        self._pending = collections.deque()
+        self._wakeup = threading.Event()
+        self._idle = threading.Condition()
+        self._writing = False
+        # Orders append() against close(), so nothing is queued after the
+        # writer's final drain
+        self._lock = threading.Lock()
+        self._closed = False
+
+        connection = self._connect()
+        with connection:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+        self._writer = threading.Thread(
+            target=self._run, args=(connection,), name='pyhik-journal',
+            daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def append(self, device: str, event_type: str, channel, state: bool,
+               count=None, device_time=None, source: int = SOURCE_ALERT,
+               timestamp: Optional[float] = None) -> bool:
+        """Queue an alert for writing, returning False if it was dropped."""
+        pending = self._pending
+        record = (time.time() if timestamp is None else timestamp,
+                  device, event_type, channel, int(state), count,
+                  device_time, source)
+        with self._lock:
+            if len(pending) >= self.maxsize or self._closed:
+                self.dropped += 1
+                return False
+            pending.append(record)
+        if len(pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    @property
+    def depth(self) -> int:
+        """Return the number of records waiting to be written."""
+        return len(self._pending)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued record is committed."""
+        self._wakeup.set()
+        with self._idle:
+            return self._idle.wait_for(
+                lambda: not self._pending and not self._writing, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Write what is queued, stop the writer and close the database."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout)
+
+    def __enter__(self) -> 'EventJournal':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _run(self, connection: sqlite3.Connection) -> None:
+        pending = self._pending
+        try:
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                closed = self._closed
+                while pending:
+                    batch = []
+                    with self._idle:
+                        self._writing = True
+                    while pending and len(batch) < self.batch_size:
+                        batch.append(pending.popleft())
+                    try:
+                        with connection:
+                            connection.executemany(_INSERT, batch)
+                        self.written += len(batch)
+                    except sqlite3.Error as err:
+                        self.dropped += len(batch)
+                        _LOGGING.error('Unable to write %d journal records: '
+                                       '%s', len(batch), err)
+                with self._idle:
+                    self._writing = False
+                    self._idle.notify_all()
+                if closed:
+                    return
+        finally:
+            connection.close()
+
+    def query(self, device: Optional[str] = None,
+              event_type: Optional[str] = None, channel=None,
+              start: Optional[float] = None, end: Optional[float] = None,
+              limit: Optional[int] = None) -> List[JournalRecord]:
+        """Return committed records matching every given filter, in order.
+
+        start and end are time.time() values bounding [start, end).
+        """
+        where, args = _where(device=device, event_type=event_type,
+                             channel=channel, start=start, end=end)
+        sql = 'SELECT %s FROM events%s ORDER BY time, id' % (_COLUMNS, where)
+        if limit is not None:
+            sql += ' LIMIT %d' % limit
+        return [JournalRecord.from_row(row) for row in self._read(sql, args)]
+
+    def count(self, device: Optional[str] = None,
+              event_type: Optional[str] = None, channel=None,
+              start: Optional[float] = None, end: Optional[float] = None,
+              state: Optional[bool] = True) -> int:
+        """Count committed alerts, active ones unless state says otherwise."""
+        where, args = _where(
+            device=device, event_type=event_type, channel=channel,
+            state=None if state is None else int(state), source=SOURCE_ALERT,
+            start=start, end=end)
+        return self._read('SELECT COUNT(*) FROM events' + where, args)[0][0]
+
+    def latest_states(self, device: str
+                      ) -> Dict[Tuple[str, Optional[int]], JournalRecord]:
+        """Return the newest record of each event type and channel."""
+        sql = ('SELECT %s FROM events WHERE id IN (SELECT MAX(id) FROM events'
+               ' WHERE device = ? GROUP BY event_type, channel)' % _COLUMNS)
+        records = [JournalRecord.from_row(row)
+                   for row in self._read(sql, (device,))]
+        return {(record.event_type, record.channel): record
+                for record in records}
+
+    def _read(self, sql: str, args) -> list:
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(sql, args).fetchall()
+        finally:
+            connection.close()
+
+
+def _where(start=None, end=None, **equal) -> Tuple[str, list]:
+    """Build a WHERE clause from column values and a time range."""
+    clauses, args = [], []
+    for column, value in equal.items():
+        if value is not None:
+            clauses.append('%s = ?' % column)
+            args.append(value)
+    if start is not None:
+        clauses.append('time >= ?')
+        args.append(start)
+    if end is not None:
+        clauses.append('time < ?')
+        args.append(end)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), args
+
+
+def journal_device(camera) -> str:
+    """Return the device name a camera journals under.
+
+    cam_id may be a random uuid, which would not survive a restart, so
+    the serial number is used, falling back to the host.
+    """
+    return str(camera.serial or camera.host)
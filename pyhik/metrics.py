@@ -0,0 +1,223 @@
+"""
+pyhik.metrics
+~~~~~~~~~~~~~~~~~~~~
+Stream health counters and hot path timing histograms
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+from array import array
+from bisect import bisect_left
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type
+import weakref
+
+# Upper bounds in seconds, roughly 1-2.5-5 steps from 10us to 60s
+TIME_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STREAM_COUNTERS = (
+    'bytes_read', 'alerts', 'heartbeats', 'filtered', 'parse_errors',
+    'unknown_sensors', 'attachments', 'reconnects', 'watchdog_fires',
+    'stale_expiries', 'callbacks')
+STREAM_HISTOGRAMS = ('parse_time', 'callback_time', 'event_age')
+
+REQUEST_COUNTERS = (
+    'requests', 'failures', 'connection_errors', 'auth_errors', 'not_found')
+REQUEST_HISTOGRAMS = ('request_time',)
+
+
+class Histogram(object):
+    """Fixed bucket histogram.
+
+    Buckets are preallocated, so observing a value is a bisect and two
+    in-place additions. Values above the last bound land in an overflow
+    bucket.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Tuple[float, ...] = TIME_BUCKETS) -> None:
+        """Initialize empty buckets."""
+        self.bounds = bounds
+        self.counts = array('Q', bytes(8 * (len(bounds) + 1)))
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        """Return the number of observed values."""
+        return sum(self.counts)
+
+    def merge(self, other: 'Histogram') -> None:
+        """Add the observations of a histogram with the same bounds."""
+        counts = self.counts
+        for index, value in enumerate(other.counts):
+            counts[index] += value
+        self.sum += other.sum
+
+    @classmethod
+    def total(cls, histograms: Iterable['Histogram'],
+              bounds: Tuple[float, ...] = TIME_BUCKETS) -> 'Histogram':
+        """Return the sum of many histograms with the same bounds."""
+        histograms = list(histograms)
+        total = cls(bounds)
+        if histograms:
+            # Transposing the bucket arrays keeps the summing in C
+            total.counts = array('Q', map(sum, zip(
+                *[histogram.counts for histogram in histograms])))
+            total.sum = sum(histogram.sum for histogram in histograms)
+        return total
+
+    def cumulative(self) -> Iterator[Tuple[float, int]]:
+        """Yield (upper bound, cumulative count), ending with +Inf."""
+        total = 0
+        for bound, value in zip(self.bounds + (float('inf'),), self.counts):
+            total += value
+            yield bound, total
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of its bucket."""
+        count = self.count
+        if not count:
+            return None
+        rank = q * count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return None
+
+    def reset(self) -> None:
+        """Clear all observations."""
+        for index in range(len(self.counts)):
+            self.counts[index] = 0
+        self.sum = 0.0
+
+
+class Metrics(object):
+    """Named set of counters and histograms.
+
+    Subclasses list their fields in COUNTERS and HISTOGRAMS. Updates are
+    plain attribute increments without locks.
+    """
+
+    COUNTERS: Tuple[str, ...] = ()
+    HISTOGRAMS: Tuple[str, ...] = ()
+
+    __slots__ = ('name', '__weakref__')
+
+    def __init__(self, name: str = '') -> None:
+        """Initialize zeroed metrics."""
+        self.name = name
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+        for histogram in self.HISTOGRAMS:
+            setattr(self, histogram, Histogram())
+
+    def counters(self) -> Dict[str, int]:
+        """Return the current counter values."""
+        return {counter: getattr(self, counter) for counter in self.COUNTERS}
+
+    def snapshot(self) -> Dict[str, object]:
+        """Return counters plus count, sum, p50 and p99 per histogram."""
+        data: Dict[str, object] = self.counters()
+        for name in self.HISTOGRAMS:
+            histogram = getattr(self, name)
+            data[name] = {'count': histogram.count, 'sum': histogram.sum,
+                          'p50': histogram.quantile(0.5),
+                          'p99': histogram.quantile(0.99)}
+        return data
+
+    def merge(self, other: 'Metrics') -> None:
+        """Add another set of the same metrics into this one."""
+        for counter in self.COUNTERS:
+            setattr(self, counter, getattr(self, counter)
+                    + getattr(other, counter))
+        for name in self.HISTOGRAMS:
+            getattr(self, name).merge(getattr(other, name))
+
+    def reset(self) -> None:
+        """Zero all counters and histograms."""
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+        for name in self.HISTOGRAMS:
+            getattr(self, name).reset()
+
+
+class StreamMetrics(Metrics):
+    """Counters and histograms for one camera's event stream.
+
+    Each counter is normally written by a single thread (the stream thread
+    or event loop, the scheduler for stale expiries), so the GIL keeps them
+    exact; counts from callbacks running on several dispatch workers at
+    once may occasionally under-count. Read with snapshot().
+    """
+
+    COUNTERS = STREAM_COUNTERS
+    HISTOGRAMS = STREAM_HISTOGRAMS
+
+    __slots__ = STREAM_COUNTERS + STREAM_HISTOGRAMS
+
+
+class RequestMetrics(Metrics):
+    """Counters and request time histogram for one ISAPIClient."""
+
+    COUNTERS = REQUEST_COUNTERS
+    HISTOGRAMS = REQUEST_HISTOGRAMS
+
+    __slots__ = REQUEST_COUNTERS + REQUEST_HISTOGRAMS
+
+
+class MetricsRegistry(object):
+    """Tracks live metrics of one kind so they can be aggregated on demand."""
+
+    def __init__(self, kind: Type[Metrics] = StreamMetrics) -> None:
+        """Initialize an empty registry."""
+        self.kind = kind
+        self._metrics: 'weakref.WeakSet[Metrics]' = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def register(self, metrics: Metrics) -> Metrics:
+        """Track metrics until they are garbage collected."""
+        with self._lock:
+            self._metrics.add(metrics)
+        return metrics
+
+    def unregister(self, metrics: Metrics) -> None:
+        """Stop tracking metrics."""
+        with self._lock:
+            self._metrics.discard(metrics)
+
+    def __iter__(self) -> Iterator[Metrics]:
+        with self._lock:
+            metrics: List[Metrics] = list(self._metrics)
+        return iter(metrics)
+
+    def __len__(self) -> int:
+        return len(self._metrics)
+
+    def aggregate(self) -> Metrics:
+        """Return the sum of all tracked metrics."""
+        return aggregate(self, name='all', kind=self.kind)
+
+
+def aggregate(metrics: Iterable[Metrics], name: str = 'all',
+              kind: Type[Metrics] = StreamMetrics) -> Metrics:
+    """Return the sum of several metrics of the same kind."""
+    total = kind(name)
+    for item in metrics:
+        total.merge(item)
+    return total
+
+
+# Every camera registers its stream metrics here
+REGISTRY = MetricsRegistry(StreamMetrics)
+
+# Every ISAPIClient registers its request metrics here
+REQUEST_REGISTRY = MetricsRegistry(RequestMetrics)
@@ -0,0 +1,170 @@
+"""
+pyhik.router
+~~~~~~~~~~~~~~~~~~~~
+Sensor keyed callback routing
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+_LOGGING = logging.getLogger(__name__)
+
+# Matches any camera, event type or channel in a subscription
+WILDCARD = '*'
+
+SensorKey = Tuple[str, str, object]
+
+
+def _channel_key(channel):
+    """Normalize a channel so '1' and 1 route alike."""
+    if isinstance(channel, int):
+        return channel
+    try:
+        return int(channel)
+    except (TypeError, ValueError):
+        return channel
+
+
+class SensorEvent(str):
+    """A published change of one event type on one channel.
+
+    Compares and formats as the legacy ``'cam_id.event_type.channel'``
+    message, so existing callbacks keep working, while exposing the parts
+    as attributes. Cameras build one instance per sensor and reuse it.
+    ``attachments`` holds the pictures stored with the alert behind the
+    change, if any.
+    """
+
+    attachments = ()
+
+    def __new__(cls, cam_id, event_type: str, channel) -> 'SensorEvent':
+        self = super().__new__(
+            cls, '{}.{}.{}'.format(cam_id, event_type, channel))
+        self.cam_id = cam_id
+        self.event_type = event_type
+        self.channel = channel
+        self.key = (str(cam_id), event_type, _channel_key(channel))
+        self.signal = 'ValueChanged.{}'.format(cam_id)
+        self.sender = '{}.{}'.format(event_type, channel)
+        return self
+
+    def __getnewargs__(self):
+        return (self.cam_id, self.event_type, self.channel)
+
+    def with_attachments(self, attachments) -> 'SensorEvent':
+        """Return a copy of this event carrying attachments."""
+        event = SensorEvent(self.cam_id, self.event_type, self.channel)
+        event.attachments = tuple(attachments)
+        return event
+
+
+def parse_sensor(sensor) -> SensorKey:
+    """Split a ``'cam_id.event_type.channel'`` subscription into a key.
+
+    Any part may be ``'*'`` to match everything.
+    """
+    if isinstance(sensor, SensorEvent):
+        return sensor.key
+    try:
+        cam_id, rest = str(sensor).split('.', 1)
+        event_type, channel = rest.rsplit('.', 1)
+    except ValueError:
+        raise ValueError('Invalid sensor: %r' % (sensor,)) from None
+    if channel != WILDCARD:
+        channel = _channel_key(channel)
+    return (cam_id, event_type, channel)
+
+
+class CallbackRouter(object):
+    """Route sensor events to callbacks with a dict lookup per pattern.
+
+    Subscriptions are indexed by ``(cam_id, event_type, channel)`` where any
+    part may be a wildcard. Routing an event costs one lookup for each
+    wildcard combination in use (at most eight), however many callbacks are
+    registered. Callbacks run in registration order.
+
+    The index is replaced on every change rather than mutated, so routing
+    never takes a lock.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty router."""
+        self._routes: Dict[SensorKey, Tuple[Tuple[int, Callable], ...]] = {}
+        self._masks: Tuple[Tuple[bool, bool, bool], ...] = ()
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def add(self, callback: Callable, sensor) -> SensorKey:
+        """Subscribe callback to a sensor pattern."""
+        key = parse_sensor(sensor)
+        with self._lock:
+            self._seq += 1
+            routes = dict(self._routes)
+            routes[key] = routes.get(key, ()) + ((self._seq, callback),)
+            self._publish_routes(routes)
+        return key
+
+    def remove(self, callback: Callable, sensor=None) -> int:
+        """Unsubscribe callback from a pattern, or from all if None.
+
+        Returns the number of subscriptions removed.
+        """
+        keys = None if sensor is None else (parse_sensor(sensor),)
+        removed = 0
+        with self._lock:
+            routes = dict(self._routes)
+            for key in (keys or list(routes)):
+                entries = routes.get(key, ())
+                kept = tuple(entry for entry in entries
+                             if entry[1] != callback)
+                removed += len(entries) - len(kept)
+                if kept:
+                    routes[key] = kept
+                else:
+                    routes.pop(key, None)
+            self._publish_routes(routes)
+        return removed
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._routes.values())
+
+    def match(self, event) -> List[Callable]:
+        """Return the callbacks subscribed to an event."""
+        cam_id, event_type, channel = parse_sensor(event)
+        routes = self._routes
+        found: Optional[list] = None
+        buckets = 0
+        for any_cam, any_type, any_channel in self._masks:
+            entries = routes.get((
+                WILDCARD if any_cam else cam_id,
+                WILDCARD if any_type else event_type,
+                WILDCARD if any_channel else channel))
+            if entries:
+                if found is None:
+                    found = list(entries)
+                else:
+                    found.extend(entries)
+                buckets += 1
+        if found is None:
+            return []
+        if buckets > 1:
+            found.sort(key=lambda entry: entry[0])
+        return [callback for _, callback in found]
+
+    def route(self, event) -> int:
+        """Call every callback subscribed to event with the event."""
+        callbacks = self.match(event)
+        for callback in callbacks:
+            _LOGGING.debug('Update callback %s for sensor %s', callback, event)
+            callback(event)
+        return len(callbacks)
+
+    def _publish_routes(self, routes) -> None:
+        # Caller holds the lock.
+        masks = {tuple(part == WILDCARD for part in key) for key in routes}
+        # Exact matches first keeps the common case to a single lookup
+        self._masks = tuple(sorted(masks))
+        self._routes = routes
@@ -0,0 +1,178 @@
+"""
+pyhik.scheduler
+~~~~~~~~~~~~~~~~~~~~
+Shared deadline scheduler
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+_LOGGING = logging.getLogger(__name__)
+
+
+class ScheduledCall(object):
+    """Handle for a callback queued on a DeadlineScheduler."""
+
+    __slots__ = ('deadline', 'callback', 'cancelled', '_queued', '_scheduler')
+
+    def __init__(self, scheduler: 'DeadlineScheduler', deadline: float,
+                 callback: Callable[[], None]) -> None:
+        """Initialize handle."""
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+        self._queued: Optional[float] = None
+        self._scheduler = scheduler
+
+    @property
+    def active(self) -> bool:
+        """Return True until the call has fired or was cancelled."""
+        return not self.cancelled and self._queued is not None
+
+    def reschedule(self, deadline: float) -> None:
+        """Move the call to a new monotonic deadline."""
+        self._scheduler.reschedule(self, deadline)
+
+    def cancel(self) -> None:
+        """Cancel the call. Cancelled entries are dropped lazily."""
+        self.cancelled = True
+
+
+class DeadlineScheduler(object):
+    """Run callbacks at monotonic deadlines from a single thread.
+
+    Pending calls live in a heap. Moving a call to a later deadline only
+    updates its handle; the stale heap entry re-queues itself when it comes
+    due, so frequent postponing (watchdog pets, stale event refreshes)
+    costs no heap operations.
+    """
+
+    def __init__(self, name: str = 'pyhik-scheduler') -> None:
+        """Initialize scheduler. The thread starts with the first call."""
+        self._name = name
+        self._heap: List[Tuple[float, int, ScheduledCall]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition(threading.Lock())
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    @staticmethod
+    def time() -> float:
+        """Return the scheduler clock."""
+        return time.monotonic()
+
+    def call_at(self, deadline: float,
+                callback: Callable[[], None]) -> ScheduledCall:
+        """Run callback at the given monotonic deadline."""
+        call = ScheduledCall(self, deadline, callback)
+        with self._cond:
+            self._push(call, deadline)
+        return call
+
+    def call_later(self, delay: float,
+                   callback: Callable[[], None]) -> ScheduledCall:
+        """Run callback after delay seconds."""
+        return self.call_at(time.monotonic() + delay, callback)
+
+    def reschedule(self, call: ScheduledCall, deadline: float) -> None:
+        """Move a pending or finished call to a new deadline."""
+        with self._cond:
+            call.deadline = deadline
+            call.cancelled = False
+            if call._queued is None or deadline < call._queued:
+                self._push(call, deadline)
+
+    def stop(self) -> None:
+        """Stop the scheduler thread and drop pending calls."""
+        with self._cond:
+            self._stopped = True
+            self._heap.clear()
+            self._cond.notify()
+        if self._thread is not None \
+                and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _push(self, call: ScheduledCall, deadline: float) -> None:
+        # Caller holds the lock.
+        call._queued = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), call))
+        if self._heap[0][2] is call:
+            self._cond.notify()
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name=self._name)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self) -> None:
+        heap = self._heap
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    if not heap:
+                        self._cond.wait()
+                        continue
+                    queued, _, call = heap[0]
+                    if call.cancelled or queued != call._queued:
+                        # Cancelled, or superseded by an earlier entry.
+                        heapq.heappop(heap)
+                        if call._queued == queued:
+                            call._queued = None
+                        continue
+                    now = time.monotonic()
+                    if call.deadline > queued:
+                        # Postponed since it was queued.
+                        heapq.heapreplace(
+                            heap, (call.deadline, next(self._counter), call))
+                        call._queued = call.deadline
+                        continue
+                    if queued > now:
+                        self._cond.wait(queued - now)
+                        continue
+                    heapq.heappop(heap)
+                    call._queued = None
+                    break
+            try:
+                call.callback()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGING.exception('Error in scheduled callback %s',
+                                   call.callback)
+
+
+_SCHEDULER: Optional[DeadlineScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler() -> DeadlineScheduler:
+    """Return the process-wide scheduler shared by all cameras."""
+    global _SCHEDULER  # pylint: disable=global-statement
+    if _SCHEDULER is None:
+        with _SCHEDULER_LOCK:
+            if _SCHEDULER is None:
+                _SCHEDULER = DeadlineScheduler()
+    return _SCHEDULER
+
+
+def _reset_after_fork() -> None:
+    # Only the forking thread survives in the child. The inherited
+    # scheduler would believe its thread is running and never fire.
+    global _SCHEDULER, _SCHEDULER_LOCK  # pylint: disable=global-statement
+    _SCHEDULER = None
+    _SCHEDULER_LOCK = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
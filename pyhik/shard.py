@@ -0,0 +1,447 @@
+"""
+pyhik.shard
+~~~~~~~~~~~~~~~~~~~~
+Run the alertStreams of a fleet in several worker processes
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import collections
+import functools
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import pickle
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from pyhik.constants import (
+    SHARD_BATCH_INTERVAL, SHARD_BATCH_SIZE, SHARD_MAX_RESTARTS,
+    SHARD_RESTART_WINDOW)
+
+_LOGGING = logging.getLogger(__name__)
+
+# Messages from workers: (kind, payload)
+MSG_EVENTS = 'events'
+MSG_FAILED = 'failed'
+
+# Messages to workers
+CMD_ADD = 'add'
+CMD_STOP = 'stop'
+
+
+class ShardEvent(NamedTuple):
+    """A published change of one sensor on a device run by a worker."""
+
+    device: str
+    event_type: str
+    channel: object
+    state: bool
+    count: Optional[int]
+    received: float
+
+
+def device_key(config: dict) -> str:
+    """Return the name a device config is tracked and reported under."""
+    return str(config.get('key') or config['host'])
+
+
+def create_camera(config: dict):
+    """Build a HikCamera from a device config (HikCamera keyword args)."""
+    # Imported here so the parent doesn't need to load the camera module
+    from pyhik.hikvision import HikCamera
+    kwargs = {name: value for name, value in config.items() if name != 'key'}
+    return HikCamera(**kwargs)
+
+
+class _Batcher(object):
+    """Collect changes in a worker and send them to the parent in batches."""
+
+    def __init__(self, conn, batch_size: int, interval: float) -> None:
+        self._conn = conn
+        self._batch_size = batch_size
+        self._interval = interval
+        self._batch: List[tuple] = []
+        self._cond = threading.Condition(threading.Lock())
+        self._send_lock = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='pyhik-shard-batch', daemon=True)
+        self._thread.start()
+
+    def on_change(self, key: str, camera, event) -> None:
+        """Update callback queuing a change of one camera."""
+        record = camera.fetch_attributes(event.event_type, event.channel)
+        if record is None:
+            return
+        with self._cond:
+            self._batch.append((key, event.event_type, event.channel,
+                                record.state, record.count, time.time()))
+            if len(self._batch) >= self._batch_size:
+                self._cond.notify()
+
+    def send(self, kind: str, payload) -> None:
+        """Send one message to the parent."""
+        data = pickle.dumps((kind, payload), pickle.HIGHEST_PROTOCOL)
+        with self._send_lock:
+            self._conn.send_bytes(data)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._batch) < self._batch_size \
+                        and not self._stopped:
+                    self._cond.wait(self._interval)
+                batch, self._batch = self._batch, []
+                stopped = self._stopped
+            try:
+                if batch:
+                    self.send(MSG_EVENTS, batch)
+            except OSError:
+                # Parent went away
+                return
+            if stopped:
+                return
+
+    def stop(self) -> None:
+        """Send what is queued and stop."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+
+def _run_worker(events_conn, control_conn, factory: Callable,
+                batch_size: int, interval: float) -> None:
+    """Worker process: run cameras and report their changes."""
+    batcher = _Batcher(events_conn, batch_size, interval)
+    cameras = {}
+
+    def add(configs):
+        for config in configs:
+            key = device_key(config)
+            try:
+                camera = factory(config)
+                camera.add_update_callback(
+                    functools.partial(batcher.on_change, key, camera),
+                    '*.*.*')
+                camera.start_stream()
+            except Exception as err:  # pylint: disable=broad-except
+                _LOGGING.error('Unable to start %s: %s', key, err)
+                batcher.send(MSG_FAILED, (key, str(err)))
+                continue
+            cameras[key] = camera
+
+    try:
+        while True:
+            try:
+                command, payload = control_conn.recv()
+            except (EOFError, OSError):
+                break
+            if command == CMD_ADD:
+                add(payload)
+            elif command == CMD_STOP:
+                break
+    finally:
+        from pyhik.fleet import disconnect_all
+        disconnect_all(cameras.values())
+        batcher.stop()
+
+
+class _Worker(object):
+    """Parent side of one worker slot."""
+
+    __slots__ = ('index', 'configs', 'process', 'events', 'control',
+                 'restarts')
+
+    def __init__(self, index: int, configs: List[dict]) -> None:
+        self.index = index
+        self.configs = configs
+        self.process = None
+        self.events = None
+        self.control = None
+        # Start times of recent restarts
+        self.restarts = collections.deque()
+
+
+class ShardSupervisor(object):
+    """Spread a fleet of cameras over worker processes.
+
+    Each worker runs HikCamera streams for its share of the device configs
+    (keyword arguments of HikCamera, plus an optional 'key' naming the
+    device) and sends their published changes back in pickled batches over
+    a pipe. The parent merges them into one stream of ShardEvents for the
+    callbacks added with add_callback(), which run on the supervisor
+    thread.
+
+    A worker that dies is restarted with the same devices. One that dies
+    more than max_restarts times within restart_window seconds is retired
+    and its devices are reassigned to the remaining workers.
+    """
+
+    def __init__(self, configs, workers: Optional[int] = None,
+                 factory: Callable = create_camera,
+                 batch_size: int = SHARD_BATCH_SIZE,
+                 batch_interval: float = SHARD_BATCH_INTERVAL,
+                 max_restarts: int = SHARD_MAX_RESTARTS,
+                 restart_window: float = SHARD_RESTART_WINDOW,
+                 context=None) -> None:
+        """Initialize the supervisor.
+
+        Args:
+            configs: Device configs to run.
+            workers: Worker processes, one per CPU by default.
+            factory: Picklable callable building a camera from a config.
+            batch_size: Changes a worker sends at once at most.
+            batch_interval: Seconds a change may wait for its batch.
+            max_restarts: Restarts of a worker within restart_window
+                before its devices are reassigned.
+            restart_window: Seconds over which restarts are counted.
+            context: multiprocessing context to start workers with.
+        """
+        configs = list(configs)
+        workers = workers or os.cpu_count() or 1
+        workers = max(1, min(workers, len(configs) or 1))
+        self.factory = factory
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.context = context or multiprocessing.get_context()
+        self.events_received = 0
+        self.restarts = 0
+        self.failed: Dict[str, str] = {}
+        # Devices left without a worker
+        self.unassigned: List[dict] = []
+        self._workers = [_Worker(index, configs[index::workers])
+                         for index in range(workers)]
+        self._callbacks = ()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add_callback(self, callback: Callable[[ShardEvent], None]) -> None:
+        """Call callback with every ShardEvent."""
+        with self._lock:
+            self._callbacks += (callback,)
+
+    def remove_callback(self, callback: Callable) -> None:
+        """Stop calling callback."""
+        with self._lock:
+            self._callbacks = tuple(item for item in self._callbacks
+                                    if item != callback)
+
+    @property
+    def workers(self) -> int:
+        """Return the number of live worker slots."""
+        return len(self._workers)
+
+    def assignments(self) -> Dict[int, List[str]]:
+        """Return the device keys run by each worker slot."""
+        with self._lock:
+            return {worker.index: [device_key(config)
+                                   for config in worker.configs]
+                    for worker in self._workers}
+
+    def pids(self) -> Dict[int, Optional[int]]:
+        """Return the process id of each worker slot."""
+        with self._lock:
+            return {worker.index: worker.process.pid
+                    if worker.process is not None else None
+                    for worker in self._workers}
+
+    def start(self) -> None:
+        """Start the workers and the supervisor thread."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        with self._lock:
+            for worker in self._workers:
+                self._spawn(worker)
+        self._thread = threading.Thread(target=self._supervise,
+                                        name='pyhik-shard', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop every worker, waiting up to timeout seconds for them."""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                worker.control.send((CMD_STOP, None))
+            except (OSError, AttributeError):
+                pass
+        for worker in workers:
+            if worker.process is None:
+                continue
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                _LOGGING.warning('Shard worker %d did not stop, killing it',
+                                 worker.index)
+                worker.process.kill()
+                worker.process.join()
+        if self._thread is not None:
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+            self._thread = None
+        for worker in workers:
+            self._close(worker)
+
+    def __enter__(self) -> 'ShardSupervisor':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def _spawn(self, worker: _Worker) -> None:
+        """Start the process of a worker slot with its configs."""
+        # Caller holds the lock.
+        events_recv, events_send = self.context.Pipe(duplex=False)
+        control_recv, control_send = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=_run_worker,
+            args=(events_send, control_recv, self.factory, self.batch_size,
+                  self.batch_interval),
+            name='pyhik-shard-%d' % worker.index, daemon=True)
+        process.start()
+        # The child holds its own ends now
+        events_send.close()
+        control_recv.close()
+        worker.process = process
+        worker.events = events_recv
+        worker.control = control_send
+        if worker.configs:
+            control_send.send((CMD_ADD, worker.configs))
+        _LOGGING.debug('Started shard worker %d (pid %d) with %d devices',
+                       worker.index, process.pid, len(worker.configs))
+
+    @staticmethod
+    def _close(worker: _Worker) -> None:
+        for conn in (worker.events, worker.control):
+            if conn is not None:
+                conn.close()
+        worker.events = worker.control = None
+
+    def _supervise(self) -> None:
+        while not self._stopping.is_set():
+            with self._lock:
+                waiting = {}
+                for worker in self._workers:
+                    if worker.events is not None:
+                        waiting[worker.events] = worker
+                    waiting[worker.process.sentinel] = worker
+            for ready in wait(list(waiting), timeout=0.5):
+                worker = waiting[ready]
+                if ready is worker.events:
+                    if not self._receive(worker):
+                        self._pipe_closed(worker)
+                elif worker.process is not None \
+                        and ready == worker.process.sentinel \
+                        and not self._stopping.is_set():
+                    self._worker_died(worker)
+                # Anything else belongs to a process replaced meanwhile
+        # Deliver what the workers flushed on their way out
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            if worker.process is not None:
+                worker.process.join(1.0)
+            self._drain(worker)
+
+    def _receive(self, worker: _Worker) -> bool:
+        """Handle one message from a worker, False if its pipe closed."""
+        try:
+            kind, payload = pickle.loads(worker.events.recv_bytes())
+        except (EOFError, OSError):
+            return False
+        if kind == MSG_EVENTS:
+            self._dispatch(payload)
+        elif kind == MSG_FAILED:
+            key, error = payload
+            self.failed[key] = error
+        return True
+
+    def _pipe_closed(self, worker: _Worker) -> None:
+        """Stop waiting on the closed events pipe of a worker.
+
+        A closed pipe stays readable, so it is dropped from the wait list.
+        A worker still running without it cannot report anything; it is
+        terminated so its exit restarts or retires it as usual.
+        """
+        _LOGGING.warning('Lost the events pipe of shard worker %d',
+                         worker.index)
+        worker.events.close()
+        worker.events = None
+        if worker.process.is_alive():
+            worker.process.terminate()
+
+    def _drain(self, worker: _Worker) -> None:
+        """Receive every message still buffered in a worker's pipe."""
+        try:
+            while worker.events is not None and worker.events.poll():
+                if not self._receive(worker):
+                    break
+        except (EOFError, OSError):
+            pass
+
+    def _dispatch(self, batch: List[tuple]) -> None:
+        self.events_received += len(batch)
+        callbacks = self._callbacks
+        for item in batch:
+            event = ShardEvent(*item)
+            for callback in callbacks:
+                try:
+                    callback(event)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGING.exception('Shard callback %s failed', callback)
+
+    def _worker_died(self, worker: _Worker) -> None:
+        """Restart a dead worker, or reassign its devices."""
+        self._drain(worker)
+        worker.process.join()
+        _LOGGING.warning('Shard worker %d (pid %d) exited with %s',
+                         worker.index, worker.process.pid,
+                         worker.process.exitcode)
+        self._close(worker)
+        now = time.monotonic()
+        restarts = worker.restarts
+        while restarts and restarts[0] <= now - self.restart_window:
+            restarts.popleft()
+        with self._lock:
+            if len(restarts) < self.max_restarts:
+                restarts.append(now)
+                self.restarts += 1
+                self._spawn(worker)
+                return
+            self._workers.remove(worker)
+            self._reassign(worker.configs)
+
+    def _reassign(self, configs: List[dict]) -> None:
+        """Spread the devices of a retired worker over the others."""
+        # Caller holds the lock.
+        if not self._workers:
+            _LOGGING.error('No shard workers left for %d devices',
+                           len(configs))
+            self.unassigned.extend(configs)
+            return
+        shares = collections.defaultdict(list)
+        for config in configs:
+            # Least loaded first
+            target = min(self._workers, key=lambda item: len(item.configs)
+                         + len(shares[item.index]))
+            shares[target.index].append(config)
+        for worker in self._workers:
+            share = shares.get(worker.index)
+            if share:
+                worker.configs = worker.configs + share
+                try:
+                    worker.control.send((CMD_ADD, share))
+                except OSError:
+                    # Dying too, its restart brings the share along
+                    pass
+        _LOGGING.warning('Reassigned %d devices to %d shard workers',
+                         len(configs), len(shares))
@@ -0,0 +1,274 @@
+"""
+pyhik.sharedstate
+~~~~~~~~~~~~~~~~~~~~
+Event states in shared memory for readers in other processes
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import logging
+from multiprocessing import resource_tracker, shared_memory
+import struct
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+from pyhik.constants import SHARED_STATE_CAPACITY
+
+_LOGGING = logging.getLogger(__name__)
+
+MAGIC = b'PYHKSTT1'
+
+# magic, capacity, key size, slots in use
+_HEADER = struct.Struct('<8sIII')
+HEADER_SIZE = 64
+_USED_OFFSET = 16
+
+# Slot: sequence, state, count (-1 for None), last update (time.time()),
+# then the key. The sequence is odd while the owner writes the slot.
+_SEQ = struct.Struct('<Q')
+_FIELDS = struct.Struct('<B3xid')
+_FIELDS_OFFSET = _SEQ.size
+KEY_OFFSET = _SEQ.size + _FIELDS.size
+KEY_SIZE = 128
+SLOT_SIZE = KEY_OFFSET + KEY_SIZE
+
+# Reads retried this many times while the owner is writing a slot
+SEQLOCK_RETRIES = 10000
+
+_SEPARATOR = '\x1f'
+
+SharedKey = Tuple[str, str, object]
+
+
+class SharedState(NamedTuple):
+    """State of one sensor as read from the table."""
+
+    state: bool
+    count: Optional[int]
+    last_update: float
+
+
+def _channel(channel):
+    """Normalize a channel so '1' and 1 share a slot."""
+    if isinstance(channel, int):
+        return channel
+    try:
+        return int(channel)
+    except (TypeError, ValueError):
+        return channel
+
+
+def _encode_key(device: str, event_type: str, channel) -> bytes:
+    key = _SEPARATOR.join((str(device), event_type, str(channel))).encode()
+    if len(key) > KEY_SIZE:
+        raise ValueError('Key too long for the shared state table: %r'
+                         % (key,))
+    return key
+
+
+def _decode_key(raw: bytes) -> SharedKey:
+    device, event_type, channel = raw.rstrip(b'\0').decode().split(
+        _SEPARATOR)
+    return device, event_type, _channel(channel)
+
+
+# Blocks created by tables in this process, or the one it forked from.
+# These share the owner's resource tracker registration.
+_OWNED: Set[str] = set()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open an existing block without leaving it with the resource tracker.
+
+    Only the owner may unlink the table; a tracked reader would remove it
+    when exiting.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always tracks, so take the registration back
+        pass
+    shm = shared_memory.SharedMemory(name=name)
+    if shm._name not in _OWNED:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class SharedStateTable(object):
+    """Owner side of a fixed layout event-state table in shared memory.
+
+    One process, typically the one running the cameras, writes the state
+    of every (device, event type, channel) into a slot; any number of
+    SharedStateReaders in other processes read it without talking to the
+    devices. Slots are allocated on first write and never move. Each slot
+    is guarded by a sequence number, odd while it is written, so readers
+    retry instead of seeing half an update.
+    """
+
+    def __init__(self, name: Optional[str] = None,
+                 capacity: int = SHARED_STATE_CAPACITY) -> None:
+        """Create the shared memory block, named name if given."""
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = capacity
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True, size=HEADER_SIZE + capacity * SLOT_SIZE)
+        _OWNED.add(self._shm._name)
+        self._buf = self._shm.buf
+        _HEADER.pack_into(self._buf, 0, MAGIC, capacity, KEY_SIZE, 0)
+        self._slots: Dict[SharedKey, int] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def name(self) -> str:
+        """Return the shared memory name readers attach to."""
+        return self._shm.name
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _allocate(self, key: SharedKey) -> Optional[int]:
+        # Caller holds the lock.
+        used = len(self._slots)
+        if used >= self.capacity:
+            if not self.dropped:
+                _LOGGING.warning('Shared state table is full at %d slots, '
+                                 'ignoring %s', self.capacity, key)
+            self.dropped += 1
+            return None
+        try:
+            raw = _encode_key(*key)
+        except ValueError as err:
+            self.dropped += 1
+            _LOGGING.warning('%s', err)
+            return None
+        offset = HEADER_SIZE + used * SLOT_SIZE
+        self._buf[offset + KEY_OFFSET:offset + KEY_OFFSET + len(raw)] = raw
+        self._slots[key] = offset
+        # Published last, so readers only see slots with a key
+        struct.pack_into('<I', self._buf, _USED_OFFSET, used + 1)
+        return offset
+
+    def write(self, device: str, event_type: str, channel, state: bool,
+              count: Optional[int] = None,
+              last_update: Optional[float] = None) -> None:
+        """Store the state of one sensor."""
+        key = (str(device), event_type, _channel(channel))
+        buf = self._buf
+        with self._lock:
+            offset = self._slots.get(key)
+            if offset is None:
+                offset = self._allocate(key)
+                if offset is None:
+                    return
+            seq = _SEQ.unpack_from(buf, offset)[0]
+            _SEQ.pack_into(buf, offset, seq + 1)
+            _FIELDS.pack_into(
+                buf, offset + _FIELDS_OFFSET, bool(state),
+                -1 if count is None else count,
+                time.time() if last_update is None else last_update)
+            _SEQ.pack_into(buf, offset, seq + 2)
+
+    def write_camera(self, device: str, camera) -> int:
+        """Store every tracked state of a camera, returning how many."""
+        written = 0
+        for etype, record in camera.event_states.records():
+            last_update = record.last_update.timestamp() \
+                if record.last_update else None
+            self.write(device, etype, record.channel, record.state,
+                       record.count, last_update)
+            written += 1
+        return written
+
+    def close(self) -> None:
+        """Detach from the shared memory."""
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Remove the shared memory block once readers are done."""
+        self._shm.unlink()
+        _OWNED.discard(self._shm._name)
+
+    def __enter__(self) -> 'SharedStateTable':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+        self.unlink()
+
+
+class SharedStateReader(object):
+    """Read side of a SharedStateTable, for use in any process.
+
+    Lookups are plain memory reads. The slot index is rebuilt only when a
+    key is missing and the owner added slots since the last scan.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Attach to the table created under name."""
+        self._shm = _attach(name)
+        self._buf = self._shm.buf
+        magic, capacity, key_size, _ = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or key_size != KEY_SIZE:
+            self.close()
+            raise ValueError('%s is not a pyhik shared state table' % name)
+        self.capacity = capacity
+        self._slots: Dict[SharedKey, int] = {}
+        self._scanned = 0
+
+    def refresh(self) -> int:
+        """Index slots added by the owner, returning the slot count."""
+        used = struct.unpack_from('<I', self._buf, _USED_OFFSET)[0]
+        buf = self._buf
+        for index in range(self._scanned, used):
+            offset = HEADER_SIZE + index * SLOT_SIZE
+            key = _decode_key(bytes(
+                buf[offset + KEY_OFFSET:offset + SLOT_SIZE]))
+            self._slots[key] = offset
+        self._scanned = used
+        return used
+
+    def _read(self, offset: int) -> SharedState:
+        buf = self._buf
+        for _ in range(SEQLOCK_RETRIES):
+            before = _SEQ.unpack_from(buf, offset)[0]
+            if before & 1:
+                continue
+            state, count, last_update = _FIELDS.unpack_from(
+                buf, offset + _FIELDS_OFFSET)
+            if _SEQ.unpack_from(buf, offset)[0] == before:
+                return SharedState(bool(state), None if count < 0 else count,
+                                   last_update)
+        raise RuntimeError('Shared state slot stayed busy')
+
+    def get(self, device: str, event_type: str,
+            channel) -> Optional[SharedState]:
+        """Return the state of one sensor, or None if it is not tracked."""
+        key = (str(device), event_type, _channel(channel))
+        offset = self._slots.get(key)
+        if offset is None:
+            self.refresh()
+            offset = self._slots.get(key)
+            if offset is None:
+                return None
+        return self._read(offset)
+
+    def states(self, device: Optional[str] = None
+               ) -> Dict[SharedKey, SharedState]:
+        """Return every state, or those of one device."""
+        self.refresh()
+        return {key: self._read(offset)
+                for key, offset in self._slots.items()
+                if device is None or key[0] == device}
+
+    def close(self) -> None:
+        """Detach from the shared memory."""
+        self._shm.close()
+
+    def __enter__(self) -> 'SharedStateReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
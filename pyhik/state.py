@@ -0,0 +1,146 @@
+"""
+pyhik.state
+~~~~~~~~~~~~~~~~~~~~
+Indexed event state storage
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+from collections.abc import Mapping
+import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_RECORD_LENGTH = 4
+
+
+class EventStateRecord(object):
+    """Latest state of one event type on one channel.
+
+    Indexes, unpacks and compares like the legacy
+    ``[state, channel, count, last_update]`` list so existing consumers of
+    ``current_event_states`` keep working.
+    """
+
+    __slots__ = ('state', 'channel', 'count', 'last_update')
+
+    def __init__(self, state: bool, channel: int, count: int,
+                 last_update: Optional[datetime.datetime]) -> None:
+        """Initialize record."""
+        self.state = state
+        self.channel = channel
+        self.count = count
+        self.last_update = last_update
+
+    def as_list(self) -> list:
+        """Return the record as a legacy attribute list."""
+        return [self.state, self.channel, self.count, self.last_update]
+
+    def __getitem__(self, index):
+        return (self.state, self.channel, self.count, self.last_update)[index]
+
+    def __setitem__(self, index, value):
+        if not isinstance(index, int):
+            raise TypeError('record indices must be integers')
+        if index < 0:
+            index += _RECORD_LENGTH
+        if index == 0:
+            self.state = value
+        elif index == 1:
+            self.channel = value
+        elif index == 2:
+            self.count = value
+        elif index == 3:
+            self.last_update = value
+        else:
+            raise IndexError('record index out of range')
+
+    def __len__(self) -> int:
+        return _RECORD_LENGTH
+
+    def __iter__(self):
+        return iter((self.state, self.channel, self.count, self.last_update))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, EventStateRecord):
+            other = other.as_list()
+        elif isinstance(other, tuple):
+            other = list(other)
+        return self.as_list() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(self.as_list())
+
+
+class EventStateTable(Mapping):
+    """Event states keyed by ``(event_type, channel)``.
+
+    Reads as the legacy ``{event_type: [[state, channel, count, last_update],
+    ...]}`` dictionary while lookups by event type and channel are a single
+    dict access instead of a scan of the channel list.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty table."""
+        self._index: Dict[Tuple[str, int], EventStateRecord] = {}
+        self._by_type: Dict[str, List[EventStateRecord]] = {}
+
+    @classmethod
+    def from_dict(cls, states) -> 'EventStateTable':
+        """Build a table from a legacy event state dictionary."""
+        table = cls()
+        for event, entries in states.items():
+            table._by_type.setdefault(event, [])
+            for entry in entries:
+                table.add(event, entry[1], entry[0], entry[2], entry[3])
+        return table
+
+    def __getitem__(self, event: str) -> List[EventStateRecord]:
+        return self._by_type[event]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._by_type)
+
+    def __len__(self) -> int:
+        return len(self._by_type)
+
+    def __repr__(self) -> str:
+        return repr(self._by_type)
+
+    def add(self, event: str, channel: int, state: bool = False,
+            count: int = 0,
+            last_update: Optional[datetime.datetime] = None
+            ) -> EventStateRecord:
+        """Track an event type on a channel, returning its record.
+
+        An already tracked event type and channel is left unchanged.
+        """
+        key = (event, channel)
+        record = self._index.get(key)
+        if record is None:
+            if last_update is None:
+                last_update = datetime.datetime.now()
+            record = EventStateRecord(state, channel, count, last_update)
+            self._index[key] = record
+            self._by_type.setdefault(event, []).append(record)
+        return record
+
+    def lookup(self, event: str, channel) -> Optional[EventStateRecord]:
+        """Return the record for an event type and channel, if tracked."""
+        record = self._index.get((event, channel))
+        if record is None and not isinstance(channel, int):
+            try:
+                record = self._index.get((event, int(channel)))
+            except (ValueError, TypeError):
+                return None
+        return record
+
+    def record_count(self) -> int:
+        """Return the number of tracked event type and channel pairs."""
+        return len(self._index)
+
+    def records(self) -> Iterator[Tuple[str, EventStateRecord]]:
+        """Iterate over ``(event_type, record)`` for every tracked channel."""
+        for (event, _), record in self._index.items():
+            yield event, record
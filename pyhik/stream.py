@@ -0,0 +1,488 @@
+"""
+pyhik.stream
+~~~~~~~~~~~~~~~~~~~~
+Incremental framing of the alertStream multipart body.
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import logging
+import socket
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+import requests
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+from pyhik.constants import ID_TYPES
+
+_LOGGING = logging.getLogger(__name__)
+
+ALERT_END_TAG = b'</EventNotificationAlert>'
+
+# Give up on a header block that never terminates.
+MAX_HEADER_SIZE = 8192
+
+# Give up on an XML part that never closes, and skip XML parts declaring a
+# larger Content-Length. Alerts with long region lists stay far below this.
+MAX_PART_SIZE = 1024 * 1024
+
+# Alerts up to this size are cheaper to build as a tree in C and scan once.
+# Larger ones (smart events with region lists) go through the pull parser,
+# which stops as soon as every wanted field has been seen.
+SMALL_ALERT_SIZE = 2048
+DECODE_CHUNK_SIZE = 1024
+
+ALERT_FIELDS = frozenset(
+    ['dateTime', 'activePostCount', 'eventType', 'eventState'] + ID_TYPES)
+# channelID has the highest priority of the ID_TYPES, once it holds a
+# number nothing later in the document can change the decoded event.
+_REQUIRED_FIELDS = frozenset(
+    ['dateTime', 'activePostCount', 'eventType', 'eventState'])
+
+
+class AlertEvent(NamedTuple):
+    """Fields of an EventNotificationAlert used for state tracking."""
+
+    event_type: Optional[str]
+    state: Optional[str]
+    channel: Optional[int]
+    count: Optional[int]
+    date_time: Optional[str] = None
+    namespace: str = ''
+
+    @classmethod
+    def from_fields(cls, get, prefix: str = '',
+                    namespace: str = '') -> 'AlertEvent':
+        """Build an event from element text.
+
+        Args:
+            get: Callable returning the text for a (prefixed) element name,
+                or None if the element is missing.
+            prefix: Prefix applied to each local element name, e.g. the
+                ``{namespace}`` of a parsed tree.
+            namespace: Namespace URI of the alert.
+        """
+        channel = None
+        for idtype in ID_TYPES:
+            try:
+                # Need to make sure this is actually a number
+                channel = int(get(prefix + idtype))
+                break
+            except (ValueError, TypeError):
+                # Field is missing, not an integer or is blank
+                pass
+
+        try:
+            count = int(get(prefix + 'activePostCount'))
+        except (ValueError, TypeError):
+            count = None
+
+        return cls(get(prefix + 'eventType'), get(prefix + 'eventState'),
+                   channel, count, get(prefix + 'dateTime'), namespace)
+
+    @classmethod
+    def from_tree(cls, tree) -> 'AlertEvent':
+        """Build an event from a parsed EventNotificationAlert element."""
+        namespace = _namespace(tree.tag)
+        prefix = '{%s}' % namespace if namespace else ''
+        # Reversed so the first occurrence of a tag wins, like tree.find.
+        texts = {child.tag: child.text for child in reversed(tree)}
+        return cls.from_fields(texts.get, prefix, namespace)
+
+
+class AlertDecoder(object):
+    """Incremental single pass decoder built on ET.XMLPullParser.
+
+    Only direct children of the root element are collected, so nested
+    elements with the same local name are ignored just like ``tree.find``.
+    """
+
+    __slots__ = ('_parser', '_depth', '_fields', '_namespace')
+
+    def __init__(self) -> None:
+        """Initialize a decoder for a single alert."""
+        self._parser = ET.XMLPullParser(('start', 'end'))
+        self._depth = 0
+        self._fields: Dict[str, Optional[str]] = {}
+        self._namespace = ''
+
+    def feed(self, data) -> bool:
+        """Feed bytes and return True once every wanted field was seen.
+
+        A blank or non-numeric channelID does not count, as a later ID type
+        may still supply the channel.
+
+        Raises:
+            ET.ParseError: The data is not well-formed XML.
+        """
+        self._parser.feed(data)
+        fields = self._fields
+        depth = self._depth
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                if depth == 0:
+                    self._namespace = _namespace(elem.tag)
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 1:
+                    name = elem.tag.rpartition('}')[2]
+                    if name in ALERT_FIELDS and name not in fields:
+                        fields[name] = elem.text
+        self._depth = depth
+        return _REQUIRED_FIELDS.issubset(fields) \
+            and _is_channel(fields.get(ID_TYPES[0]))
+
+    def result(self) -> AlertEvent:
+        """Return the event decoded from the data fed so far."""
+        return AlertEvent.from_fields(self._fields.get,
+                                      namespace=self._namespace)
+
+
+def decode_alert(payload) -> AlertEvent:
+    """Decode a framed alert payload into an AlertEvent.
+
+    Raises:
+        ET.ParseError: The payload is not well-formed XML.
+    """
+    if len(payload) <= SMALL_ALERT_SIZE:
+        return AlertEvent.from_tree(ET.fromstring(payload))
+
+    decoder = AlertDecoder()
+    view = memoryview(payload)
+    try:
+        for start in range(0, len(view), DECODE_CHUNK_SIZE):
+            if decoder.feed(view[start:start + DECODE_CHUNK_SIZE]):
+                break
+    finally:
+        view.release()
+    return decoder.result()
+
+
+def _is_channel(text: Optional[str]) -> bool:
+    """Return True if text decodes as a channel number."""
+    try:
+        int(text)
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def _namespace(tag: str) -> str:
+    """Return the namespace URI of an element tag."""
+    if tag.startswith('{'):
+        return tag[1:].partition('}')[0]
+    return ''
+
+
+def iter_stream_chunks(response, chunk_size: int) -> Iterator[bytes]:
+    """Yield raw body chunks from a streaming requests response.
+
+    Uses ``read1`` on the underlying urllib3 response when available so a
+    large chunk size never delays delivery of small alerts; otherwise falls
+    back to ``iter_content``. urllib3 errors are raised as the requests
+    exceptions ``iter_content`` would raise.
+    """
+    read1 = getattr(response.raw, 'read1', None)
+    if read1 is None:
+        yield from response.iter_content(chunk_size=chunk_size)
+        return
+
+    while True:
+        try:
+            data = read1(chunk_size)
+        except ProtocolError as err:
+            raise requests.exceptions.ChunkedEncodingError(err) from err
+        except ReadTimeoutError as err:
+            raise requests.exceptions.ConnectionError(err) from err
+        if not data:
+            return
+        yield data
+
+
+def shutdown_response(response) -> bool:
+    """Shut down the socket under a streaming requests response.
+
+    Safe to call from another thread: a read blocked on the socket returns
+    immediately instead of waiting for the read timeout. Returns False if
+    no socket could be found.
+    """
+    raw = getattr(response, 'raw', None)
+    sock = getattr(getattr(raw, '_connection', None), 'sock', None)
+    if sock is None:
+        # http.client response wrapping a socket.SocketIO
+        fp = getattr(getattr(raw, '_fp', None), 'fp', None)
+        sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    if sock is None:
+        return False
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    return True
+
+
+class AlertStreamParser:
+    """Byte-level framer for the multipart alertStream body.
+
+    Bytes are appended to a single reusable buffer and complete parts are
+    handed out as ``memoryview`` slices of that buffer. Parts are delimited
+    by their ``Content-Length`` header when present, otherwise by the
+    closing ``</EventNotificationAlert>`` tag, which also covers devices that
+    send bare XML without any multipart headers.
+
+    Binary parts (a non-XML Content-Type with a Content-Length, such as the
+    JPEG snapshots of smart events) are never buffered: their bytes go
+    straight to ``sink`` as they arrive, or are skipped without a sink.
+    XML parts are buffered up to ``MAX_PART_SIZE``; beyond that the part
+    is dropped and the framer skips ahead to the next boundary line.
+    """
+
+    def __init__(self, sink=None) -> None:
+        """Initialize an empty framing buffer.
+
+        Args:
+            sink: Optional attachment sink (see pyhik.attachments) storing
+                binary parts.
+        """
+        self.sink = sink
+        self._buf = bytearray()
+        self._in_headers = False
+        self._content_type: Optional[bytes] = None
+        self._header_length: Optional[int] = None
+        self._content_length: Optional[int] = None
+        # Bytes of the current binary part still to come, and its writer
+        self._binary_remaining: Optional[int] = None
+        self._binary_type: Optional[bytes] = None
+        self._writer = None
+        # Discarding bytes up to the next boundary line
+        self._resync = False
+
+    @property
+    def buffered(self) -> int:
+        """Return the number of bytes waiting for a complete part."""
+        return len(self._buf)
+
+    def reset(self) -> None:
+        """Discard any partial part, e.g. after a reconnect."""
+        self._buf.clear()
+        self._reset_part()
+        if self._writer is not None:
+            self._writer.abort()
+        self._writer = None
+        self._binary_remaining = None
+        self._binary_type = None
+        self._resync = False
+
+    def _reset_part(self) -> None:
+        self._in_headers = False
+        self._content_type = None
+        self._header_length = None
+        self._content_length = None
+
+    def _parse_header(self, line: bytes) -> None:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-type':
+            self._content_type = value.strip().lower()
+        elif name == b'content-length':
+            try:
+                self._header_length = int(value)
+            except ValueError:
+                self._header_length = None
+
+    def _start_binary(self, content_type: bytes, length: int) -> None:
+        self._binary_remaining = length
+        self._binary_type = content_type
+        self._writer = None
+        if self.sink is not None:
+            try:
+                self._writer = self.sink.open(
+                    content_type.decode('latin-1'), length)
+            except OSError as err:
+                _LOGGING.error('Unable to store %s part: %s',
+                               content_type, err)
+
+    def _write_binary(self, data: memoryview) -> None:
+        """Pass bytes of the current binary part on to its writer."""
+        self._binary_remaining -= len(data)
+        if self._writer is not None:
+            try:
+                self._writer.write(data)
+            except (OSError, ValueError) as err:
+                _LOGGING.error('Unable to store %s part: %s',
+                               self._binary_type, err)
+                self._writer.abort()
+                self._writer = None
+
+    def _finish_binary(self):
+        """Close the finished binary part, returning its Attachment."""
+        writer, self._writer = self._writer, None
+        self._binary_remaining = None
+        self._binary_type = None
+        if writer is None:
+            return None
+        try:
+            return writer.close()
+        except OSError as err:
+            _LOGGING.error('Unable to store binary part: %s', err)
+            return None
+
+    def feed(self, data) -> Iterator[Tuple[Optional[bytes], object]]:
+        """Append data and yield each complete part.
+
+        Yields ``(content_type, payload)`` tuples. ``content_type`` is the
+        lower-cased header value as bytes, or None if the part had no
+        headers. ``payload`` is a memoryview into the internal buffer and is
+        only valid until the generator is resumed. Binary parts are yielded
+        once complete, with the Attachment returned by the sink as payload.
+        """
+        buf = self._buf
+        if self._binary_remaining and not buf:
+            # Hand the body of a binary part straight from data to the sink
+            with memoryview(data) as incoming:
+                take = min(self._binary_remaining, len(incoming))
+                with incoming[:take] as chunk:
+                    self._write_binary(chunk)
+                buf += incoming[take:]
+        else:
+            buf += data
+        pos = 0
+        view = memoryview(buf)
+        part = None
+        try:
+            while True:
+                if self._resync:
+                    boundary = buf.find(b'\n--', pos)
+                    if boundary == -1:
+                        # Keep a newline that may start the boundary
+                        pos = max(pos, len(buf) - 1)
+                        break
+                    pos = boundary + 1
+                    self._resync = False
+                    continue
+
+                if self._binary_remaining is not None:
+                    take = min(self._binary_remaining, len(buf) - pos)
+                    if take:
+                        with view[pos:pos + take] as chunk:
+                            self._write_binary(chunk)
+                        pos += take
+                    if self._binary_remaining:
+                        break
+                    content_type = self._binary_type
+                    attachment = self._finish_binary()
+                    if attachment is not None:
+                        yield content_type, attachment
+                    continue
+
+                if self._content_length is not None:
+                    end = pos + self._content_length
+                    if end > len(buf):
+                        break
+                    content_type = self._content_type
+                    if not _ends_with_tag(buf, pos, end):
+                        # Content-Length doesn't cover the whole alert,
+                        # frame on the closing tag instead.
+                        self._content_length = None
+                        continue
+                    part = view[pos:end]
+                    pos = end
+                    self._reset_part()
+                    yield content_type, part
+                    part.release()
+                    part = None
+                    continue
+
+                if self._in_headers:
+                    eol = buf.find(b'\n', pos)
+                    if eol == -1:
+                        if len(buf) - pos > MAX_HEADER_SIZE:
+                            _LOGGING.debug('Discarding oversized part header.')
+                            pos = len(buf)
+                            self._reset_part()
+                        break
+                    line = buf[pos:eol].rstrip(b'\r')
+                    pos = eol + 1
+                    if line:
+                        self._parse_header(line)
+                    else:
+                        # Blank line closes the header block.
+                        self._in_headers = False
+                        length = self._header_length
+                        if length is not None and length >= 0:
+                            content_type = self._content_type
+                            if length > MAX_PART_SIZE:
+                                _LOGGING.debug('Skipping %d byte part.',
+                                               length)
+                                self._reset_part()
+                                self._binary_remaining = length
+                            elif content_type is None \
+                                    or b'xml' in content_type:
+                                self._content_length = length
+                            else:
+                                self._reset_part()
+                                self._start_binary(content_type, length)
+                    continue
+
+                # Skip blank lines between parts.
+                while pos < len(buf) and buf[pos] in b'\r\n':
+                    pos += 1
+                if pos >= len(buf):
+                    break
+
+                if buf[pos] == 0x3C:  # '<'
+                    end = buf.find(ALERT_END_TAG, pos)
+                    if end == -1:
+                        if len(buf) - pos > MAX_PART_SIZE:
+                            _LOGGING.debug('Discarding unterminated %d '
+                                           'byte part.', len(buf) - pos)
+                            self._reset_part()
+                            self._resync = True
+                            continue
+                        break
+                    end += len(ALERT_END_TAG)
+                    part = view[pos:end]
+                    content_type = self._content_type
+                    pos = end
+                    self._reset_part()
+                    yield content_type, part
+                    part.release()
+                    part = None
+                    continue
+
+                eol = buf.find(b'\n', pos)
+                if eol == -1:
+                    if len(buf) - pos > MAX_HEADER_SIZE:
+                        _LOGGING.debug('Discarding %d unframed bytes.',
+                                       len(buf) - pos)
+                        pos = len(buf)
+                    break
+
+                line = buf[pos:eol].rstrip(b'\r')
+                pos = eol + 1
+
+                if line.startswith(b'--'):
+                    # Boundary line, a new part follows.
+                    self._reset_part()
+                elif b':' in line:
+                    self._in_headers = True
+                    self._parse_header(line)
+                # Anything else is noise between parts.
+        finally:
+            if part is not None:
+                part.release()
+            view.release()
+            del buf[:pos]
+
+
+def _ends_with_tag(buf: bytearray, start: int, end: int) -> bool:
+    """Return True if buf[start:end] ends with a closing XML tag."""
+    while end > start and buf[end - 1] in b' \t\r\n':
+        end -= 1
+    return end > start and buf[end - 1] == 0x3E  # '>'
@@ -0,0 +1,183 @@
+"""
+pyhik.subscription
+~~~~~~~~~~~~~~~~~~~~
+Bounded per-consumer queues of processed alerts
+Copyright (c) 2016-2026 John Mihalic <https://github.com/mezz64>
+Licensed under the MIT license.
+"""
+
+import asyncio
+from collections import deque
+import logging
+import threading
+from typing import List, NamedTuple, Optional, Union
+
+from pyhik.constants import SUBSCRIPTION_QUEUE_SIZE
+
+_LOGGING = logging.getLogger(__name__)
+
+
+class EventRecord(NamedTuple):
+    """One processed alert.
+
+    device_time is the dateTime reported by the device, or None for
+    changes pyhik made itself such as stale expiry; received is the
+    time.time() the alert was processed.
+    """
+
+    event_type: str
+    channel: Optional[int]
+    state: bool
+    count: Optional[int]
+    device_time: Optional[str]
+    received: float
+
+
+class Lagged(NamedTuple):
+    """Returned in place of records a slow consumer lost.
+
+    missed records were dropped, oldest first, because the queue was full.
+    """
+
+    missed: int
+
+
+class Subscription(object):
+    """Bounded queue of EventRecords read at the consumer's own pace.
+
+    The camera puts records from its stream thread and never waits: once
+    maxsize records are waiting the oldest is dropped. The next read then
+    returns a Lagged with the number of records lost before carrying on
+    with the remaining ones. Reads return None once the subscription is
+    closed and empty.
+
+    Iterate with ``for`` or, for a subscription bound to an event loop,
+    ``async for``.
+    """
+
+    def __init__(self, maxsize: int = SUBSCRIPTION_QUEUE_SIZE,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Initialize an empty subscription.
+
+        Args:
+            maxsize: Records kept for the consumer before dropping.
+            loop: Event loop of an async consumer.
+        """
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+        self._queue = deque()
+        self._missed = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._loop = loop
+        self._ready = asyncio.Event() if loop is not None else None
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        # Puts from the loop's own thread need no thread-safe wakeup
+        self._loop_thread = threading.get_ident() \
+            if loop is not None and running is loop else None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def put(self, record: EventRecord) -> bool:
+        """Queue a record, returning False if the subscription is closed."""
+        with self._cond:
+            if self.closed:
+                return False
+            queue = self._queue
+            if len(queue) >= self.maxsize:
+                queue.popleft()
+                self.dropped += 1
+                self._missed += 1
+            queue.append(record)
+            self.received += 1
+            self._cond.notify()
+        if self._loop is not None:
+            self._wake()
+        return True
+
+    def close(self) -> None:
+        """Stop accepting records; readers finish what is queued."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self._loop is not None:
+            self._wake()
+
+    def _wake(self) -> None:
+        if self._ready.is_set():
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._ready.set()
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Loop already closed, nobody is waiting
+            pass
+
+    def _take(self) -> Union[EventRecord, Lagged, None]:
+        # Caller holds the condition.
+        if self._missed:
+            missed, self._missed = self._missed, 0
+            return Lagged(missed)
+        if self._queue:
+            return self._queue.popleft()
+        return None
+
+    def get(self, timeout: Optional[float] = None
+            ) -> Union[EventRecord, Lagged, None]:
+        """Return the next record, waiting up to timeout seconds.
+
+        Returns None on timeout or once closed and empty.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._missed
+                                or self.closed, timeout)
+            return self._take()
+
+    def drain(self, limit: Optional[int] = None
+              ) -> List[Union[EventRecord, Lagged]]:
+        """Return up to limit waiting items without blocking."""
+        items = []
+        with self._cond:
+            while limit is None or len(items) < limit:
+                item = self._take()
+                if item is None:
+                    break
+                items.append(item)
+        return items
+
+    async def aget(self) -> Union[EventRecord, Lagged, None]:
+        """Wait for the next record on the subscription's loop."""
+        if self._ready is None:
+            raise RuntimeError('Subscription is not bound to an event loop')
+        while True:
+            self._ready.clear()
+            with self._cond:
+                item = self._take()
+                if item is not None or self.closed:
+                    return item
+            await self._ready.wait()
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            yield item
+
+    def __aiter__(self) -> 'Subscription':
+        return self
+
+    async def __anext__(self) -> Union[EventRecord, Lagged]:
+        item = await self.aget()
+        if item is None:
+            raise StopAsyncIteration
+        return item
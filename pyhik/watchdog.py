@@ -6,33 +6,52 @@ Copyright (c) 2017-2018 John Mihalic <https://github.com/mezz64>
 Licensed under the MIT license.
 """
 
-from threading import Timer
+from pyhik.scheduler import get_scheduler
 
 
 class Watchdog(object):
-    """ Watchdog timer class. """
+    """ Watchdog timer class.
 
-    def __init__(self, timeout, handler):
+    All watchdogs share the process-wide deadline scheduler, so no thread
+    is created per camera or per pet. Petting a running watchdog only
+    moves its deadline; the scheduler re-queues it lazily. Handlers run on
+    the scheduler thread and must not block.
+    """
+
+    def __init__(self, timeout, handler, scheduler=None):
         """ Initialize watchdog variables. """
         self.time = timeout
         self.handler = handler
-        self._timer = None
+        self._scheduler = scheduler
+        self._call = None
         return
 
+    @property
+    def scheduler(self):
+        """ Return the scheduler driving this watchdog. """
+        if self._scheduler is None:
+            self._scheduler = get_scheduler()
+        return self._scheduler
+
     def start(self):
         """ Starts the watchdog timer. """
-        self._timer = Timer(self.time, self.handler)
-        self._timer.daemon = True
-        self._timer.start()
+        deadline = self.scheduler.time() + self.time
+        if self._call is None:
+            self._call = self.scheduler.call_at(deadline, self.handler)
+        else:
+            self._call.reschedule(deadline)
         return
 
     def pet(self):
         """ Reset watchdog timer. """
-        self.stop()
-        self.start()
+        call = self._call
+        if call is not None and call.active:
+            call.deadline = self.scheduler.time() + self.time
+        else:
+            self.start()
         return
 
     def stop(self):
         """ Stops the watchdog timer. """
-        if self._timer is not None:
-            self._timer.cancel()
+        if self._call is not None:
+            self._call.cancel()
@@ -0,0 +1,36 @@
+"""Shared fixtures for tests of cameras that never contact a device."""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pyhik.hikvision import HikCamera
+from pyhik.scheduler import DeadlineScheduler
+
+
+def offline_camera(events, host="localhost"):
+    """Return a HikCamera tracking events, with its own scheduler.
+
+    The caller stops camera.scheduler when done.
+    """
+    with patch("pyhik.hikvision.requests.Session"), \
+            patch("pyhik.hikvision.HikCamera.initialize"):
+        camera = HikCamera(host=host)
+    camera.scheduler = DeadlineScheduler()
+    camera.watchdog = MagicMock()
+    camera.inject_events(events)
+    return camera
+
+
+class CameraTestCase(unittest.TestCase):
+    """Base for tests of an offline camera tracking ``events``."""
+
+    events = {"Motion": [1]}
+
+    def setUp(self):
+        self.camera = self.make_camera()
+
+    def make_camera(self):
+        """Return another offline camera, stopped after the test."""
+        camera = offline_camera(self.events)
+        self.addCleanup(camera.scheduler.stop)
+        return camera
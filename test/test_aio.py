@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.aio module."""
+
+import asyncio
+import base64
+import threading
+import unittest
+from unittest.mock import patch
+
+from requests.auth import HTTPDigestAuth
+
+from pyhik.aio import (
+    AsyncEventHub, AsyncHikCamera, _DigestChallenge, _parse_head)
+
+ALERT_PART = (
+    b'--boundary\r\n'
+    b'Content-Type: application/xml; charset="UTF-8"\r\n\r\n'
+    b'<EventNotificationAlert version="2.0" '
+    b'xmlns="http://www.hikvision.com/ver20/XMLSchema">'
+    b'<channelID>1</channelID>'
+    b'<eventType>VMD</eventType>'
+    b'<eventState>active</eventState>'
+    b'<activePostCount>1</activePostCount>'
+    b'</EventNotificationAlert>\r\n'
+)
+
+
+class FakeDevice:
+    """Minimal alertStream server used by the tests."""
+
+    def __init__(self, digest=False, chunked=False):
+        self.digest = digest
+        self.chunked = chunked
+        self.requests = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                self.requests.append(head.decode())
+                authorized = b'Authorization: Digest' in head \
+                    if self.digest else b'Authorization: Basic' in head
+                if not authorized:
+                    challenge = (b'WWW-Authenticate: Digest realm="x", '
+                                 b'nonce="abc", qop="auth"\r\n'
+                                 if self.digest else b'')
+                    writer.write(b'HTTP/1.1 401 Unauthorized\r\n' + challenge
+                                 + b'Content-Length: 0\r\n\r\n')
+                    await writer.drain()
+                    continue
+                if self.chunked:
+                    writer.write(b'HTTP/1.1 200 OK\r\n'
+                                 b'Transfer-Encoding: chunked\r\n\r\n')
+                    writer.write(b'%x\r\n%s\r\n' % (len(ALERT_PART), ALERT_PART))
+                else:
+                    writer.write(b'HTTP/1.1 200 OK\r\n\r\n' + ALERT_PART)
+                await writer.drain()
+                # Hold the stream open until the client goes away
+                await reader.read()
+                return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def make_camera(port, **kwargs):
+    """Create an AsyncHikCamera tracking motion on channel 1."""
+    with patch("pyhik.hikvision.HikCamera.initialize"):
+        camera = AsyncHikCamera(host="127.0.0.1", port=port,
+                                usr="admin", pwd="pass", **kwargs)
+    camera.inject_events({"Motion": [1]})
+    return camera
+
+
+class AsyncHikCameraTestCase(unittest.IsolatedAsyncioTestCase):
+    """Test the asyncio alertStream engine."""
+
+    async def run_until_active(self, device, camera):
+        changed = asyncio.Event()
+        camera.add_update_callback(
+            lambda msg: changed.set(), "{}.Motion.1".format(camera.cam_id))
+        camera.start_stream()
+        try:
+            await asyncio.wait_for(changed.wait(), 5)
+        finally:
+            await camera.async_disconnect()
+            await device.stop()
+        self.assertTrue(camera.fetch_attributes("Motion", 1)[0])
+
+    async def test_basic_auth_stream(self):
+        """Test alerts are processed from a basic auth stream."""
+        device = FakeDevice()
+        camera = make_camera(await device.start())
+        await self.run_until_active(device, camera)
+
+        token = base64.b64encode(b"admin:pass").decode()
+        self.assertIn("Authorization: Basic " + token, device.requests[0])
+        self.assertIn("GET /ISAPI/Event/notification/alertStream",
+                      device.requests[0])
+
+    async def test_digest_auth_chunked_stream(self):
+        """Test digest challenge handling and chunked bodies."""
+        device = FakeDevice(digest=True, chunked=True)
+        camera = make_camera(await device.start())
+        await self.run_until_active(device, camera)
+
+        self.assertEqual(len(device.requests), 2)
+        self.assertIn('Authorization: Digest username="admin"',
+                      device.requests[1])
+        self.assertIsInstance(camera.hik_request_stream.auth, HTTPDigestAuth)
+
+    async def test_stale_expiry_on_loop(self):
+        """Test callbacks for timer changes run on the event loop."""
+        device = FakeDevice()
+        camera = make_camera(await device.start())
+        camera.stale_timeout = 0.05
+        threads = []
+        expired = threading.Event()
+
+        def callback(msg):
+            if not camera.fetch_attributes("Motion", 1).state:
+                threads.append(threading.current_thread())
+                expired.set()
+
+        camera.add_update_callback(callback, "{}.Motion.1".format(
+            camera.cam_id))
+        camera.start_stream()
+        try:
+            self.assertTrue(await asyncio.to_thread(expired.wait, 5))
+        finally:
+            await camera.async_disconnect()
+            await device.stop()
+        self.assertEqual(threads, [threading.current_thread()])
+
+    async def test_disconnect_from_thread(self):
+        """Test disconnect() waits for the coroutine like HikCamera's."""
+        device = FakeDevice()
+        camera = make_camera(await device.start())
+        camera.start_stream()
+        await asyncio.sleep(0)
+        self.assertTrue(await asyncio.to_thread(camera.disconnect, 5))
+        self.assertFalse(camera.is_streaming)
+
+        # The loop thread cannot wait for its own coroutine
+        camera.start_stream()
+        self.assertFalse(camera.disconnect(timeout=5))
+        await camera.async_disconnect()
+        self.assertFalse(camera.is_streaming)
+        await device.stop()
+
+    async def test_hub_runs_cameras(self):
+        """Test the hub starts and stops all camera streams."""
+        device = FakeDevice()
+        port = await device.start()
+        cameras = [make_camera(port) for _ in range(3)]
+        async with AsyncEventHub(cameras) as hub:
+            self.assertTrue(all(cam.is_streaming for cam in hub.cameras))
+        self.assertFalse(any(cam.is_streaming for cam in cameras))
+        await device.stop()
+
+
+class ParseHeadTestCase(unittest.TestCase):
+    """Test HTTP response head parsing."""
+
+    def test_parse_head(self):
+        status, headers = _parse_head(
+            b'HTTP/1.1 200 OK\r\nContent-Type: multipart/mixed\r\n\r\n')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers, {'content-type': 'multipart/mixed'})
+
+    def test_parse_head_malformed(self):
+        with self.assertRaises(ValueError):
+            _parse_head(b'garbage\r\n\r\n')
+
+
+class DigestChallengeTestCase(unittest.TestCase):
+    """Test answering the stream's digest challenge."""
+
+    CHALLENGE = ('Digest realm="testrealm@host.com", qop="auth,auth-int", '
+                 'nonce="dcd98b7102dd2f0e8b11d0f600bfb0c093", '
+                 'opaque="5ccc069c403ebaf9f0171e9517f40e41"')
+
+    @patch("pyhik.aio.os.urandom", return_value=bytes.fromhex("0a4f113b"))
+    def test_rfc2617_example(self, mock_urandom):
+        """Test the response matches the worked example of RFC 2617."""
+        digest = _DigestChallenge("Mufasa", "Circle Of Life", self.CHALLENGE)
+        header = digest.header("GET", "http://host.com/dir/index.html")
+        self.assertTrue(header.startswith('Digest username="Mufasa"'))
+        self.assertIn('response="6629fae49393a05397450978507c4ef1"', header)
+        self.assertIn('qop="auth", nc=00000001, cnonce="0a4f113b"', header)
+        self.assertIn('opaque="5ccc069c403ebaf9f0171e9517f40e41"', header)
+        self.assertIn('nc=00000002', digest.header("GET", "http://host.com/"))
+
+    def test_unsupported(self):
+        """Test challenges that cannot be answered give no header."""
+        digest = _DigestChallenge("admin", "pass",
+                                  'Digest nonce="n", algorithm=SHA-1')
+        self.assertIsNone(digest.header("GET", "http://cam/"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.attachments module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from pyhik.attachments import (
+    Attachment, BufferSink, FileSink, SpoolSink, announced_pictures)
+from pyhik.stream import AlertStreamParser
+from test.helpers import CameraTestCase
+from test.test_stream import alert, multipart
+
+JPEG = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 40 + b'\xff\xd9'
+
+
+def smart_alert(pictures=1, trans_type=b'binary', state='active'):
+    """Return a line crossing alert announcing binary pictures."""
+    return alert(1).replace(b'VMD', b'linedetection') \
+        .replace(b'>active<', ('>%s<' % state).encode()) \
+        .replace(b'</EventNotificationAlert>',
+                 b'<detectionPictureTransType>' + trans_type
+                 + b'</detectionPictureTransType>\r\n'
+                 b'<detectionPicturesNumber>%d</detectionPicturesNumber>\r\n'
+                 b'</EventNotificationAlert>' % pictures)
+
+
+def picture(data=JPEG):
+    """Wrap JPEG bytes in a multipart part."""
+    return (b'--boundary\r\nContent-Type: image/jpeg\r\n'
+            b'Content-Length: %d\r\n\r\n' % len(data)) + data + b'\r\n'
+
+
+def chunks(data, size):
+    """Split data into chunks of size bytes."""
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+class AnnouncedPicturesTestCase(unittest.TestCase):
+    """Test reading the picture count of an alert."""
+
+    def test_announced_pictures(self):
+        """Test binary pictures are counted, URLs and plain alerts not."""
+        self.assertEqual(announced_pictures(smart_alert(2)), 2)
+        self.assertEqual(announced_pictures(memoryview(smart_alert(1))), 1)
+        self.assertEqual(announced_pictures(smart_alert(1, b'url')), 0)
+        self.assertEqual(announced_pictures(alert(1)), 0)
+
+
+class BufferSinkTestCase(unittest.TestCase):
+    """Test storing parts in a caller supplied ring buffer."""
+
+    def store(self, sink, data):
+        writer = sink.open('image/jpeg', len(data))
+        if writer is None:
+            return None
+        for chunk in chunks(data, 7):
+            writer.write(memoryview(chunk))
+        return writer.close()
+
+    def test_write_and_read(self):
+        """Test parts are stored back to back and read back."""
+        buffer = bytearray(32)
+        sink = BufferSink(buffer)
+        first = self.store(sink, b'a' * 10)
+        second = self.store(sink, b'b' * 12)
+
+        self.assertEqual((first.offset, second.offset), (0, 10))
+        self.assertEqual(second.read(), b'b' * 12)
+        self.assertIs(second.location, buffer)
+        self.assertEqual(bytes(buffer[10:22]), b'b' * 12)
+        self.assertEqual(first.content_type, 'image/jpeg')
+
+    def test_wrap_overwrites_oldest(self):
+        """Test wrapping invalidates only the overwritten parts."""
+        sink = BufferSink(bytearray(32))
+        first = self.store(sink, b'a' * 10)
+        second = self.store(sink, b'b' * 12)
+        third = self.store(sink, b'c' * 16)
+
+        self.assertEqual(third.offset, 0)
+        with self.assertRaises(ValueError):
+            first.read()
+        with self.assertRaises(ValueError):
+            second.read()
+        self.assertEqual(third.read(), b'c' * 16)
+
+        fourth = self.store(sink, b'd' * 8)
+        self.assertEqual(fourth.offset, 16)
+        self.assertEqual(third.read(), b'c' * 16)
+
+    def test_oversized_and_readonly(self):
+        """Test parts larger than the buffer are skipped."""
+        sink = BufferSink(bytearray(8))
+        self.assertIsNone(sink.open('image/jpeg', 9))
+        self.assertEqual(sink.skipped, 1)
+        with self.assertRaises(ValueError):
+            BufferSink(b'readonly')
+
+    def test_spool(self):
+        """Test anonymous and file backed spools."""
+        sink = SpoolSink(64)
+        self.assertEqual(self.store(sink, b'x' * 40).read(), b'x' * 40)
+        sink.close()
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'spool')
+        sink = SpoolSink(64, path)
+        stored = self.store(sink, b'y' * 20)
+        sink.buffer.flush()
+        with open(path, 'rb') as handle:
+            self.assertEqual(handle.read()[:20], stored.read())
+        sink.close()
+
+
+class FileSinkTestCase(unittest.TestCase):
+    """Test storing parts as files."""
+
+    def test_files(self):
+        """Test each part gets a file named after its type."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        sink = FileSink(os.path.join(directory, 'pictures'))
+        writer = sink.open('image/jpeg', len(JPEG))
+        writer.write(memoryview(JPEG))
+        stored = writer.close()
+
+        self.assertTrue(stored.location.endswith('.jpg'))
+        self.assertEqual(stored.read(), JPEG)
+
+        writer = sink.open('application/octet-stream', 3)
+        writer.abort()
+        self.assertEqual(os.listdir(os.path.dirname(stored.location)),
+                         [os.path.basename(stored.location)])
+
+    def store(self, sink, data):
+        writer = sink.open('image/jpeg', len(data))
+        if writer is None:
+            return None
+        writer.write(data)
+        return writer.close()
+
+    def test_bounded(self):
+        """Test the oldest files are removed to stay within the limits."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        sink = FileSink(directory, max_files=2, max_bytes=10)
+        first = self.store(sink, b'1111')
+        second = self.store(sink, b'2222')
+        third = self.store(sink, b'3333')
+        self.assertEqual(sink.evicted, 1)
+        with self.assertRaises(ValueError):
+            first.read()
+        self.assertEqual(second.read(), b'2222')
+
+        # Byte limit: 4 + 4 + 4 > 10
+        sink.max_files = 10
+        self.store(sink, b'4444')
+        self.assertEqual(len(os.listdir(directory)), 2)
+        with self.assertRaises(ValueError):
+            second.read()
+        self.assertEqual(third.read(), b'3333')
+        self.assertIsNone(self.store(sink, b'x' * 11))
+        self.assertEqual(sink.skipped, 1)
+
+        # Files of an earlier run count against the limits
+        restarted = FileSink(directory, max_files=2, max_bytes=10)
+        self.store(restarted, b'5555')
+        self.assertEqual(len(os.listdir(directory)), 2)
+        with self.assertRaises(ValueError):
+            third.read()
+
+
+class ParserAttachmentTestCase(unittest.TestCase):
+    """Test the parser streams binary parts to its sink."""
+
+    def test_streamed_without_buffering(self):
+        """Test JPEG bytes go to the sink without growing the buffer."""
+        parser = AlertStreamParser(BufferSink(bytearray(64 * 1024)))
+        data = multipart(alert(1)) + picture() + multipart(alert(2))
+        parts = []
+        largest = 0
+        for chunk in chunks(data, 1000):
+            parts.extend((content_type, bytes(payload)
+                          if isinstance(payload, memoryview) else payload)
+                         for content_type, payload in parser.feed(chunk))
+            largest = max(largest, parser.buffered)
+
+        self.assertEqual([content_type for content_type, _ in parts],
+                         [b'application/xml; charset="utf-8"', b'image/jpeg',
+                          b'application/xml; charset="utf-8"'])
+        self.assertEqual(parts[0][1], alert(1))
+        self.assertEqual(parts[2][1], alert(2))
+        self.assertIsInstance(parts[1][1], Attachment)
+        self.assertEqual(parts[1][1].read(), JPEG)
+        self.assertLess(largest, 1000)
+
+    def test_skipped_without_sink(self):
+        """Test binary parts are dropped when there is no sink."""
+        parser = AlertStreamParser()
+        parts = []
+        for chunk in chunks(picture() + multipart(alert(2)), 500):
+            parts.extend(bytes(payload) for _, payload in parser.feed(chunk))
+            self.assertLess(parser.buffered, 500)
+        self.assertEqual(parts, [alert(2)])
+
+    def test_reset_aborts_part(self):
+        """Test a reconnect mid part aborts its writer."""
+        parser = AlertStreamParser(MagicMock())
+        list(parser.feed(picture()[:100]))
+        writer = parser.sink.open.return_value
+        parser.reset()
+        writer.abort.assert_called_once_with()
+        self.assertEqual([bytes(payload) for _, payload
+                          in parser.feed(multipart(alert(1)))], [alert(1)])
+
+
+class CameraAttachmentTestCase(CameraTestCase):
+    """Test pictures are attached to the published event."""
+
+    events = {"Line Crossing": [1]}
+
+    def setUp(self):
+        super().setUp()
+        self.camera.attachment_sink = BufferSink(bytearray(64 * 1024))
+        self.parser = AlertStreamParser()
+        self.events = []
+        self.camera.add_update_callback(self.events.append, "*.*.*")
+
+    def feed(self, data):
+        self.camera.feed_stream(self.parser, data)
+
+    def test_change_waits_for_pictures(self):
+        """Test callbacks run once the announced pictures arrived."""
+        self.feed(multipart(smart_alert(2)) + picture())
+        self.assertTrue(self.camera.fetch_attributes("Line Crossing", 1).state)
+        self.assertEqual(self.events, [])
+
+        self.feed(picture(b'second'))
+        self.assertEqual(len(self.events), 1)
+        event = self.events[0]
+        self.assertEqual(event, '0.Line Crossing.1')
+        self.assertEqual([item.read() for item in event.attachments],
+                         [JPEG, b'second'])
+        self.assertEqual(self.camera.metrics.attachments, 2)
+        # The cached event of the sensor is left alone
+        self.assertEqual(
+            self.camera.sensor_event("Line Crossing", 1).attachments, ())
+
+        self.feed(multipart(smart_alert(0, state='inactive')))
+        self.assertEqual(self.events[1].attachments, ())
+
+    def test_next_alert_releases_change(self):
+        """Test a missing picture does not hold the change forever."""
+        self.feed(multipart(smart_alert(2)) + picture())
+        self.feed(multipart(alert(1)))
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(len(self.events[0].attachments), 1)
+
+    def test_without_sink(self):
+        """Test changes publish at once when pictures are not stored."""
+        self.camera.attachment_sink = None
+        self.feed(multipart(smart_alert(1)))
+        self.assertEqual(len(self.events), 1)
+        self.feed(picture())
+        self.assertEqual(self.events[0].attachments, ())
+        self.assertEqual(self.camera.metrics.attachments, 0)
+
+    def test_process_event_override(self):
+        """Test subclasses overriding process_event(event) keep working."""
+        seen = []
+        self.camera.process_event = seen.append
+        self.feed(multipart(alert(1)) + multipart(smart_alert(0)))
+        self.assertEqual(len(seen), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.capture module."""
+
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pyhik.capture import (
+    CaptureWriter, RECORD_DATA, RECORD_NOTE, load_capture, read_capture,
+    replay, replay_into_camera)
+from pyhik.hikvision import HikCamera
+from test.test_fleet import FakeStreamServer, HEARTBEAT
+from test.test_stream import alert, multipart
+
+
+class CaptureFileTestCase(unittest.TestCase):
+    """Test writing and reading capture files."""
+
+    def test_round_trip(self):
+        """Test records come back with their kind and timestamp."""
+        buf = io.BytesIO()
+        with CaptureWriter(buf) as capture:
+            capture.note('connect http://nvr/stream', timestamp=1.0)
+            capture.write(b'abc', timestamp=1.5)
+            capture.write(memoryview(b'def'), timestamp=2.0)
+        buf.seek(0)
+        records = list(read_capture(buf))
+        self.assertEqual([r.kind for r in records],
+                         [RECORD_NOTE, RECORD_DATA, RECORD_DATA])
+        self.assertEqual(records[0].note, 'connect http://nvr/stream')
+        self.assertEqual(records[2], (RECORD_DATA, 2.0, b'def'))
+
+    def test_truncated(self):
+        """Test a capture cut off mid record stops cleanly."""
+        buf = io.BytesIO()
+        capture = CaptureWriter(buf)
+        capture.write(b'abc')
+        capture.write(b'def')
+        data = buf.getvalue()[:-2]
+        with self.assertLogs('pyhik.capture', level='WARNING'):
+            records = list(read_capture(io.BytesIO(data)))
+        self.assertEqual(len(records), 1)
+
+    def test_bad_magic(self):
+        """Test other files are rejected."""
+        with self.assertRaises(ValueError):
+            list(read_capture(io.BytesIO(b'not a capture')))
+
+    def test_replay_pacing(self):
+        """Test realtime replay keeps the recorded gaps."""
+        buf = io.BytesIO()
+        capture = CaptureWriter(buf)
+        capture.write(b'a', timestamp=10.0)
+        capture.write(b'b', timestamp=10.2)
+        buf.seek(0)
+        records = load_capture(buf)
+        fed = []
+        stats = replay(records, fed.append, realtime=True, speed=2)
+        self.assertEqual(fed, [b'a', b'b'])
+        self.assertGreaterEqual(stats['elapsed'], 0.1)
+        self.assertLess(replay(records, fed.append)['elapsed'], 0.05)
+
+
+class CameraCaptureTestCase(unittest.TestCase):
+    """Test recording a live stream and replaying it through a camera."""
+
+    def camera(self, port=80):
+        with patch("pyhik.hikvision.HikCamera.initialize"):
+            camera = HikCamera(host='127.0.0.1', port=port, usr='admin',
+                               pwd='pass')
+        camera.name = 'test'
+        return camera
+
+    def test_record_stream(self):
+        """Test alert_stream tees the raw bytes into the capture."""
+        server = FakeStreamServer()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        camera = self.camera(server.port)
+        buf = io.BytesIO()
+        camera.start_capture(buf)
+        camera.start_stream()
+        self.assertTrue(server.connected.wait(5))
+        time.sleep(0.1)
+        camera.disconnect()
+        buf.seek(0)
+        records = list(read_capture(buf))
+        self.assertTrue(records[0].note.startswith('connect http://127.0.0.1'))
+        self.assertEqual(b''.join(r.data for r in records[1:]), HEARTBEAT)
+
+    def test_capture_stopped_mid_chunk(self):
+        """Test stop_capture() racing the stream thread does not kill it."""
+        class RacingCamera(HikCamera):
+            # Each read of capture acts as if stop_capture() ran right after
+            @property
+            def capture(self):
+                capture = self.__dict__.get('_capture')
+                self.__dict__['_capture'] = None
+                return capture
+
+            @capture.setter
+            def capture(self, value):
+                self.__dict__['_capture'] = value
+
+        server = FakeStreamServer()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with patch("pyhik.hikvision.HikCamera.initialize"):
+            camera = RacingCamera(host='127.0.0.1', port=server.port,
+                                  usr='admin', pwd='pass')
+        camera.capture = CaptureWriter(io.BytesIO())
+        camera.start_stream()
+        self.assertTrue(server.connected.wait(5))
+        time.sleep(0.1)
+        self.assertTrue(camera.thrd.is_alive())
+        self.assertEqual(camera.metrics.bytes_read, len(HEARTBEAT))
+        self.assertTrue(camera.disconnect())
+
+    def test_replay_into_camera(self):
+        """Test a capture drives event states and callbacks."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'stream.cap')
+            data = multipart(alert(1)) + multipart(alert(2))
+            with CaptureWriter(path) as capture:
+                capture.note('connect http://nvr/stream')
+                # Split mid part like a real socket read
+                capture.write(data[:50])
+                capture.write(data[50:])
+            camera = self.camera()
+            camera.watchdog = MagicMock()
+            camera.inject_events({"Motion": [1, 2]})
+            callback = MagicMock()
+            camera.add_update_callback(callback, "0.Motion.*")
+            stats = replay_into_camera(camera, path)
+        self.assertEqual(stats['chunks'], 2)
+        self.assertEqual(callback.call_count, 2)
+        self.assertTrue(camera.fetch_attributes("Motion", 2).state)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.coalesce module."""
+
+import threading
+import time
+import unittest
+
+from pyhik.coalesce import MODE_DEBOUNCE, MODE_HOLD_DOWN
+from pyhik.stream import AlertEvent
+from test.helpers import CameraTestCase
+
+
+class CoalescingTestCase(CameraTestCase):
+    """Test coalescing of flapping sensors."""
+
+    events = {"Motion": [1], "Tamper Detection": [1]}
+
+    def setUp(self):
+        super().setUp()
+        self.published = []
+        self.camera.add_update_callback(self.on_update, "0.*.*")
+
+    def on_update(self, msg):
+        record = self.camera.fetch_attributes(msg.event_type, msg.channel)
+        self.published.append((msg.event_type, record.state))
+
+    def flap(self, times, event_type="VMD"):
+        for i in range(times):
+            state = "active" if i % 2 == 0 else "inactive"
+            self.camera.process_event(AlertEvent(event_type, state, 1, 1))
+
+    def test_hold_down_latest_state_wins(self):
+        """Test a burst publishes the first and the final state only."""
+        self.camera.set_coalescing({"Motion": 0.05}, MODE_HOLD_DOWN)
+        self.flap(5)
+        # States stay accurate while publishing is held back
+        self.assertTrue(self.camera.fetch_attributes("Motion", 1).state)
+        self.assertEqual(self.published, [("Motion", True)])
+        self.flap(2)
+        time.sleep(0.15)
+        self.assertEqual(self.published, [("Motion", True), ("Motion", False)])
+        self.assertEqual(self.camera.coalescer.suppressed("Motion"), 4)
+
+    def test_flap_back_not_published(self):
+        """Test a flap back to the published state is suppressed."""
+        self.camera.set_coalescing({"Motion": 0.05})
+        self.flap(3)
+        time.sleep(0.15)
+        self.assertEqual(self.published, [("Motion", True)])
+        self.assertEqual(self.camera.coalescer.stats()["Motion"],
+                         {"transitions": 3, "published": 1, "suppressed": 2})
+
+    def test_debounce(self):
+        """Test debounce publishes only after the state settles."""
+        self.camera.set_coalescing({"Motion": 0.05}, MODE_DEBOUNCE)
+        self.flap(4)
+        self.assertEqual(self.published, [])
+        time.sleep(0.15)
+        self.assertEqual(self.published, [])
+        self.flap(1)
+        time.sleep(0.15)
+        self.assertEqual(self.published, [("Motion", True)])
+
+    def test_window_close_off_scheduler_thread(self):
+        """Test changes published when a window closes skip the scheduler."""
+        threads = []
+        self.camera.add_update_callback(
+            lambda msg: threads.append(threading.current_thread().name),
+            "0.Motion.1")
+        self.camera.set_coalescing({"Motion": 0.05})
+        self.flap(2)
+        time.sleep(0.15)
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn("pyhik-scheduler", threads)
+
+    def test_other_types_unaffected(self):
+        """Test event types without a window publish every change."""
+        self.camera.set_coalescing({"Motion": 0.05})
+        self.flap(3, "tamperdetection")
+        self.assertEqual(len(self.published), 3)
+
+    def test_disable(self):
+        """Test coalescing can be turned off."""
+        self.camera.set_coalescing({"Motion": 10})
+        self.camera.set_coalescing(None)
+        self.flap(3)
+        self.assertEqual(len(self.published), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.dispatch module."""
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pyhik.dispatch import (
+    DispatchExecutor, POLICY_BLOCK, POLICY_COALESCE, POLICY_DROP_OLDEST)
+from pyhik.hikvision import HikCamera
+from pyhik.stream import AlertEvent
+
+
+class DispatchExecutorTestCase(unittest.TestCase):
+    """Test the bounded dispatch executor."""
+
+    def setUp(self):
+        self.gate = threading.Event()
+        self.calls = []
+
+    def executor(self, **kwargs):
+        executor = DispatchExecutor(**kwargs)
+        self.addCleanup(executor.shutdown, False)
+        self.addCleanup(self.gate.set)
+        return executor
+
+    def record(self, value):
+        self.calls.append(value)
+
+    def hold(self):
+        self.gate.wait(5)
+
+    def test_runs_off_thread(self):
+        """Test callbacks run on a worker thread."""
+        executor = self.executor()
+        threads = []
+        executor.submit('a', lambda: threads.append(threading.current_thread()))
+        executor.shutdown()
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_per_key_ordering(self):
+        """Test callbacks for one key run in order across workers."""
+        executor = self.executor(workers=4)
+        results = {key: [] for key in range(8)}
+        for i in range(200):
+            for key in results:
+                executor.submit(key, results[key].append, i)
+        executor.shutdown()
+        for values in results.values():
+            self.assertEqual(values, list(range(200)))
+
+    def test_drop_oldest(self):
+        """Test the oldest queued item is dropped when full."""
+        executor = self.executor(maxsize=2, policy=POLICY_DROP_OLDEST)
+        executor.submit('x', self.hold)
+        time.sleep(0.05)
+        for i in range(4):
+            executor.submit('a', self.record, i)
+        self.assertEqual(executor.depth, 2)
+        self.gate.set()
+        executor.shutdown()
+        self.assertEqual(self.calls, [2, 3])
+        stats = executor.stats()
+        self.assertEqual(stats['dropped'], 2)
+        self.assertEqual(stats['max_depth'], 2)
+        self.assertEqual(stats['completed'], 3)
+
+    def test_coalesce(self):
+        """Test queued items for a key are replaced by the latest."""
+        executor = self.executor(maxsize=10, policy=POLICY_COALESCE)
+        executor.submit('x', self.hold)
+        time.sleep(0.05)
+        for i in range(5):
+            executor.submit('a', self.record, ('a', i))
+            executor.submit('b', self.record, ('b', i))
+        self.gate.set()
+        executor.shutdown()
+        self.assertEqual(self.calls, [('a', 4), ('b', 4)])
+        self.assertEqual(executor.stats()['coalesced'], 8)
+
+    def test_block(self):
+        """Test the submitter waits for space with the block policy."""
+        executor = self.executor(maxsize=1, policy=POLICY_BLOCK)
+        executor.submit('x', self.hold)
+        time.sleep(0.05)
+        executor.submit('a', self.record, 1)
+        done = threading.Event()
+
+        def submit():
+            executor.submit('a', self.record, 2)
+            done.set()
+
+        threading.Thread(target=submit, daemon=True).start()
+        self.assertFalse(done.wait(0.1))
+        self.gate.set()
+        self.assertTrue(done.wait(1))
+        executor.shutdown()
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_callback_errors_logged(self):
+        """Test a failing callback doesn't stop the worker."""
+        executor = self.executor()
+        with self.assertLogs('pyhik.dispatch', level='ERROR'):
+            executor.submit('a', lambda: 1 / 0)
+            executor.submit('a', self.record, 1)
+            executor.shutdown()
+        self.assertEqual(self.calls, [1])
+
+    def test_shutdown_rejects(self):
+        """Test submissions after shutdown are refused."""
+        executor = self.executor()
+        executor.shutdown()
+        self.assertFalse(executor.submit('a', self.record, 1))
+
+    def test_invalid_policy(self):
+        """Test unknown policies are rejected."""
+        with self.assertRaises(ValueError):
+            DispatchExecutor(policy='fifo')
+
+
+class CameraDispatchTestCase(unittest.TestCase):
+    """Test cameras publishing through an executor."""
+
+    @patch("pyhik.hikvision.requests.Session")
+    @patch("pyhik.hikvision.HikCamera.initialize")
+    def test_slow_callback_does_not_block_stream(self, mock_init,
+                                                 mock_session):
+        """Test process_event returns while callbacks are still running."""
+        camera = HikCamera(host="localhost")
+        camera.watchdog = MagicMock()
+        camera.inject_events({"Motion": [1]})
+        camera.dispatch_executor = DispatchExecutor()
+        gate = threading.Event()
+        messages = []
+
+        def callback(msg):
+            gate.wait(5)
+            messages.append(msg)
+
+        camera.add_update_callback(callback, "0.Motion.1")
+        camera.process_event(AlertEvent("VMD", "active", 1, 1))
+        camera.process_event(AlertEvent("VMD", "inactive", 1, 0))
+        self.assertEqual(messages, [])
+        gate.set()
+        camera.dispatch_executor.shutdown()
+        self.assertEqual(messages, ["0.Motion.1", "0.Motion.1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
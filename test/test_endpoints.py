@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.endpoints module."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, call
+
+import requests
+from requests.auth import HTTPDigestAuth
+
+from benchmarks.nvr_simulator import (
+    AUTH_BASIC, SimulatorThread, make_devices)
+from pyhik.constants import NVR_DEVICE
+from pyhik.endpoints import (
+    ALT_DEVICE_INFO_PATH, DEVICE_INFO_PATH, PROXY_PICTURE_PATH,
+    EndpointCache)
+from pyhik.hikvision import HikCamera
+
+
+class EndpointCacheTestCase(unittest.TestCase):
+    """Test remembering choices on disk."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'endpoints.json')
+
+    def test_persisted(self):
+        """Test choices survive reloading the file."""
+        cache = EndpointCache(self.path)
+        cache.identify('http://cam:80', 'DS1', 'V1')
+        cache.remember('http://cam:80', auth='digest',
+                       device_info=ALT_DEVICE_INFO_PATH)
+
+        cache = EndpointCache(self.path)
+        self.assertIn('http://cam:80', cache)
+        self.assertEqual(cache.get('http://cam:80', 'auth'), 'digest')
+        self.assertEqual(cache.get('http://cam:80', 'device_info'),
+                         ALT_DEVICE_INFO_PATH)
+        self.assertIsNone(cache.get('http://other:80', 'auth'))
+        self.assertEqual(cache.hits, 2)
+
+        self.assertTrue(cache.forget('http://cam:80', 'auth'))
+        self.assertFalse(cache.forget('http://cam:80', 'auth'))
+        self.assertIsNone(EndpointCache(self.path).get('http://cam:80',
+                                                       'auth'))
+        self.assertEqual(cache.invalidations, 1)
+
+    def test_identity_change(self):
+        """Test another serial or firmware at the address clears choices."""
+        cache = EndpointCache()
+        cache.remember('http://cam:80', auth='digest')
+        self.assertTrue(cache.identify('http://cam:80', 'DS1', 'V1'))
+        self.assertEqual(cache.get('http://cam:80', 'auth'), 'digest')
+        self.assertTrue(cache.identify('http://cam:80', 'DS1', 'V1'))
+
+        self.assertFalse(cache.identify('http://cam:80', 'DS1', 'V2'))
+        self.assertIsNone(cache.get('http://cam:80', 'auth'))
+        self.assertEqual(cache.invalidations, 1)
+
+    def test_untrusted_file(self):
+        """Test damaged files and unknown values are ignored."""
+        with open(self.path, 'w') as cache_file:
+            cache_file.write('{not json')
+        self.assertEqual(len(EndpointCache(self.path)), 0)
+
+        with open(self.path, 'w') as cache_file:
+            json.dump({'version': 1, 'devices': {'http://cam:80': {
+                'auth': 'ntlm', 'device_info': 'http://evil/'}}},
+                cache_file)
+        cache = EndpointCache(self.path)
+        self.assertIsNone(cache.get('http://cam:80', 'auth'))
+        self.assertEqual(cache.get('http://cam:80', 'device_info',
+                                   DEVICE_INFO_PATH), DEVICE_INFO_PATH)
+        with self.assertRaises(ValueError):
+            cache.remember('http://cam:80', auth='ntlm')
+
+
+class CameraEndpointsTestCase(unittest.TestCase):
+    """Test cameras skip probing with a warm cache."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.devices = (make_devices(1, channels=4)
+                       + make_devices(1, channels=1, auth=AUTH_BASIC))
+        cls.simulator = SimulatorThread(cls.devices)
+        cls.nvr_port, cls.cam_port = cls.simulator.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.simulator.stop()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'endpoints.json')
+
+    def device_info_requests(self, port, device):
+        """Return the requests deviceInfo took with a freshly loaded cache."""
+        camera = HikCamera('127.0.0.1', port, 'admin', 'password',
+                           defer_init=True,
+                           endpoint_cache=EndpointCache(self.path))
+        before = device.requests
+        self.assertIsNotNone(camera.get_device_info())
+        return device.requests - before, camera
+
+    def test_warm_start(self):
+        """Test the remembered auth scheme saves round trips."""
+        cold, _ = self.device_info_requests(self.nvr_port, self.devices[0])
+        warm, camera = self.device_info_requests(self.nvr_port,
+                                                 self.devices[0])
+        self.assertEqual(cold, 3)
+        self.assertEqual(warm, 2)
+        self.assertIsInstance(camera.hik_request_stream.auth, HTTPDigestAuth)
+        self.assertEqual(camera.endpoint_cache.get(camera.root_url, 'auth'),
+                         'digest')
+
+    def test_failed_choice(self):
+        """Test a remembered choice that fails is dropped and re-probed."""
+        cache = EndpointCache(self.path)
+        root_url = 'http://127.0.0.1:%d' % self.cam_port
+        cache.remember(root_url, auth='digest',
+                       device_info=DEVICE_INFO_PATH)
+
+        requests_made, camera = self.device_info_requests(
+            self.cam_port, self.devices[1])
+        # The failed remembered request, then basic auth on the probe
+        self.assertEqual(requests_made, 2)
+        self.assertEqual(camera.endpoint_cache.invalidations, 1)
+        self.assertEqual(camera.hik_request.auth, ('admin', 'password'))
+        self.assertEqual(EndpointCache(self.path).get(root_url, 'auth'),
+                         'basic')
+
+
+class SnapshotEndpointsTestCase(unittest.TestCase):
+    """Test the StreamingProxy snapshot URL is remembered."""
+
+    def camera(self):
+        camera = object.__new__(HikCamera)
+        camera.device_type = NVR_DEVICE
+        camera.root_url = "localhost:80"
+        camera.name = "Test"
+        camera.hik_request = MagicMock(name="api_session")
+        camera.endpoint_cache = EndpointCache()
+        return camera
+
+    def test_proxy_remembered(self):
+        """Test later snapshots go straight to the StreamingProxy."""
+        camera = self.camera()
+        camera.hik_request.get.side_effect = [
+            MagicMock(status_code=requests.codes.bad_request),
+            MagicMock(status_code=requests.codes.ok, content=b"one"),
+            MagicMock(status_code=requests.codes.ok, content=b"two"),
+        ]
+        self.assertEqual(camera.get_snapshot(channel=2), b"one")
+        self.assertEqual(camera.get_snapshot(channel=3), b"two")
+        self.assertEqual(
+            camera.hik_request.get.call_args_list[-1],
+            call("localhost:80/ISAPI/ContentMgmt/StreamingProxy/channels/"
+                 "301/picture", timeout=10))
+        self.assertEqual(camera.hik_request.get.call_count, 3)
+
+    def test_proxy_failed(self):
+        """Test a failing remembered proxy falls back and is forgotten."""
+        camera = self.camera()
+        camera.endpoint_cache.remember('localhost:80',
+                                       snapshot=PROXY_PICTURE_PATH)
+        camera.hik_request.get.side_effect = [
+            MagicMock(status_code=requests.codes.not_found),
+            MagicMock(status_code=requests.codes.ok, content=b"direct"),
+        ]
+        self.assertEqual(camera.get_snapshot(), b"direct")
+        self.assertEqual(
+            camera.hik_request.get.call_args_list[-1],
+            call("localhost:80/ISAPI/Streaming/channels/101/picture",
+                 timeout=10))
+        self.assertEqual(camera.endpoint_cache.invalidations, 1)
+        self.assertNotEqual(
+            camera.endpoint_cache.get('localhost:80', 'snapshot'),
+            PROXY_PICTURE_PATH)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.exporter module."""
+
+import unittest
+import urllib.request
+
+from pyhik.exporter import CONTENT_TYPE, OVERFLOW_LABEL, OpenMetricsExporter
+from pyhik.metrics import (
+    MetricsRegistry, RequestMetrics, StreamMetrics)
+from pyhik.state import EventStateTable
+
+
+class FakeCamera(object):
+    """Just enough of a camera to export event states."""
+
+    def __init__(self, name, events):
+        self.metrics = StreamMetrics(name)
+        self.event_states = EventStateTable()
+        for event, channel, state in events:
+            self.event_states.add(event, channel, state)
+
+
+class ExporterTestCase(unittest.TestCase):
+    """Test rendering metrics as OpenMetrics text."""
+
+    def setUp(self):
+        self.registry = MetricsRegistry(StreamMetrics)
+        self.requests = MetricsRegistry(RequestMetrics)
+
+    def exporter(self, **kwargs):
+        return OpenMetricsExporter(self.registry, self.requests, **kwargs)
+
+    def test_render(self):
+        """Test counters, histograms and the EOF marker."""
+        metrics = self.registry.register(StreamMetrics('cam "1"'))
+        metrics.alerts = 5
+        metrics.parse_time.observe(0.0002)
+        client = self.requests.register(RequestMetrics('nvr'))
+        client.requests = 2
+
+        text = self.exporter().render()
+        lines = text.splitlines()
+        self.assertIn('# TYPE pyhik_stream_alerts counter', lines)
+        self.assertIn('pyhik_stream_alerts_total{device="cam \\"1\\""} 5',
+                      lines)
+        self.assertIn('pyhik_isapi_requests_total{device="nvr"} 2', lines)
+        self.assertIn('# TYPE pyhik_stream_parse_time_seconds histogram',
+                      lines)
+        self.assertIn(
+            'pyhik_stream_parse_time_seconds_bucket{le="0.00025"} 1', lines)
+        self.assertIn(
+            'pyhik_stream_parse_time_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn('pyhik_stream_parse_time_seconds_count 1', lines)
+        self.assertTrue(text.endswith('# EOF\n'))
+
+    def test_device_histograms(self):
+        """Test histograms can be labelled per device."""
+        metrics = self.registry.register(StreamMetrics('a'))
+        metrics.event_age.observe(1.0)
+        lines = self.exporter(device_histograms=True).render().splitlines()
+        self.assertIn(
+            'pyhik_stream_event_age_seconds_bucket{device="a",le="1.0"} 1',
+            lines)
+        self.assertIn('pyhik_stream_event_age_seconds_count{device="a"} 1',
+                      lines)
+
+    def test_device_cap(self):
+        """Test devices beyond the cap are summed into 'other'."""
+        kept = []
+        for name in ('a', 'b', 'c', 'd'):
+            metrics = self.registry.register(StreamMetrics(name))
+            metrics.reconnects = 1
+            kept.append(metrics)
+        lines = [line for line in self.exporter(max_devices=2).render()
+                 .splitlines()
+                 if line.startswith('pyhik_stream_reconnects_total')]
+        self.assertEqual(len(lines), 3)
+        self.assertIn('pyhik_stream_reconnects_total{device="%s"} 2'
+                      % OVERFLOW_LABEL, lines)
+
+    def test_duplicate_devices_merged(self):
+        """Test metrics sharing a device name export one series."""
+        kept = [self.registry.register(StreamMetrics('a'))
+                for _ in range(2)]
+        for metrics in kept:
+            metrics.callbacks = 3
+        lines = self.exporter().render().splitlines()
+        self.assertIn('pyhik_stream_callbacks_total{device="a"} 6', lines)
+
+    def test_event_states_capped(self):
+        """Test event states are labelled and capped."""
+        camera = FakeCamera('a', [('Motion', 1, True), ('Motion', 2, False),
+                                  ('Motion', 3, True), ('Tamper', 1, True)])
+        exporter = self.exporter(cameras=[camera], max_channels=2,
+                                 max_event_types=1)
+        lines = [line for line in exporter.render().splitlines()
+                 if line.startswith('pyhik_event_active')]
+        self.assertEqual(lines, [
+            'pyhik_event_active{device="a",event_type="Motion",channel="1"} 1',
+            'pyhik_event_active{device="a",event_type="Motion",channel="2"} 0',
+            'pyhik_event_active{device="a",event_type="Motion",'
+            'channel="other"} 1',
+            'pyhik_event_active{device="a",event_type="other",'
+            'channel="1"} 1',
+        ])
+
+    def test_serve(self):
+        """Test scraping the HTTP endpoint."""
+        metrics = self.registry.register(StreamMetrics('a'))
+        metrics.alerts = 1
+        exporter = self.exporter()
+        host, port = exporter.serve(port=0)
+        try:
+            with urllib.request.urlopen(
+                    'http://%s:%d/metrics' % (host, port), timeout=5) as resp:
+                self.assertEqual(resp.headers['Content-Type'], CONTENT_TYPE)
+                body = resp.read().decode()
+        finally:
+            exporter.shutdown()
+        self.assertIn('pyhik_stream_alerts_total{device="a"} 1', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
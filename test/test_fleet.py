@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.fleet module."""
+
+import asyncio
+import socketserver
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from pyhik.fleet import async_bootstrap, bootstrap, disconnect_all
+from pyhik.hikvision import HikCamera
+
+HEARTBEAT = (
+    b'--boundary\r\nContent-Type: application/xml\r\n\r\n'
+    b'<EventNotificationAlert><channelID>1</channelID>'
+    b'<eventType>videoloss</eventType><eventState>inactive</eventState>'
+    b'<activePostCount>0</activePostCount></EventNotificationAlert>\r\n')
+
+
+class StreamHandler(socketserver.BaseRequestHandler):
+    """Send one heartbeat then hold the stream open without data."""
+
+    def handle(self):
+        self.request.recv(4096)
+        if self.server.status != 200:
+            self.request.sendall(b'HTTP/1.1 %d Error\r\nContent-Length: 0\r\n'
+                                 b'\r\n' % self.server.status)
+            return
+        self.request.sendall(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: multipart/mixed; boundary=boundary\r\n\r\n'
+            + HEARTBEAT)
+        self.server.connected.set()
+        # Block until the client goes away
+        while self.request.recv(4096):
+            pass
+
+
+class FakeStreamServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, status=200):
+        super().__init__(('127.0.0.1', 0), StreamHandler)
+        self.status = status
+        self.connected = threading.Event()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class DisconnectTestCase(unittest.TestCase):
+    """Test bounded disconnect latency."""
+
+    def setUp(self):
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def camera(self):
+        with patch("pyhik.hikvision.HikCamera.initialize"):
+            camera = HikCamera(host='127.0.0.1', port=self.server.port,
+                               usr='admin', pwd='pass')
+        camera.name = 'test'
+        return camera
+
+    def test_disconnect_interrupts_read(self):
+        """Test a read blocked on a silent stream is interrupted."""
+        self.server = FakeStreamServer()
+        camera = self.camera()
+        camera.start_stream()
+        self.assertTrue(self.server.connected.wait(5))
+        start = time.monotonic()
+        self.assertTrue(camera.disconnect(timeout=5))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_disconnect_during_backoff(self):
+        """Test the reconnect backoff waits on the kill event."""
+        self.server = FakeStreamServer(status=500)
+        camera = self.camera()
+        camera.start_stream()
+        time.sleep(0.2)
+        start = time.monotonic()
+        self.assertTrue(camera.disconnect(timeout=5))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_disconnect_all(self):
+        """Test a fleet disconnects in parallel."""
+        self.server = FakeStreamServer()
+        cameras = [self.camera() for _ in range(10)]
+        for camera in cameras:
+            camera.start_stream()
+        time.sleep(0.3)
+        start = time.monotonic()
+        self.assertEqual(disconnect_all(cameras, timeout=5), [])
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertFalse(any(camera.thrd.is_alive() for camera in cameras))
+
+    def test_disconnect_all_ends_events(self):
+        """Test events() iterators end like after disconnect()."""
+        self.server = FakeStreamServer()
+        camera = self.camera()
+        consumer = threading.Thread(target=list, args=(camera.events(),),
+                                    daemon=True)
+        consumer.start()
+        deadline = time.monotonic() + 5
+        while not camera._subscriptions and time.monotonic() < deadline:
+            time.sleep(0.01)
+        camera.start_stream()
+        self.assertTrue(self.server.connected.wait(5))
+        self.assertEqual(disconnect_all([camera], timeout=5), [])
+        consumer.join(5)
+        self.assertFalse(consumer.is_alive())
+
+
+class SlowDevice(object):
+    """Deferred camera whose initialize() takes config['delay'] seconds."""
+
+    def __init__(self, config):
+        self.config = config
+        self.event_states = None
+
+    def initialize(self):
+        time.sleep(self.config.get('delay', 0.2))
+        if self.config.get('error'):
+            raise ConnectionError(self.config['error'])
+        if not self.config.get('offline'):
+            self.event_states = {}
+
+
+class BootstrapTestCase(unittest.TestCase):
+    """Test concurrent fleet initialization."""
+
+    def test_defer_init(self):
+        """Test a deferred camera does not contact the device."""
+        with patch("pyhik.hikvision.HikCamera.initialize") as initialize:
+            camera = HikCamera(host='127.0.0.1', defer_init=True)
+            initialize.assert_not_called()
+        self.assertEqual(len(camera.event_states), 0)
+        self.assertEqual(camera.cam_id, 0)
+
+    def test_concurrent(self):
+        """Test total startup is close to the slowest device."""
+        configs = [{'host': 'cam%d' % index, 'delay': 0.2}
+                   for index in range(10)]
+        configs[3]['delay'] = 0.4
+        start = time.monotonic()
+        results = bootstrap(configs, factory=SlowDevice)
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual([result.device for result in results],
+                         ['cam%d' % index for index in range(10)])
+
+    def test_bounded(self):
+        """Test at most workers devices initialize at once."""
+        configs = [{'host': 'cam%d' % index, 'delay': 0.1}
+                   for index in range(4)]
+        start = time.monotonic()
+        bootstrap(configs, workers=2, factory=SlowDevice)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_failures_and_progress(self):
+        """Test failures are reported per device along with progress."""
+        configs = [{'host': 'good', 'key': 'gate'},
+                   {'host': 'down', 'error': 'refused'},
+                   {'host': 'auth', 'offline': True},
+                   {'host': 'hung', 'delay': 5}]
+        progress = []
+        start = time.monotonic()
+        results = bootstrap(configs, timeout=0.5, factory=SlowDevice,
+                            progress=lambda result, done, total: progress.append(
+                                (result.device, done, total)))
+        self.assertLess(time.monotonic() - start, 2)
+
+        self.assertEqual([(result.device, result.error) for result in results],
+                         [('gate', None), ('down', 'refused'),
+                          ('auth', 'Unable to read device info'),
+                          ('hung', 'Timed out')])
+        self.assertIsInstance(results[0].camera, SlowDevice)
+        self.assertEqual([done for _, done, _ in progress], [1, 2, 3, 4])
+        self.assertEqual({total for _, _, total in progress}, {4})
+        self.assertEqual(progress[-1][0], 'hung')
+
+    def test_async(self):
+        """Test the event loop variant."""
+        configs = [{'host': 'cam%d' % index, 'delay': 0.2}
+                   for index in range(5)] + [{'host': 'hung', 'delay': 1}]
+
+        async def run():
+            start = time.monotonic()
+            results = await async_bootstrap(configs, timeout=0.5,
+                                            factory=SlowDevice)
+            return results, time.monotonic() - start
+
+        results, elapsed = asyncio.run(run())
+        self.assertLess(elapsed, 0.9)
+        self.assertEqual(sum(result.ok for result in results), 5)
+        self.assertEqual(results[-1].error, 'Timed out')
+
+    def test_async_concurrency(self):
+        """Test concurrency is not capped by the default executor."""
+        configs = [{'host': 'cam%d' % index, 'delay': 0.2}
+                   for index in range(40)]
+
+        async def run():
+            start = time.monotonic()
+            results = await async_bootstrap(configs, concurrency=40,
+                                            factory=SlowDevice)
+            return results, time.monotonic() - start
+
+        results, elapsed = asyncio.run(run())
+        self.assertTrue(all(result.ok for result in results))
+        self.assertLess(elapsed, 0.6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.history module."""
+
+import unittest
+
+from pyhik.history import ENTRY_SIZE, EventHistory, RingBuffer
+from pyhik.stream import AlertEvent
+from test.helpers import CameraTestCase
+
+
+class RingBufferTestCase(unittest.TestCase):
+    """Test the fixed size ring of timestamps and states."""
+
+    def test_wraps_and_keeps_newest(self):
+        """Test a full ring overwrites its oldest entries."""
+        ring = RingBuffer(4)
+        for i in range(6):
+            ring.append(float(i), i % 2 == 0)
+        self.assertEqual(len(ring), 4)
+        self.assertEqual(ring.total, 6)
+        self.assertEqual(list(ring.entries()), [
+            (2.0, True), (3.0, False), (4.0, True), (5.0, False)])
+        self.assertEqual(ring.last(), (5.0, False))
+
+    def test_range_queries(self):
+        """Test counts over half-open ranges across the wrap point."""
+        ring = RingBuffer(5)
+        for i in range(8):
+            ring.append(float(i), i != 6)
+        # Holds 3..7
+        self.assertEqual(ring.count(), 4)
+        self.assertEqual(ring.count(state=None), 5)
+        self.assertEqual(ring.count(state=False), 1)
+        self.assertEqual(ring.count(4.0, 7.0), 2)
+        self.assertEqual(ring.count(4.0, 7.0, state=None), 3)
+        self.assertEqual(ring.count(10.0), 0)
+        self.assertEqual(ring.count(None, 3.0), 0)
+        self.assertEqual(list(ring.entries(5.5, 7.0)), [(6.0, False)])
+
+    def test_invalid_capacity(self):
+        """Test a ring needs room for an entry."""
+        with self.assertRaises(ValueError):
+            RingBuffer(0)
+
+
+class EventHistoryTestCase(unittest.TestCase):
+    """Test per sensor history, queries and bounds."""
+
+    def setUp(self):
+        self.now = 100.0
+        self.history = EventHistory(capacity=8, max_sensors=3)
+        self.history.clock = lambda: self.now
+
+    def test_count_and_rate(self):
+        """Test windowed counts and rates per channel and type."""
+        for when in (10.0, 50.0, 95.0, 99.0):
+            self.history.record('Line Crossing', 7, True, when)
+        self.history.record('Line Crossing', 2, True, 98.0)
+        self.history.record('Line Crossing', 7, False, 99.5)
+
+        self.assertEqual(self.history.count('Line Crossing', 7, window=10), 2)
+        self.assertEqual(self.history.count('Line Crossing', window=10), 3)
+        self.assertEqual(self.history.count('Line Crossing', 7, state=None),
+                         5)
+        self.assertAlmostEqual(
+            self.history.rate('Line Crossing', 7, window=60), 3 / 60)
+        self.assertEqual(self.history.events('Line Crossing', start=97.0), [
+            (98.0, True), (99.0, True), (99.5, False)])
+        self.assertEqual(self.history.last('Line Crossing', 7),
+                         (99.5, False))
+        self.assertIsNone(self.history.last('Motion', 1))
+
+    def test_memory_bounded(self):
+        """Test sensors beyond max_sensors are not tracked."""
+        for channel in range(1, 6):
+            self.history.record('Motion', channel, True)
+        self.assertEqual(len(self.history.sensors()), 3)
+        self.assertEqual(self.history.dropped, 2)
+        self.assertEqual(self.history.nbytes, self.history.max_bytes)
+        self.assertEqual(self.history.max_bytes, 3 * 8 * ENTRY_SIZE)
+
+
+class CameraHistoryTestCase(CameraTestCase):
+    """Test a camera fills its history while processing alerts."""
+
+    events = {"Line Crossing": [7]}
+
+    def setUp(self):
+        super().setUp()
+
+    def test_history_disabled_by_default(self):
+        """Test nothing is kept unless history is enabled."""
+        self.camera.process_event(AlertEvent("linedetection", "active", 7, 1))
+        self.assertIsNone(self.camera.history)
+
+    def test_alerts_recorded(self):
+        """Test tracked alerts and stale expiries are recorded."""
+        history = self.camera.set_history(capacity=16)
+        self.camera.stale_timeout = 0
+        for _ in range(3):
+            self.camera.process_event(
+                AlertEvent("linedetection", "active", 7, 1))
+        # Untracked sensors are ignored
+        self.camera.process_event(AlertEvent("VMD", "active", 1, 1))
+        self.camera.update_stale()
+
+        self.assertEqual(history.sensors(), [("Line Crossing", 7)])
+        self.assertEqual(history.count("Line Crossing", 7, window=60), 3)
+        self.assertFalse(history.last("Line Crossing", 7)[1])
+
+        self.camera.set_history(None)
+        self.assertIsNone(self.camera.history)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.hooks module."""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pyhik.hikvision import HikCamera
+from pyhik.hooks import (
+    BODY_READ, CONNECT, DISPATCH, FIRST_BYTE, FRAME, HOOKS, HookRegistry,
+    PARSE, REQUEST_START, STATE_UPDATE, XML_PARSE, timed)
+from pyhik.isapi import HTTPMethod, ISAPIClient
+from pyhik.stream import AlertStreamParser
+from test.helpers import CameraTestCase
+from test.test_stream import alert, multipart
+
+DEVICE_INFO_XML = (b'<?xml version="1.0" encoding="UTF-8"?>'
+                   b'<DeviceInfo><deviceName>Test</deviceName></DeviceInfo>')
+
+
+class Recorder(object):
+    """Hook keeping the stages it was called for."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, stage, subject, start, end):
+        assert end >= start
+        self.calls.append((stage, subject))
+
+    @property
+    def stages(self):
+        return [stage for stage, _ in self.calls]
+
+
+class HookRegistryTestCase(unittest.TestCase):
+    """Test registering and emitting hooks."""
+
+    def test_register_and_unregister(self):
+        """Test hooks are called for their stages only."""
+        registry = HookRegistry()
+        self.assertFalse(registry.enabled)
+        recorder = registry.register(Recorder(), [PARSE])
+        self.assertTrue(registry.enabled)
+        registry.emit(PARSE, 'x', 1.0, 2.0)
+        registry.emit(FRAME, 'x', 1.0, 2.0)
+        self.assertEqual(recorder.calls, [(PARSE, 'x')])
+        registry.unregister(recorder)
+        self.assertFalse(registry.enabled)
+
+    def test_unknown_stage(self):
+        """Test registering for an unknown stage fails."""
+        with self.assertRaises(ValueError):
+            HookRegistry().register(Recorder(), ['nope'])
+
+    def test_failing_hook(self):
+        """Test an exception in one hook does not stop the others."""
+        registry = HookRegistry()
+        registry.register(MagicMock(side_effect=RuntimeError))
+        recorder = registry.register(Recorder())
+        with self.assertLogs('pyhik.hooks', 'ERROR'):
+            registry.emit(DISPATCH, 'x', 1.0, 2.0)
+        self.assertEqual(recorder.stages, [DISPATCH])
+
+    def test_timed_without_hooks(self):
+        """Test timed only calls the function when nothing is hooked."""
+        self.assertFalse(HOOKS.enabled)
+        self.assertEqual(timed(XML_PARSE, 'x', int, '7'), 7)
+
+
+class StreamHooksTestCase(CameraTestCase):
+    """Test alert stream stages are reported."""
+
+    events = {"Motion": [1]}
+
+    def setUp(self):
+        super().setUp()
+        self.recorder = HOOKS.register(Recorder())
+
+    def tearDown(self):
+        HOOKS.clear()
+
+    def test_stream_stages(self):
+        """Test frame, parse, state update and dispatch are reported."""
+        self.camera.feed_stream(AlertStreamParser(), multipart(alert(1)))
+        self.assertEqual(self.recorder.stages,
+                         [FRAME, PARSE, STATE_UPDATE, DISPATCH, FRAME])
+        self.assertIs(self.recorder.calls[0][1], self.camera)
+        self.assertTrue(
+            self.camera.fetch_attributes("Motion", 1).state)
+
+
+class DeviceInfoHandler(BaseHTTPRequestHandler):
+    """Serve deviceInfo for any path."""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(DEVICE_INFO_XML)))
+        self.end_headers()
+        self.wfile.write(DEVICE_INFO_XML)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RequestHooksTestCase(unittest.TestCase):
+    """Test HTTP request stages are reported."""
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), DeviceInfoHandler)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.recorder = HOOKS.register(Recorder())
+
+    def tearDown(self):
+        HOOKS.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_isapi_request_stages(self):
+        """Test an ISAPIClient request reports every stage."""
+        client = ISAPIClient('127.0.0.1', port=self.server.server_port)
+        client._auth = MagicMock(side_effect=lambda request: request)
+        result = client.request(HTTPMethod.GET, '/ISAPI/System/deviceInfo')
+        client.close()
+        self.assertEqual(result['DeviceInfo']['deviceName'], 'Test')
+        self.assertEqual(self.recorder.stages, [
+            REQUEST_START, CONNECT, FIRST_BYTE, BODY_READ, XML_PARSE])
+        self.assertEqual(self.recorder.calls[1][1],
+                         '127.0.0.1:%d' % self.server.server_port)
+
+    def test_camera_request_stages(self):
+        """Test HikCamera requests report their stages."""
+        with patch("pyhik.hikvision.HikCamera.initialize"):
+            camera = HikCamera('127.0.0.1', port=self.server.server_port,
+                               usr='admin', pwd='pass')
+        camera.get_motion_detection()
+        self.assertEqual(self.recorder.stages[:5], [
+            REQUEST_START, CONNECT, FIRST_BYTE, BODY_READ, XML_PARSE])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.ingest module."""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pyhik.ingest import (
+    ACCEPT, DROP, HEARTBEAT, IngestFilter, raw_event_types)
+from pyhik.stream import AlertStreamParser
+from test.helpers import CameraTestCase
+from test.test_stream import alert, multipart
+
+
+def payload(event_type, state='active', channel=1):
+    """Return an alert payload with the given type and state."""
+    return alert(channel).replace(b'VMD', event_type.encode()) \
+        .replace(b'>active<', ('>%s<' % state).encode())
+
+
+class IngestFilterTestCase(unittest.TestCase):
+    """Test classifying alerts from their bytes."""
+
+    def test_default_actions(self):
+        """Test heartbeats, ongoing and unknown types are recognized."""
+        ingest = IngestFilter()
+        self.assertEqual(ingest.classify(payload('VMD')), ACCEPT)
+        self.assertEqual(ingest.classify(payload('videoloss', 'inactive')),
+                         HEARTBEAT)
+        self.assertEqual(ingest.classify(payload('videoloss')), ACCEPT)
+        self.assertEqual(ingest.classify(payload('duration')), DROP)
+        self.assertEqual(ingest.classify(payload('mystery')), DROP)
+        self.assertEqual(ingest.classify(b'<broken'), ACCEPT)
+
+    def test_memoryview_and_prefixes(self):
+        """Test memoryviews and namespace prefixed tags are classified."""
+        data = (b'<ns:EventNotificationAlert><ns:eventType> videoLoss '
+                b'</ns:eventType><ns:eventState>inactive</ns:eventState>'
+                b'</ns:EventNotificationAlert>')
+        self.assertEqual(IngestFilter().classify(memoryview(data)),
+                         HEARTBEAT)
+
+    def test_disabled(self):
+        """Test every check can be turned off."""
+        ingest = IngestFilter(heartbeats=False, ongoing=False, unknown=False)
+        for event in ('duration', 'mystery'):
+            self.assertEqual(ingest.classify(payload(event)), ACCEPT)
+        self.assertEqual(ingest.classify(payload('videoloss', 'inactive')),
+                         ACCEPT)
+
+    def test_ignore(self):
+        """Test ignored types are dropped, videoloss still feeds the dog."""
+        ingest = IngestFilter(ignore=['Tamper Detection', 'io', 'Video Loss'])
+        self.assertEqual(ingest.classify(payload('shelteralarm')), DROP)
+        self.assertEqual(ingest.classify(payload('IO')), DROP)
+        self.assertEqual(ingest.classify(payload('VMD')), ACCEPT)
+        self.assertEqual(ingest.classify(payload('videoloss')), HEARTBEAT)
+
+    def test_raw_event_types(self):
+        """Test names map to every raw type they come from."""
+        self.assertEqual(raw_event_types(['Tamper Detection', 'VMD', 'X']),
+                         {b'tamperdetection', b'shelteralarm', b'defocus',
+                          b'vmd', b'x'})
+
+
+class CameraIngestTestCase(CameraTestCase):
+    """Test the camera skips decoding filtered alerts."""
+
+    events = {"Motion": [1], "Video Loss": [1]}
+
+    def setUp(self):
+        super().setUp()
+        self.callback = MagicMock()
+        self.camera.add_update_callback(self.callback, "*.*.*")
+
+    def feed(self, *payloads):
+        self.camera.feed_stream(
+            AlertStreamParser(), b''.join(multipart(p) for p in payloads))
+
+    @patch("pyhik.hikvision.decode_alert")
+    def test_heartbeat_fast_path(self, mock_decode):
+        """Test heartbeats pet the watchdog without decoding."""
+        self.feed(payload('videoloss', 'inactive'), payload('duration'))
+        mock_decode.assert_not_called()
+        self.camera.watchdog.pet.assert_called_once_with()
+        self.assertEqual(self.camera.metrics.heartbeats, 1)
+        self.assertEqual(self.camera.metrics.filtered, 1)
+
+    def test_heartbeat_clears_active_video_loss(self):
+        """Test an inactive videoloss is decoded while Video Loss is on."""
+        self.feed(payload('videoloss', 'active'))
+        self.assertTrue(self.camera.fetch_attributes("Video Loss", 1).state)
+        self.feed(payload('videoloss', 'inactive'))
+        self.assertFalse(self.camera.fetch_attributes("Video Loss", 1).state)
+        self.assertEqual(self.callback.call_count, 2)
+        self.assertEqual(self.camera.metrics.heartbeats, 0)
+
+    def test_ignored_types(self):
+        """Test user ignored types never reach the event states."""
+        self.camera.ingest_filter = IngestFilter(ignore=['Motion'])
+        self.feed(payload('VMD'))
+        self.assertFalse(self.camera.fetch_attributes("Motion", 1).state)
+        self.callback.assert_not_called()
+
+    def test_failed_initialize(self):
+        """Test alerts to a camera whose initialize() failed are ignored."""
+        self.camera.event_states = None
+        self.feed(payload('videoloss', 'inactive'), payload('VMD'))
+        self.assertEqual(self.camera.metrics.heartbeats, 1)
+        self.assertEqual(self.camera.metrics.alerts, 2)
+        self.callback.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
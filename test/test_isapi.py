@@ -236,6 +236,28 @@ class TestISAPIClientRequests(unittest.TestCase):
         with self.assertRaises(ISAPINotFoundError):
             client.request(HTTPMethod.GET, "/ISAPI/nonexistent")
 
+    def test_request_metrics(self, mock_session_class):
+        """Test requests and failures are counted."""
+        session = mock_session_class.return_value
+        response = MagicMock()
+        response.status_code = 404
+        session.get.side_effect = [
+            response, requests.exceptions.ConnectionError("Failed")]
+
+        client = ISAPIClient(host="192.168.1.100")
+        client._auth = MagicMock()
+        with self.assertRaises(ISAPINotFoundError):
+            client.request(HTTPMethod.GET, "/ISAPI/nonexistent")
+        with self.assertRaises(ISAPIConnectionError):
+            client.request(HTTPMethod.GET, "/ISAPI/System/deviceInfo")
+
+        metrics = client.metrics
+        self.assertEqual(metrics.requests, 2)
+        self.assertEqual(metrics.failures, 2)
+        self.assertEqual(metrics.not_found, 1)
+        self.assertEqual(metrics.connection_errors, 1)
+        self.assertEqual(metrics.request_time.count, 2)
+
 
 @patch("pyhik.isapi.requests.Session")
 @patch("pyhik.isapi.xmltodict")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.journal module."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pyhik.hikvision import HikCamera
+from pyhik.journal import (
+    SOURCE_ALERT, SOURCE_STALE, EventJournal, journal_device)
+from pyhik.stream import AlertEvent
+from test.helpers import CameraTestCase
+
+
+class JournalTestCase(unittest.TestCase):
+    """Test writing and querying the journal."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'events.db')
+        self.journal = EventJournal(self.path, batch_size=2,
+                                    flush_interval=0.05)
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.directory)
+
+    def test_append_and_query(self):
+        """Test queued records are committed in batches and queryable."""
+        for i, (channel, state) in enumerate(
+                [(1, True), (2, True), (1, False), (1, True), (2, False)]):
+            self.journal.append('cam', 'Motion', channel, state, 1,
+                                timestamp=100.0 + i)
+        self.assertTrue(self.journal.flush(5))
+        self.assertEqual(self.journal.written, 5)
+        self.assertEqual(self.journal.depth, 0)
+
+        records = self.journal.query(device='cam', channel=1)
+        self.assertEqual([(r.time, r.state) for r in records],
+                         [(100.0, True), (102.0, False), (103.0, True)])
+        self.assertEqual(len(self.journal.query(start=101.0, end=103.0)), 2)
+        self.assertEqual(len(self.journal.query(limit=1)), 1)
+        self.assertEqual(self.journal.count('cam', 'Motion'), 3)
+        self.assertEqual(self.journal.count('cam', 'Motion', state=False), 2)
+        self.assertEqual(self.journal.count('cam', channel=2, state=None), 2)
+
+    def test_latest_states(self):
+        """Test the newest record per sensor is found."""
+        self.journal.append('cam', 'Motion', 1, True, timestamp=1.0)
+        self.journal.append('cam', 'Motion', 1, False, timestamp=2.0)
+        self.journal.append('other', 'Motion', 1, True, timestamp=3.0)
+        self.journal.flush(5)
+        latest = self.journal.latest_states('cam')
+        self.assertEqual(list(latest), [('Motion', 1)])
+        self.assertFalse(latest[('Motion', 1)].state)
+
+    def test_queue_bound(self):
+        """Test records beyond maxsize are dropped, not waited on."""
+        journal = EventJournal(os.path.join(self.directory, 'small.db'),
+                               flush_interval=60, maxsize=2)
+        try:
+            results = [journal.append('cam', 'Motion', 1, True)
+                       for _ in range(3)]
+        finally:
+            journal.close()
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(journal.dropped, 1)
+        # close() still commits what was queued
+        self.assertEqual(journal.written, 2)
+
+    def test_append_racing_close(self):
+        """Test a record appended while close() runs is written or dropped."""
+        class RacingJournal(EventJournal):
+            # The first check of _closed from append() lets close() run
+            racing = False
+
+            @property
+            def _closed(self):
+                closed = self.__dict__['_closed']
+                if self.racing:
+                    self.racing = False
+                    closer = threading.Thread(target=self.close)
+                    closer.start()
+                    closer.join(0.2)
+                    self.closer = closer
+                return closed
+
+            @_closed.setter
+            def _closed(self, value):
+                self.__dict__['_closed'] = value
+
+        journal = RacingJournal(os.path.join(self.directory, 'race.db'),
+                                flush_interval=60)
+        journal.racing = True
+        journal.append('cam', 'Motion', 1, True)
+        journal.closer.join(5)
+        self.assertEqual(journal.written + journal.dropped, 1)
+
+    def test_reopen(self):
+        """Test records survive closing and reopening the journal."""
+        self.journal.append('cam', 'Motion', 1, True)
+        self.journal.close()
+        self.journal = EventJournal(self.path)
+        self.assertEqual(self.journal.count(), 1)
+
+
+class CameraJournalTestCase(CameraTestCase):
+    """Test a camera journals alerts and restores its state."""
+
+    events = {"Motion": [1], "Line Crossing": [1]}
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.journal = EventJournal(os.path.join(self.directory, 'events.db'),
+                                    flush_interval=0.05)
+        self.camera.set_journal(self.journal)
+
+    def make_camera(self):
+        camera = super().make_camera()
+        camera.serial = "serial"
+        return camera
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.directory)
+
+    def test_alerts_journaled(self):
+        """Test processed alerts and stale expiries are journaled."""
+        self.camera.stale_timeout = 60
+        self.camera.stale_timeouts["Line Crossing"] = 0
+        self.camera.process_event(AlertEvent("VMD", "active", 1, 3, "t1"))
+        self.camera.process_event(AlertEvent("linedetection", "active", 1, 1))
+        self.camera.update_stale()
+        self.journal.flush(5)
+
+        records = self.journal.query(device="serial")
+        self.assertEqual(
+            [(r.event_type, r.state, r.source) for r in records],
+            [("Motion", True, SOURCE_ALERT),
+             ("Line Crossing", True, SOURCE_ALERT),
+             ("Line Crossing", False, SOURCE_STALE)])
+        self.assertEqual(records[0].count, 3)
+        self.assertEqual(records[0].device_time, "t1")
+
+    def test_restore(self):
+        """Test a new camera restores states without firing callbacks."""
+        self.camera.process_event(AlertEvent("VMD", "active", 1, 2))
+        self.journal.flush(5)
+
+        camera = self.make_camera()
+        callback = MagicMock()
+        camera.add_update_callback(callback, "*.*.*")
+        camera.set_journal(self.journal)
+        self.assertEqual(camera.restore_from_journal(), 1)
+        record = camera.fetch_attributes("Motion", 1)
+        self.assertTrue(record.state)
+        self.assertEqual(record.count, 2)
+        callback.assert_not_called()
+
+
+class JournalDeviceTestCase(unittest.TestCase):
+    """Test cameras journal under a name that survives restarts."""
+
+    @patch("pyhik.hikvision.requests.Session")
+    @patch("pyhik.hikvision.HikCamera.get_event_triggers")
+    @patch("pyhik.hikvision.HikCamera.get_device_info")
+    def test_stable_name(self, mock_info, mock_triggers, mock_session):
+        """Test the serial number is used, not a generated cam_id."""
+        mock_triggers.return_value = {}
+        mock_info.return_value = {"deviceName": "Test", "deviceID": "short",
+                                  "serialNumber": "DS-1"}
+        first = HikCamera(host="localhost")
+        second = HikCamera(host="localhost")
+        self.assertNotEqual(first.cam_id, second.cam_id)
+        self.assertEqual(journal_device(first), "DS-1")
+        self.assertEqual(journal_device(second), "DS-1")
+
+        mock_info.return_value = {"deviceName": "Test", "deviceID": "short"}
+        self.assertEqual(journal_device(HikCamera(host="localhost")),
+                         "localhost")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.metrics module."""
+
+import unittest
+
+from pyhik.dispatch import DispatchExecutor
+from pyhik.metrics import (
+    Histogram, MetricsRegistry, REGISTRY, StreamMetrics, TIME_BUCKETS,
+    aggregate)
+from pyhik.stream import AlertEvent, AlertStreamParser
+from test.helpers import CameraTestCase
+from test.test_stream import alert, multipart
+
+
+class HistogramTestCase(unittest.TestCase):
+    """Test fixed bucket histograms."""
+
+    def test_observe(self):
+        """Test values land in the bucket of their upper bound."""
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.counts), [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 5.65)
+        self.assertEqual(list(histogram.cumulative()),
+                         [(0.1, 2), (1.0, 3), (float('inf'), 4)])
+
+    def test_quantile(self):
+        """Test quantiles are estimated by bucket bounds."""
+        histogram = Histogram()
+        self.assertIsNone(histogram.quantile(0.5))
+        for _ in range(99):
+            histogram.observe(0.0002)
+        histogram.observe(3.0)
+        self.assertEqual(histogram.quantile(0.5), 0.00025)
+        self.assertEqual(histogram.quantile(1.0), 5.0)
+
+    def test_merge_and_reset(self):
+        """Test merging and clearing histograms."""
+        first, second = Histogram(), Histogram()
+        first.observe(0.001)
+        second.observe(0.001)
+        second.observe(100.0)
+        first.merge(second)
+        self.assertEqual(first.count, 3)
+        self.assertEqual(first.counts[len(TIME_BUCKETS)], 1)
+        first.reset()
+        self.assertEqual(first.count, 0)
+        self.assertEqual(first.sum, 0.0)
+
+
+class RegistryTestCase(unittest.TestCase):
+    """Test aggregation of many cameras' metrics."""
+
+    def test_aggregate(self):
+        """Test counters and histograms are summed."""
+        registry = MetricsRegistry()
+        first = registry.register(StreamMetrics('a'))
+        second = registry.register(StreamMetrics('b'))
+        first.alerts = 3
+        second.alerts = 4
+        second.reconnects = 1
+        first.parse_time.observe(0.001)
+        second.parse_time.observe(0.002)
+
+        total = registry.aggregate()
+        self.assertEqual(total.alerts, 7)
+        self.assertEqual(total.reconnects, 1)
+        self.assertEqual(total.parse_time.count, 2)
+        self.assertEqual(aggregate([first]).alerts, 3)
+
+    def test_unreferenced_metrics_dropped(self):
+        """Test metrics of discarded cameras are no longer tracked."""
+        registry = MetricsRegistry()
+        registry.register(StreamMetrics('gone'))
+        kept = registry.register(StreamMetrics('kept'))
+        self.assertEqual(list(registry), [kept])
+        registry.unregister(kept)
+        self.assertEqual(len(registry), 0)
+
+
+class CameraMetricsTestCase(CameraTestCase):
+    """Test a camera updates its metrics while processing the stream."""
+
+    events = {"Motion": [1, 2]}
+
+    def setUp(self):
+        super().setUp()
+        self.camera.add_update_callback(lambda msg: None, "*.*.*")
+
+    def test_stream_counters(self):
+        """Test bytes, alerts, errors and callbacks are counted."""
+        data = multipart(alert(1)) + multipart(b'<a><b></a>') \
+            + multipart(alert(2).replace(b'VMD', b'mystery'))
+        self.camera.feed_stream(AlertStreamParser(), data)
+
+        metrics = self.camera.metrics
+        self.assertEqual(metrics.bytes_read, len(data))
+        self.assertEqual(metrics.alerts, 3)
+        self.assertEqual(metrics.parse_errors, 1)
+        # The ingest filter drops the unknown type before decoding
+        self.assertEqual(metrics.filtered, 1)
+        self.assertEqual(metrics.unknown_sensors, 0)
+        self.assertEqual(metrics.callbacks, 1)
+        self.assertEqual(metrics.parse_time.count, 1)
+        self.assertEqual(metrics.callback_time.count, 1)
+        self.assertEqual(metrics.event_age.count, 1)
+
+    def test_unknown_sensors_without_filter(self):
+        """Test unknown types are counted once decoded."""
+        self.camera.ingest_filter = None
+        self.camera.feed_stream(AlertStreamParser(), multipart(
+            alert(2).replace(b'VMD', b'mystery')))
+        self.assertEqual(self.camera.metrics.unknown_sensors, 1)
+        self.assertEqual(self.camera.metrics.parse_time.count, 1)
+
+    def test_stale_and_watchdog(self):
+        """Test stale expiries and watchdog fires are counted."""
+        self.camera.stale_timeout = 0
+        self.camera.process_event(AlertEvent("VMD", "active", 1, 1))
+        self.camera.update_stale()
+        self.camera.watchdog_handler()
+        self.assertEqual(self.camera.metrics.stale_expiries, 1)
+        self.assertEqual(self.camera.metrics.watchdog_fires, 1)
+        self.assertEqual(self.camera.metrics.callbacks, 2)
+
+    def test_event_age_with_executor(self):
+        """Test callbacks on a dispatch executor record their queue time."""
+        executor = DispatchExecutor()
+        self.camera.dispatch_executor = executor
+        try:
+            self.camera.process_event(AlertEvent("VMD", "active", 2, 1))
+        finally:
+            executor.shutdown()
+        self.assertEqual(self.camera.metrics.callbacks, 1)
+        self.assertEqual(self.camera.metrics.event_age.count, 1)
+
+    def test_registered(self):
+        """Test the camera's metrics are part of the aggregate."""
+        self.assertIn(self.camera.metrics, list(REGISTRY))
+        self.assertEqual(self.camera.metrics.name, "localhost")
+
+
+if __name__ == '__main__':
+    unittest.main()
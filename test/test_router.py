@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.router module."""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pyhik.hikvision import HikCamera
+from pyhik.router import CallbackRouter, SensorEvent, parse_sensor
+
+
+class SensorEventTestCase(unittest.TestCase):
+    """Test the typed sensor event."""
+
+    def test_legacy_message(self):
+        """Test the event reads as the legacy message string."""
+        event = SensorEvent('ABC123', 'Motion', 2)
+        self.assertEqual(event, 'ABC123.Motion.2')
+        self.assertEqual(event.event_type, 'Motion')
+        self.assertEqual(event.channel, 2)
+        self.assertEqual(event.signal, 'ValueChanged.ABC123')
+        self.assertEqual(event.sender, 'Motion.2')
+
+    def test_parse_sensor(self):
+        """Test subscriptions are split into keys."""
+        self.assertEqual(parse_sensor('0.Line Crossing.1'),
+                         ('0', 'Line Crossing', 1))
+        self.assertEqual(parse_sensor('*.*.*'), ('*', '*', '*'))
+        with self.assertRaises(ValueError):
+            parse_sensor('Motion')
+
+
+class CallbackRouterTestCase(unittest.TestCase):
+    """Test routing events to subscriptions."""
+
+    def setUp(self):
+        self.router = CallbackRouter()
+        self.event = SensorEvent('cam', 'Motion', 1)
+
+    def test_exact(self):
+        """Test exact subscriptions only match their sensor."""
+        callback = MagicMock()
+        self.router.add(callback, 'cam.Motion.1')
+        self.router.route(SensorEvent('cam', 'Motion', 2))
+        callback.assert_not_called()
+        self.assertEqual(self.router.route(self.event), 1)
+        callback.assert_called_once_with(self.event)
+
+    def test_wildcards(self):
+        """Test per camera, event type and channel wildcards."""
+        calls = []
+        for sensor in ('cam.*.*', '*.Motion.*', '*.*.1', 'other.*.*',
+                       '*.Tamper Detection.*', 'cam.Motion.1'):
+            self.router.add(lambda msg, s=sensor: calls.append(s), sensor)
+        self.router.route(self.event)
+        self.assertEqual(calls, ['cam.*.*', '*.Motion.*', '*.*.1',
+                                 'cam.Motion.1'])
+
+    def test_string_message(self):
+        """Test plain message strings still route."""
+        callback = MagicMock()
+        self.router.add(callback, 'cam.Motion.1')
+        self.router.route('cam.Motion.1')
+        callback.assert_called_once_with('cam.Motion.1')
+
+    def test_remove(self):
+        """Test removing a callback from one or all sensors."""
+        callback = MagicMock()
+        other = MagicMock()
+        self.router.add(callback, 'cam.Motion.1')
+        self.router.add(callback, '*.*.*')
+        self.router.add(other, 'cam.Motion.1')
+        self.assertEqual(self.router.remove(callback, 'cam.Motion.1'), 1)
+        self.assertEqual(len(self.router), 2)
+        self.assertEqual(self.router.remove(callback), 1)
+        self.router.route(self.event)
+        callback.assert_not_called()
+        other.assert_called_once_with(self.event)
+
+
+class CameraRoutingTestCase(unittest.TestCase):
+    """Test cameras publishing typed events."""
+
+    @patch("pyhik.hikvision.requests.Session")
+    @patch("pyhik.hikvision.HikCamera.initialize")
+    def test_publish_changes(self, mock_init, mock_session):
+        """Test callbacks receive one cached SensorEvent per sensor."""
+        camera = HikCamera(host="localhost")
+        camera.inject_events({"Motion": [1]})
+        events = []
+        camera.add_update_callback(events.append, "0.*.*")
+        camera.publish_changes("Motion", 1)
+        camera.publish_changes("Motion", 1)
+        self.assertEqual(events, ["0.Motion.1", "0.Motion.1"])
+        self.assertIsInstance(events[0], SensorEvent)
+        self.assertIs(events[0], events[1])
+        self.assertEqual(camera.remove_update_callback(events.append), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
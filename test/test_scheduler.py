@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.scheduler module."""
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from pyhik.scheduler import DeadlineScheduler, get_scheduler
+from pyhik.stream import AlertEvent
+from test.helpers import CameraTestCase
+
+
+class DeadlineSchedulerTestCase(unittest.TestCase):
+    """Test the deadline scheduler."""
+
+    def setUp(self):
+        self.scheduler = DeadlineScheduler()
+        self.fired = []
+        self.event = threading.Event()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def callback(self, name):
+        def fire():
+            self.fired.append((name, time.monotonic()))
+            self.event.set()
+        return fire
+
+    def test_call_later(self):
+        """Test calls fire in deadline order."""
+        self.scheduler.call_later(0.04, self.callback('b'))
+        self.scheduler.call_later(0.02, self.callback('a'))
+        time.sleep(0.1)
+        self.assertEqual([name for name, _ in self.fired], ['a', 'b'])
+
+    def test_cancel(self):
+        """Test cancelled calls never fire."""
+        call = self.scheduler.call_later(0.02, self.callback('a'))
+        call.cancel()
+        time.sleep(0.05)
+        self.assertEqual(self.fired, [])
+        self.assertFalse(call.active)
+
+    def test_postpone(self):
+        """Test a postponed call fires at its new deadline only once."""
+        start = time.monotonic()
+        call = self.scheduler.call_later(0.02, self.callback('a'))
+        call.reschedule(start + 0.08)
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertTrue(self.event.wait(1))
+        time.sleep(0.05)
+        self.assertEqual(len(self.fired), 1)
+        self.assertGreaterEqual(self.fired[0][1] - start, 0.08)
+
+    def test_reschedule_earlier(self):
+        """Test moving a call to an earlier deadline."""
+        start = time.monotonic()
+        call = self.scheduler.call_later(10, self.callback('a'))
+        call.reschedule(start + 0.02)
+        self.assertTrue(self.event.wait(1))
+        time.sleep(0.02)
+        self.assertEqual(len(self.fired), 1)
+
+    def test_reschedule_after_fire(self):
+        """Test a fired call can be reused."""
+        call = self.scheduler.call_later(0.01, self.callback('a'))
+        self.assertTrue(self.event.wait(1))
+        self.event.clear()
+        call.reschedule(time.monotonic() + 0.01)
+        self.assertTrue(self.event.wait(1))
+        self.assertEqual(len(self.fired), 2)
+
+    def test_shared_instance(self):
+        """Test all cameras share one scheduler."""
+        self.assertIs(get_scheduler(), get_scheduler())
+
+
+class StaleExpiryTestCase(CameraTestCase):
+    """Test timer driven expiry of stale events."""
+
+    events = {"Motion": [1], "Line Crossing": [1]}
+
+    def setUp(self):
+        super().setUp()
+        self.inactive = threading.Event()
+        self.camera.add_update_callback(
+            lambda msg: None if self.camera.fetch_attributes("Motion", 1)[0]
+            else self.inactive.set(), "0.Motion.1")
+
+    def active(self, event_type="VMD"):
+        self.camera.process_event(
+            AlertEvent(event_type, "active", 1, 1))
+
+    def test_expires_without_new_events(self):
+        """Test an active event goes inactive on a quiet stream."""
+        self.camera.stale_timeout = 0.05
+        self.active()
+        self.assertTrue(self.camera.fetch_attributes("Motion", 1)[0])
+        self.assertTrue(self.inactive.wait(1))
+        self.assertFalse(self.camera.fetch_attributes("Motion", 1)[0])
+
+    def test_refresh_postpones_expiry(self):
+        """Test repeated active alerts keep the event active."""
+        self.camera.stale_timeout = 0.1
+        for _ in range(4):
+            self.active()
+            time.sleep(0.04)
+        self.assertTrue(self.camera.fetch_attributes("Motion", 1)[0])
+        self.assertTrue(self.inactive.wait(1))
+
+    def test_inactive_alert_cancels_expiry(self):
+        """Test an explicit inactive alert stops the timer."""
+        self.camera.stale_timeout = 0.05
+        self.active()
+        self.camera.process_event(AlertEvent("VMD", "inactive", 1, 0))
+        self.inactive.clear()
+        time.sleep(0.1)
+        self.assertFalse(self.inactive.is_set())
+
+    def test_per_event_type_window(self):
+        """Test expiry windows can be set per event type."""
+        self.camera.stale_timeout = 0.05
+        self.camera.stale_timeouts = {"Line Crossing": 10}
+        self.active("linedetection")
+        self.active()
+        self.assertTrue(self.inactive.wait(1))
+        self.assertTrue(self.camera.fetch_attributes("Line Crossing", 1)[0])
+
+    def test_callbacks_off_scheduler_thread(self):
+        """Test a slow expiry callback does not hold up other timers."""
+        threads = []
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow(msg):
+            if not self.camera.fetch_attributes("Motion", 1).state:
+                threads.append(threading.current_thread().name)
+                started.set()
+                release.wait(5)
+
+        self.camera.add_update_callback(slow, "0.Motion.1")
+        self.camera.stale_timeout = 0.05
+        self.active()
+        self.assertTrue(started.wait(1))
+        fired = threading.Event()
+        self.camera.scheduler.call_later(0.01, fired.set)
+        self.assertTrue(fired.wait(1))
+        release.set()
+        self.assertTrue(self.inactive.wait(1))
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], "pyhik-scheduler")
+
+    def test_cameras_share_publish_thread(self):
+        """Test timer changes of all cameras publish from one thread."""
+        threads = set()
+        done = threading.Semaphore(0)
+
+        def inactive(msg):
+            threads.add(threading.current_thread())
+            done.release()
+
+        for _ in range(3):
+            camera = self.make_camera()
+            camera.add_update_callback(inactive, "0.Motion.1")
+            camera.stale_timeout = 0.02
+            camera.process_event(AlertEvent("VMD", "active", 1, 1))
+            # The active alert publishes on this thread
+            self.assertTrue(done.acquire(timeout=1))
+        for _ in range(3):
+            self.assertTrue(done.acquire(timeout=1))
+        threads.discard(threading.current_thread())
+        self.assertEqual([thread.name for thread in threads],
+                         ["pyhik-publish-0"])
+
+    def test_update_stale_expires_due_entries(self):
+        """Test update_stale expires overdue events immediately."""
+        self.camera.scheduler.stop()
+        self.camera.scheduler = MagicMock(wraps=DeadlineScheduler())
+        self.camera.scheduler.time.return_value = 0.0
+        self.active()
+        self.camera.scheduler.time.return_value = 100.0
+        self.camera.update_stale()
+        self.assertFalse(self.camera.fetch_attributes("Motion", 1)[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
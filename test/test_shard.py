@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.shard module."""
+
+import functools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from pyhik.dispatch import get_publisher
+from pyhik.router import SensorEvent
+from pyhik.scheduler import get_scheduler
+from pyhik.shard import ShardEvent, ShardSupervisor, device_key
+from pyhik.state import EventStateRecord
+
+
+class FakeCamera(object):
+    """Camera publishing a few Motion changes as soon as it streams."""
+
+    def __init__(self, config):
+        if config.get('fail'):
+            raise ValueError('unreachable')
+        self.config = config
+        self.callbacks = []
+        self.record = None
+
+    def add_update_callback(self, callback, sensor):
+        self.callbacks.append(callback)
+
+    def fetch_attributes(self, event_type, channel):
+        return self.record
+
+    def start_stream(self):
+        marker = self.config.get('crash_marker')
+        if marker and not os.path.exists(marker):
+            open(marker, 'w').close()
+            os._exit(3)
+        for count in range(self.config.get('events', 3)):
+            self.record = EventStateRecord(count % 2 == 0, 1, count, None)
+            for callback in self.callbacks:
+                callback(SensorEvent(self.config['host'], 'Motion', 1))
+
+    def begin_disconnect(self):
+        pass
+
+    def join_stream(self, timeout=None):
+        return True
+
+
+class TimerCamera(FakeCamera):
+    """Camera publishing one change from a timer, like stale expiry."""
+
+    def start_stream(self):
+        get_scheduler().call_later(0.01, functools.partial(
+            get_publisher().submit, self.config['host'], self.fire))
+
+    def fire(self):
+        self.record = EventStateRecord(False, 1, 1, None)
+        for callback in self.callbacks:
+            callback(SensorEvent(self.config['host'], 'Motion', 1))
+
+
+class Collector(object):
+    """Thread-safe list of received ShardEvents."""
+
+    def __init__(self):
+        self.events = []
+        self.cond = threading.Condition()
+
+    def __call__(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def wait_for(self, count, timeout=10):
+        with self.cond:
+            return self.cond.wait_for(lambda: len(self.events) >= count,
+                                      timeout)
+
+    def devices(self):
+        return sorted({event.device for event in self.events})
+
+
+class ShardSupervisorTestCase(unittest.TestCase):
+    """Test running cameras in worker processes."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.collector = Collector()
+
+    def supervisor(self, configs, factory=FakeCamera, **kwargs):
+        supervisor = ShardSupervisor(configs, factory=factory,
+                                     batch_interval=0.01, **kwargs)
+        supervisor.add_callback(self.collector)
+        supervisor.start()
+        self.addCleanup(supervisor.stop)
+        return supervisor
+
+    def test_device_key(self):
+        """Test devices are named by key, falling back to host."""
+        self.assertEqual(device_key({'host': '10.0.0.1'}), '10.0.0.1')
+        self.assertEqual(device_key({'host': 'x', 'key': 'gate'}), 'gate')
+
+    def test_events_merged(self):
+        """Test changes of every worker reach the parent callbacks."""
+        configs = [{'host': 'cam%d' % index} for index in range(5)]
+        supervisor = self.supervisor(configs, workers=2)
+
+        self.assertTrue(self.collector.wait_for(15))
+        self.assertEqual(supervisor.workers, 2)
+        self.assertEqual(sorted(sum(supervisor.assignments().values(), [])),
+                         ['cam%d' % index for index in range(5)])
+        self.assertEqual(self.collector.devices(),
+                         ['cam%d' % index for index in range(5)])
+        event = self.collector.events[0]
+        self.assertIsInstance(event, ShardEvent)
+        self.assertEqual(event.event_type, 'Motion')
+        self.assertEqual(supervisor.events_received, 15)
+        by_device = [(event.state, event.count)
+                     for event in self.collector.events
+                     if event.device == 'cam0']
+        self.assertEqual(by_device, [(True, 0), (False, 1), (True, 2)])
+
+    def test_failed_device(self):
+        """Test devices that cannot be started are reported."""
+        supervisor = self.supervisor(
+            [{'host': 'good'}, {'host': 'bad', 'fail': True}], workers=1)
+        self.assertTrue(self.collector.wait_for(3))
+        deadline = time.monotonic() + 5
+        while 'bad' not in supervisor.failed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(supervisor.failed, {'bad': 'unreachable'})
+
+    def test_restart(self):
+        """Test a dead worker is restarted with its devices."""
+        marker = os.path.join(self.directory, 'crashed')
+        supervisor = self.supervisor(
+            [{'host': 'flaky', 'crash_marker': marker}], workers=1)
+
+        self.assertTrue(self.collector.wait_for(3))
+        self.assertEqual(supervisor.restarts, 1)
+        self.assertEqual(supervisor.assignments(), {0: ['flaky']})
+
+    def test_reassign(self):
+        """Test devices of a retired worker move to the others."""
+        marker = os.path.join(self.directory, 'crashed')
+        configs = [{'host': 'flaky', 'crash_marker': marker},
+                   {'host': 'steady'}]
+        supervisor = self.supervisor(configs, workers=2, max_restarts=0)
+
+        self.assertTrue(self.collector.wait_for(6))
+        self.assertEqual(supervisor.restarts, 0)
+        self.assertEqual(supervisor.workers, 1)
+        self.assertEqual(supervisor.assignments(), {1: ['steady', 'flaky']})
+        self.assertEqual(self.collector.devices(), ['flaky', 'steady'])
+
+    def test_timers_in_forked_worker(self):
+        """Test timers fire in workers forked after the parent used them."""
+        started = threading.Event()
+        get_scheduler().call_later(0, functools.partial(
+            get_publisher().submit, 'parent', started.set))
+        self.assertTrue(started.wait(5))
+
+        self.supervisor([{'host': 'timed'}], factory=TimerCamera, workers=1,
+                        context=multiprocessing.get_context('fork'))
+        self.assertTrue(self.collector.wait_for(1))
+        self.assertEqual(self.collector.devices(), ['timed'])
+
+    def test_closed_pipe_dropped(self):
+        """Test a worker's closed events pipe is not polled again."""
+        supervisor = ShardSupervisor([{'host': 'cam'}], factory=FakeCamera,
+                                     workers=1)
+        worker = supervisor._workers[0]
+        worker.events, events_send = multiprocessing.Pipe(duplex=False)
+        events_send.close()
+        # A sentinel that never becomes ready, as if the process hung
+        sentinel, idle = multiprocessing.Pipe(duplex=False)
+        self.addCleanup(idle.close)
+        self.addCleanup(sentinel.close)
+        worker.process = MagicMock(sentinel=sentinel)
+        receive = MagicMock(wraps=supervisor._receive)
+        supervisor._receive = receive
+
+        thread = threading.Thread(target=supervisor._supervise)
+        thread.start()
+        time.sleep(0.2)
+        supervisor._stopping.set()
+        thread.join(5)
+        self.assertEqual(receive.call_count, 1)
+        self.assertIsNone(worker.events)
+        worker.process.terminate.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
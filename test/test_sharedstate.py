@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.sharedstate module."""
+
+import multiprocessing
+import time
+import unittest
+from unittest.mock import patch
+
+from pyhik.sharedstate import (
+    HEADER_SIZE, SharedState, SharedStateReader, SharedStateTable, _SEQ)
+from pyhik.stream import AlertEvent
+from test.helpers import CameraTestCase
+
+
+def read_in_child(name, queue):
+    """Read one state from another process."""
+    with SharedStateReader(name) as reader:
+        queue.put(tuple(reader.get('cam', 'Motion', 1)))
+
+
+class SharedStateTableTestCase(unittest.TestCase):
+    """Test writing and reading the shared table."""
+
+    def setUp(self):
+        self.table = SharedStateTable(capacity=4)
+        self.addCleanup(self.table.unlink)
+        self.addCleanup(self.table.close)
+        self.reader = SharedStateReader(self.table.name)
+        self.addCleanup(self.reader.close)
+
+    def test_write_and_read(self):
+        """Test states written by the owner are read back."""
+        self.table.write('cam', 'Motion', 1, True, 3, 100.0)
+        self.table.write('cam', 'Motion', '2', False)
+
+        self.assertEqual(self.reader.get('cam', 'Motion', '1'),
+                         SharedState(True, 3, 100.0))
+        self.assertIsNone(self.reader.get('cam', 'Motion', 2).count)
+        self.assertIsNone(self.reader.get('cam', 'Tamper', 1))
+
+        self.table.write('cam', 'Motion', 1, False, 4, 101.0)
+        self.assertEqual(self.reader.get('cam', 'Motion', 1),
+                         SharedState(False, 4, 101.0))
+        self.assertEqual(len(self.table), 2)
+
+    def test_states(self):
+        """Test listing every state, or those of a device."""
+        self.table.write('a', 'Motion', 1, True, 1, 1.0)
+        self.table.write('b', 'Motion', 1, False, 0, 2.0)
+        self.assertEqual(set(self.reader.states()),
+                         {('a', 'Motion', 1), ('b', 'Motion', 1)})
+        self.assertEqual(self.reader.states('b'),
+                         {('b', 'Motion', 1): SharedState(False, 0, 2.0)})
+
+    def test_capacity_and_long_keys(self):
+        """Test sensors beyond capacity or key size are dropped."""
+        for channel in range(5):
+            self.table.write('cam', 'Motion', channel, True)
+        self.table.write('x' * 200, 'Motion', 1, True)
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(self.table.dropped, 2)
+
+    def test_busy_slot(self):
+        """Test a slot left mid-write is not returned half written."""
+        self.table.write('cam', 'Motion', 1, True)
+        self.reader.refresh()
+        offset = self.reader._slots[('cam', 'Motion', 1)]
+        _SEQ.pack_into(self.table._buf, offset, 3)
+        with patch('pyhik.sharedstate.SEQLOCK_RETRIES', 10):
+            with self.assertRaises(RuntimeError):
+                self.reader.get('cam', 'Motion', 1)
+
+    def test_not_a_table(self):
+        """Test attaching to shared memory without a table header fails."""
+        other = SharedStateTable(capacity=1)
+        self.addCleanup(other.unlink)
+        self.addCleanup(other.close)
+        other._buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        with self.assertRaises(ValueError):
+            SharedStateReader(other.name)
+
+    def test_other_process(self):
+        """Test a reader in another process sees the owner's writes."""
+        self.table.write('cam', 'Motion', 1, True, 7, 5.0)
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=read_in_child, args=(self.table.name, queue))
+        process.start()
+        self.assertEqual(queue.get(timeout=10), (True, 7, 5.0))
+        process.join(10)
+        # The table survives the reader exiting
+        self.assertTrue(self.reader.get('cam', 'Motion', 1).state)
+
+
+class CameraSharedStateTestCase(CameraTestCase):
+    """Test a camera mirrors its states into the table."""
+
+    events = {"Motion": [1, 2]}
+
+    def setUp(self):
+        super().setUp()
+        self.camera.serial = 'gate'
+        self.table = SharedStateTable(capacity=8)
+        self.reader = SharedStateReader(self.table.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.table.close()
+        self.table.unlink()
+
+    def test_mirrored(self):
+        """Test current states are written at once and then updated."""
+        self.camera.set_shared_state(self.table)
+        self.assertEqual(set(self.reader.states('gate')),
+                         {('gate', 'Motion', 1), ('gate', 'Motion', 2)})
+        self.assertFalse(self.reader.get('gate', 'Motion', 1).state)
+
+        self.camera.process_event(AlertEvent("VMD", "active", 1, 5))
+        state = self.reader.get('gate', 'Motion', 1)
+        self.assertTrue(state.state)
+        self.assertEqual(state.count, 5)
+
+        self.camera.stale_timeout = 0.01
+        self.camera.process_event(AlertEvent("VMD", "active", 2, 1))
+        self.assertTrue(self.reader.get('gate', 'Motion', 2).state)
+        deadline = time.monotonic() + 5
+        while self.reader.get('gate', 'Motion', 2).state \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(self.reader.get('gate', 'Motion', 2).state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Run the public APIs against the virtual NVR simulator."""
+
+import datetime
+import time
+import unittest
+
+import requests
+
+from benchmarks.nvr_simulator import (
+    AUTH_BASIC, FAIL_ERROR, SimulatorThread, make_devices)
+from pyhik.constants import CAM_DEVICE, NVR_DEVICE
+from pyhik.hikvision import HikCamera, get_video_channels
+from pyhik.isapi import ISAPIClient, ISAPIError
+
+
+class SimulatorTestCase(unittest.TestCase):
+    """Test HikCamera, ISAPIClient and get_video_channels end to end."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.devices = (make_devices(1, channels=4)
+                       + make_devices(1, channels=1, auth=AUTH_BASIC))
+        cls.simulator = SimulatorThread(cls.devices)
+        cls.nvr_port, cls.cam_port = cls.simulator.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.simulator.stop()
+
+    def camera(self, port):
+        return HikCamera('127.0.0.1', port, 'admin', 'password')
+
+    def test_nvr_digest(self):
+        """Test an NVR that only accepts digest authentication."""
+        camera = self.camera(self.nvr_port)
+        self.assertEqual(camera.get_name, 'Virtual DS0000001')
+        self.assertEqual(camera.get_type, NVR_DEVICE)
+        self.assertEqual(camera.fetch_attributes('Motion', 4)[1], 4)
+        self.assertTrue(camera.current_motion_detection_state)
+        self.assertTrue(camera.get_snapshot(2).startswith(b'\xff\xd8'))
+        camera.disable_motion_detection()
+        self.assertFalse(camera.get_motion_detection())
+        recordings = camera.search_recordings(
+            201, datetime.datetime(2026, 1, 1), datetime.datetime(2026, 1, 4))
+        self.assertEqual(len(recordings), 3)
+        channels = get_video_channels('127.0.0.1', self.nvr_port, 'admin',
+                                      'password')
+        self.assertEqual([ch.id for ch in channels], [1, 2, 3, 4])
+
+    def test_camera_basic(self):
+        """Test a camera that only accepts basic authentication."""
+        camera = self.camera(self.cam_port)
+        self.assertEqual(camera.get_type, CAM_DEVICE)
+        self.assertIsNotNone(camera.get_snapshot())
+        camera.start_stream()
+        time.sleep(0.2)
+        self.assertTrue(camera.disconnect())
+
+    def test_isapi_client(self):
+        """Test ISAPIClient endpoints."""
+        with ISAPIClient('127.0.0.1', self.nvr_port, 'admin',
+                         'password') as client:
+            self.assertEqual(client.get_device_serial(), 'DS0000001')
+            self.assertEqual(len(client.get_cameras()), 4)
+            self.assertEqual(len(client.get_input_ports()), 1)
+            client.set_output_state('1', True)
+            self.assertTrue(client.get_output_state('1'))
+            client.set_holiday_mode_enabled(True)
+            self.assertTrue(client.get_holiday_mode_enabled())
+            self.assertEqual(client.get_storage_devices()[0].type, 'HDD')
+
+    def test_wrong_password(self):
+        """Test bad credentials are rejected."""
+        client = ISAPIClient('127.0.0.1', self.nvr_port, 'admin', 'nope')
+        with self.assertRaises(ISAPIError):
+            client.get_device_info()
+        client.close()
+
+    def test_failure_injection(self):
+        """Test injected failures reach the client."""
+        device = self.devices[0]
+        device.fail_paths = ('/ISAPI/System/deviceInfo',)
+        device.failure_mode = FAIL_ERROR
+        try:
+            response = requests.get(
+                'http://127.0.0.1:%d/ISAPI/System/deviceInfo' % self.nvr_port,
+                timeout=5)
+            self.assertEqual(response.status_code, 500)
+        finally:
+            device.fail_paths = ()
+
+
+if __name__ == "__main__":
+    unittest.main()
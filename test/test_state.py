@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.state module."""
+
+import datetime
+import unittest
+
+from pyhik.state import EventStateRecord, EventStateTable
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0, 0)
+
+
+class EventStateRecordTestCase(unittest.TestCase):
+    """Test legacy list compatibility of state records."""
+
+    def test_sequence_access(self):
+        """Test records index and unpack like attribute lists."""
+        record = EventStateRecord(True, 3, 2, NOW)
+        self.assertEqual(record[0], True)
+        self.assertEqual(record[1], 3)
+        self.assertEqual(record[-1], NOW)
+        self.assertEqual(record[1:3], (3, 2))
+        state, channel, count, last_update = record
+        self.assertEqual((state, channel, count, last_update),
+                         (True, 3, 2, NOW))
+        self.assertEqual(record, [True, 3, 2, NOW])
+        self.assertEqual(repr(record), repr([True, 3, 2, NOW]))
+
+    def test_item_assignment(self):
+        """Test legacy in-place updates reach the record fields."""
+        record = EventStateRecord(False, 1, 0, NOW)
+        record[0] = True
+        record[2] = 5
+        self.assertTrue(record.state)
+        self.assertEqual(record.count, 5)
+        with self.assertRaises(IndexError):
+            record[4] = None
+
+
+class EventStateTableTestCase(unittest.TestCase):
+    """Test the indexed event state table."""
+
+    def test_add_and_lookup(self):
+        """Test records are found by event type and channel."""
+        table = EventStateTable()
+        motion = table.add("Motion", 1)
+        table.add("Motion", 2)
+        table.add("Line Crossing", 1)
+
+        self.assertIs(table.lookup("Motion", 1), motion)
+        self.assertIs(table.lookup("Motion", "1"), motion)
+        self.assertIsNone(table.lookup("Motion", 3))
+        self.assertIsNone(table.lookup("Motion", None))
+        self.assertIsNone(table.lookup("Unknown", 1))
+
+    def test_add_does_not_duplicate(self):
+        """Test adding a tracked channel returns the existing record."""
+        table = EventStateTable()
+        first = table.add("Motion", 1, last_update=NOW)
+        self.assertIs(table.add("Motion", 1, state=True), first)
+        self.assertFalse(first.state)
+        self.assertEqual(len(table["Motion"]), 1)
+
+    def test_legacy_dict_view(self):
+        """Test the table reads like the legacy dictionary."""
+        table = EventStateTable.from_dict({
+            "Motion": [[False, 1, 0, NOW], [True, 2, 1, NOW]],
+            "I/O": [],
+        })
+        self.assertEqual(sorted(table), ["I/O", "Motion"])
+        self.assertIn("Motion", table)
+        self.assertEqual(table["I/O"], [])
+        self.assertEqual(table.get("Missing"), None)
+        self.assertEqual(dict(table), {
+            "Motion": [[False, 1, 0, NOW], [True, 2, 1, NOW]],
+            "I/O": [],
+        })
+        self.assertTrue(table.lookup("Motion", 2).state)
+
+    def test_records(self):
+        """Test iterating over every tracked record."""
+        table = EventStateTable()
+        table.add("Motion", 1)
+        table.add("Line Crossing", 4)
+        self.assertEqual(
+            sorted((event, record.channel) for event, record in table.records()),
+            [("Line Crossing", 4), ("Motion", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.stream module."""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+from pyhik.hikvision import HikCamera
+from pyhik.stream import (
+    AlertDecoder, AlertEvent, AlertStreamParser, SMALL_ALERT_SIZE,
+    decode_alert, iter_stream_chunks)
+
+ALERT_XML = (
+    b'<EventNotificationAlert version="2.0" '
+    b'xmlns="http://www.hikvision.com/ver20/XMLSchema">\r\n'
+    b'<channelID>{channel}</channelID>\r\n'
+    b'<eventType>VMD</eventType>\r\n'
+    b'<eventState>active</eventState>\r\n'
+    b'<activePostCount>1</activePostCount>\r\n'
+    b'</EventNotificationAlert>\r\n'
+)
+
+
+def alert(channel=1):
+    """Return a single alert payload."""
+    return ALERT_XML.replace(b'{channel}', str(channel).encode())
+
+
+def multipart(payload, length=True):
+    """Wrap a payload in a multipart part."""
+    headers = b'--boundary\r\nContent-Type: application/xml; charset="UTF-8"\r\n'
+    if length:
+        headers += b'Content-Length: %d\r\n' % len(payload)
+    return headers + b'\r\n' + payload + b'\r\n'
+
+
+def collect(parser, *chunks):
+    """Feed chunks and return a list of (content_type, bytes) parts."""
+    parts = []
+    for chunk in chunks:
+        for content_type, payload in parser.feed(chunk):
+            parts.append((content_type, bytes(payload)))
+    return parts
+
+
+class AlertStreamParserTestCase(unittest.TestCase):
+    """Test framing of the multipart alertStream body."""
+
+    def test_content_length_parts(self):
+        """Test parts framed by Content-Length."""
+        parser = AlertStreamParser()
+        data = multipart(alert(1)) + multipart(alert(2))
+        parts = collect(parser, data)
+
+        self.assertEqual([p for _, p in parts], [alert(1), alert(2)])
+        self.assertEqual(parts[0][0], b'application/xml; charset="utf-8"')
+        self.assertEqual(parser.buffered, 0)
+
+    def test_parts_without_content_length(self):
+        """Test parts framed by the closing alert tag."""
+        parser = AlertStreamParser()
+        parts = collect(parser, multipart(alert(3), length=False))
+
+        self.assertEqual(len(parts), 1)
+        self.assertEqual(parts[0][1], alert(3).rstrip())
+
+    def test_bare_xml(self):
+        """Test devices that send XML without multipart headers."""
+        parser = AlertStreamParser()
+        parts = collect(parser, alert(1) + alert(2))
+
+        self.assertEqual(len(parts), 2)
+        self.assertIsNone(parts[0][0])
+
+    def test_split_across_chunks(self):
+        """Test a stream split at every possible byte offset."""
+        data = multipart(alert(1)) + multipart(alert(2), length=False)
+        for size in (1, 2, 7, 64):
+            parser = AlertStreamParser()
+            chunks = [data[i:i + size] for i in range(0, len(data), size)]
+            parts = collect(parser, *chunks)
+            self.assertEqual(len(parts), 2, size)
+            self.assertEqual(parts[0][1], alert(1))
+
+    def test_short_content_length_falls_back_to_tag(self):
+        """Test a Content-Length that doesn't cover the whole alert."""
+        parser = AlertStreamParser()
+        payload = alert(4)
+        data = (b'--boundary\r\nContent-Type: application/xml\r\n'
+                b'Content-Length: 20\r\n\r\n' + payload)
+        parts = collect(parser, data)
+
+        self.assertEqual(len(parts), 1)
+        self.assertEqual(parts[0][1], payload.rstrip())
+
+    def test_payload_view_released(self):
+        """Test payload views are released before the buffer is reused."""
+        parser = AlertStreamParser()
+        views = []
+        for _, payload in parser.feed(multipart(alert(1))):
+            views.append(payload)
+        with self.assertRaises(ValueError):
+            bytes(views[0])
+        # Buffer can still be resized after views were handed out
+        self.assertEqual(len(collect(parser, multipart(alert(2)))), 1)
+
+    def test_reset_discards_partial_part(self):
+        """Test reset drops a partially received part."""
+        parser = AlertStreamParser()
+        data = multipart(alert(1))
+        self.assertEqual(collect(parser, data[:40]), [])
+        parser.reset()
+        self.assertEqual(parser.buffered, 0)
+        self.assertEqual(len(collect(parser, data)), 1)
+
+    @patch("pyhik.stream.MAX_PART_SIZE", 256)
+    def test_unterminated_part_dropped(self):
+        """Test XML that never closes is dropped at the next boundary."""
+        parser = AlertStreamParser()
+        head = (b'--boundary\r\nContent-Type: application/xml\r\n\r\n'
+                b'<ResponseStatus>')
+        parts = collect(parser, head, *[b'<x>noise</x>\r\n'] * 100)
+        self.assertEqual(parts, [])
+        self.assertLessEqual(parser.buffered, 256 + 16)
+
+        parts = collect(parser, multipart(alert(2)))
+        self.assertEqual([p for _, p in parts], [alert(2)])
+        self.assertEqual(parser.buffered, 0)
+
+    @patch("pyhik.stream.MAX_PART_SIZE", 256)
+    def test_oversized_content_length_skipped(self):
+        """Test an XML part declaring too large a length is not buffered."""
+        parser = AlertStreamParser()
+        payload = large_alert(1)
+        data = multipart(payload)
+        self.assertEqual(collect(parser, data[:1024]), [])
+        self.assertEqual(parser.buffered, 0)
+
+        parts = collect(parser, data[1024:], multipart(alert(2)))
+        self.assertEqual([p for _, p in parts], [alert(2)])
+
+
+class IterStreamChunksTestCase(unittest.TestCase):
+    """Test reading chunks from a streaming response."""
+
+    def test_read1(self):
+        """Test chunks are read with read1 until EOF."""
+        response = MagicMock()
+        response.raw.read1.side_effect = [b'abc', b'def', b'']
+        self.assertEqual(list(iter_stream_chunks(response, 1024)),
+                         [b'abc', b'def'])
+        response.raw.read1.assert_called_with(1024)
+
+    def test_iter_content_fallback(self):
+        """Test iter_content is used when read1 is unavailable."""
+        response = MagicMock()
+        response.raw = object()
+        response.iter_content.return_value = iter([b'abc'])
+        self.assertEqual(list(iter_stream_chunks(response, 1024)), [b'abc'])
+        response.iter_content.assert_called_once_with(chunk_size=1024)
+
+
+REGION = (b'<DetectionRegionList><DetectionRegionEntry>'
+          b'<regionID>1</regionID><channelID>99</channelID>'
+          b'</DetectionRegionEntry></DetectionRegionList>\r\n')
+
+
+def large_alert(channel=1):
+    """Return an alert bigger than SMALL_ALERT_SIZE with nested IDs."""
+    payload = alert(channel)
+    tail = payload.index(b'</EventNotificationAlert>')
+    regions = REGION * (SMALL_ALERT_SIZE // len(REGION) + 1)
+    return payload[:tail] + regions + payload[tail:]
+
+
+class DecodeAlertTestCase(unittest.TestCase):
+    """Test single pass alert decoding."""
+
+    def test_small_alert(self):
+        """Test decoding an alert via the tree path."""
+        event = decode_alert(memoryview(alert(7)))
+        self.assertEqual(event, AlertEvent(
+            'VMD', 'active', 7, 1, None,
+            'http://www.hikvision.com/ver20/XMLSchema'))
+
+    def test_large_alert_matches_tree(self):
+        """Test the pull parser path decodes like the tree path."""
+        payload = large_alert(5)
+        self.assertGreater(len(payload), SMALL_ALERT_SIZE)
+        self.assertEqual(decode_alert(payload),
+                         AlertEvent.from_tree(ET.fromstring(payload)))
+        self.assertEqual(decode_alert(payload).channel, 5)
+
+    def test_nested_ids_ignored(self):
+        """Test IDs nested below the root element are not used."""
+        payload = alert(1).replace(b'<channelID>1</channelID>', b'')
+        tail = payload.index(b'</EventNotificationAlert>')
+        payload = payload[:tail] + REGION + payload[tail:]
+        self.assertIsNone(AlertEvent.from_tree(ET.fromstring(payload)).channel)
+
+    def test_id_type_priority(self):
+        """Test channelID wins over other ID types regardless of order."""
+        payload = alert(3).replace(
+            b'<eventType>', b'<dynChannelID>9</dynChannelID><eventType>')
+        self.assertEqual(decode_alert(payload).channel, 3)
+
+    def test_blank_channel_id(self):
+        """Test both paths fall back to dynChannelID after a blank channelID."""
+        blank = (b'<dateTime>2026-01-01T00:00:00</dateTime>'
+                 b'<channelID></channelID>')
+        tail = b'<dynChannelID>3</dynChannelID></EventNotificationAlert>'
+        large = large_alert(1).replace(b'<channelID>1</channelID>', blank)
+        large = large.replace(b'</EventNotificationAlert>', tail)
+        small = alert(1).replace(b'<channelID>1</channelID>', blank)
+        small = small.replace(b'</EventNotificationAlert>', tail)
+        self.assertGreater(len(large), SMALL_ALERT_SIZE)
+        self.assertLessEqual(len(small), SMALL_ALERT_SIZE)
+        self.assertEqual(decode_alert(large).channel, 3)
+        self.assertEqual(decode_alert(small).channel, 3)
+
+    def test_decoder_stops_early(self):
+        """Test the decoder reports completion once fields are seen."""
+        payload = large_alert(2).replace(
+            b'<channelID>', b'<dateTime>2026-01-01T00:00:00</dateTime>'
+                            b'<channelID>')
+        head = payload[:payload.index(b'<DetectionRegionList>')]
+        decoder = AlertDecoder()
+        self.assertTrue(decoder.feed(head))
+        self.assertEqual(decoder.result().date_time, '2026-01-01T00:00:00')
+
+    def test_missing_fields(self):
+        """Test missing or invalid fields decode as None."""
+        payload = alert(1).replace(b'<activePostCount>1', b'<activePostCount>x')
+        event = decode_alert(payload.replace(b'<eventState>active</eventState>',
+                                             b''))
+        self.assertIsNone(event.state)
+        self.assertIsNone(event.count)
+
+    def test_parse_error(self):
+        """Test malformed XML raises ParseError."""
+        with self.assertRaises(ET.ParseError):
+            decode_alert(b'<EventNotificationAlert><eventType>')
+
+
+class FeedStreamTestCase(unittest.TestCase):
+    """Test feeding raw stream bytes through a camera."""
+
+    @patch("pyhik.hikvision.requests.Session")
+    @patch("pyhik.hikvision.HikCamera.initialize")
+    def test_feed_stream_processes_alerts(self, mock_init, mock_session):
+        """Test each framed XML alert is decoded and processed."""
+        camera = HikCamera(host="localhost")
+        camera.process_event = MagicMock()
+        parser = AlertStreamParser()
+        data = multipart(alert(1)) + (b'--boundary\r\nContent-Type: image/jpeg\r\n'
+                                      b'Content-Length: 8\r\n\r\n\xff\xd8binary\r\n')
+
+        camera.feed_stream(parser, data)
+
+        camera.process_event.assert_called_once()
+        self.assertEqual(camera.process_event.call_args[0][0].channel, 1)
+
+    @patch("pyhik.hikvision.requests.Session")
+    @patch("pyhik.hikvision.HikCamera.initialize")
+    def test_feed_stream_updates_state(self, mock_init, mock_session):
+        """Test framed alerts update event states and fire callbacks."""
+        camera = HikCamera(host="localhost")
+        camera.inject_events({"Motion": [1, 2]})
+        callback = MagicMock()
+        camera.add_update_callback(callback, "0.Motion.2")
+
+        camera.feed_stream(AlertStreamParser(), multipart(large_alert(2)))
+
+        self.assertFalse(camera.fetch_attributes("Motion", 1)[0])
+        self.assertTrue(camera.fetch_attributes("Motion", 2)[0])
+        callback.assert_called_once_with("0.Motion.2")
+
+
+if __name__ == "__main__":
+    unittest.main()
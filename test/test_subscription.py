@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.subscription module."""
+
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from pyhik.stream import AlertStreamParser
+from pyhik.subscription import EventRecord, Lagged, Subscription
+from test.helpers import CameraTestCase
+from test.test_stream import alert, multipart
+
+
+def record(channel=1, state=True):
+    """Return an EventRecord for a Motion alert."""
+    return EventRecord('Motion', channel, state, 1, None, 0.0)
+
+
+class SubscriptionTestCase(unittest.TestCase):
+    """Test the bounded subscription queue."""
+
+    def test_get_and_timeout(self):
+        """Test records come out in order and get times out."""
+        subscription = Subscription(4)
+        subscription.put(record(1))
+        subscription.put(record(2))
+        self.assertEqual(subscription.get(0).channel, 1)
+        self.assertEqual(subscription.get(0).channel, 2)
+        self.assertIsNone(subscription.get(0.01))
+
+    def test_lagged(self):
+        """Test a full queue drops the oldest and reports the loss."""
+        subscription = Subscription(2)
+        for channel in range(1, 6):
+            subscription.put(record(channel))
+
+        self.assertEqual(subscription.drain(), [
+            Lagged(3), record(4), record(5)])
+        self.assertEqual(subscription.dropped, 3)
+        self.assertEqual(subscription.received, 5)
+
+    def test_drain_limit(self):
+        """Test drain returns at most limit items without blocking."""
+        subscription = Subscription()
+        for channel in range(3):
+            subscription.put(record(channel))
+        self.assertEqual(len(subscription.drain(2)), 2)
+        self.assertEqual(len(subscription), 1)
+
+    def test_close(self):
+        """Test closing wakes a blocked reader after the queue drains."""
+        subscription = Subscription()
+        subscription.put(record())
+        threading.Timer(0.05, subscription.close).start()
+
+        self.assertEqual(list(subscription), [record()])
+        self.assertFalse(subscription.put(record()))
+
+    def test_async(self):
+        """Test async iteration with records put from another thread."""
+        async def consume():
+            subscription = Subscription(loop=asyncio.get_running_loop())
+
+            def produce():
+                for channel in range(3):
+                    subscription.put(record(channel))
+                subscription.close()
+
+            threading.Thread(target=produce).start()
+            return [item async for item in subscription]
+
+        self.assertEqual([item.channel for item in asyncio.run(consume())],
+                         [0, 1, 2])
+
+    def test_async_requires_loop(self):
+        """Test aget refuses a subscription without a loop."""
+        with self.assertRaises(RuntimeError):
+            asyncio.run(Subscription().aget())
+
+
+class CameraEventsTestCase(CameraTestCase):
+    """Test the events() and aevents() iterators of a camera."""
+
+    events = {"Motion": [1, 2]}
+
+    def setUp(self):
+        super().setUp()
+
+    def feed(self, *channels):
+        self.camera.feed_stream(
+            AlertStreamParser(),
+            b''.join(multipart(alert(channel)) for channel in channels))
+
+    def test_events(self):
+        """Test every processed alert is yielded as a record."""
+        # Subscribes on the first next()
+        self.assertIsNone(next(self.camera.events(timeout=0), None))
+        self.feed(1)
+        self.assertEqual(self.camera._subscriptions, ())
+
+        events = self.camera.events(timeout=0.5)
+        threading.Timer(0.05, self.feed, (1, 2, 2)).start()
+        first = next(events)
+        self.assertEqual(first[:5], ('Motion', 1, True, 1, None))
+        self.assertGreater(first.received, 0)
+        self.assertEqual([item.channel for item in events], [2, 2])
+        self.assertEqual(self.camera._subscriptions, ())
+
+    def test_events_lagged(self):
+        """Test a slow consumer is told how many records it lost."""
+        subscription = self.camera.subscribe(maxsize=2)
+        self.feed(1, 2, 1, 2)
+        self.assertEqual([getattr(item, 'channel', item)
+                          for item in subscription.drain()],
+                         [Lagged(2), 1, 2])
+        self.camera.unsubscribe(subscription)
+        self.assertTrue(subscription.closed)
+
+    def test_disconnect_ends_events(self):
+        """Test disconnecting closes open subscriptions."""
+        subscription = self.camera.subscribe()
+        self.camera.thrd = MagicMock(ident=None)
+        self.camera.disconnect()
+        self.assertTrue(subscription.closed)
+        self.assertEqual(self.camera._subscriptions, ())
+
+    def test_aevents(self):
+        """Test the async iterator receives alerts from the stream thread."""
+        async def consume():
+            events = self.camera.aevents()
+            first = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0)
+            threading.Thread(target=self.feed, args=(2,)).start()
+            item = await asyncio.wait_for(first, 5)
+            await events.aclose()
+            return item
+
+        self.assertEqual(asyncio.run(consume()).channel, 2)
+        self.assertEqual(self.camera._subscriptions, ())
+
+    def test_stale_expiry_record(self):
+        """Test stale expiry is reported without a device time."""
+        subscription = self.camera.subscribe()
+        self.camera.stale_timeout = 0.01
+        self.feed(1)
+        self.assertTrue(subscription.get(1).state)
+        expired = subscription.get(5)
+        self.assertFalse(expired.state)
+        self.assertIsNone(expired.device_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
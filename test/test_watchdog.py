@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Tests for pyhik.watchdog module."""
+
+import threading
+import time
+import unittest
+
+from pyhik.scheduler import DeadlineScheduler
+from pyhik.watchdog import Watchdog
+
+
+class WatchdogTestCase(unittest.TestCase):
+    """Test watchdogs on the shared scheduler."""
+
+    def setUp(self):
+        self.scheduler = DeadlineScheduler()
+        self.expired = threading.Event()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def watchdog(self, timeout):
+        return Watchdog(timeout, self.expired.set, scheduler=self.scheduler)
+
+    def test_expires(self):
+        """Test the handler runs once the timeout elapses."""
+        watchdog = self.watchdog(0.02)
+        watchdog.start()
+        self.assertTrue(self.expired.wait(1))
+
+    def test_pet_postpones(self):
+        """Test petting keeps the watchdog from expiring."""
+        watchdog = self.watchdog(0.08)
+        watchdog.start()
+        for _ in range(5):
+            time.sleep(0.03)
+            watchdog.pet()
+        self.assertFalse(self.expired.is_set())
+        self.assertTrue(self.expired.wait(1))
+
+    def test_pet_creates_no_threads(self):
+        """Test petting does not start threads or grow the heap."""
+        watchdog = self.watchdog(10)
+        watchdog.start()
+        threads = threading.active_count()
+        for _ in range(1000):
+            watchdog.pet()
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_stop(self):
+        """Test a stopped watchdog doesn't fire."""
+        watchdog = self.watchdog(0.02)
+        watchdog.start()
+        watchdog.stop()
+        time.sleep(0.05)
+        self.assertFalse(self.expired.is_set())
+
+    def test_restart_after_expiry(self):
+        """Test pet re-arms a watchdog that already fired or was stopped."""
+        watchdog = self.watchdog(0.02)
+        watchdog.start()
+        self.assertTrue(self.expired.wait(1))
+        self.expired.clear()
+        watchdog.pet()
+        self.assertTrue(self.expired.wait(1))
+        self.expired.clear()
+        watchdog.stop()
+        watchdog.pet()
+        self.assertTrue(self.expired.wait(1))
+
+    def test_many_watchdogs_one_thread(self):
+        """Test all watchdogs share the scheduler thread."""
+        count = threading.Event()
+        fired = []
+
+        def handler():
+            fired.append(1)
+            if len(fired) == 50:
+                count.set()
+
+        threads = threading.active_count()
+        watchdogs = [Watchdog(0.01, handler, scheduler=self.scheduler)
+                     for _ in range(50)]
+        for watchdog in watchdogs:
+            watchdog.start()
+        self.assertLessEqual(threading.active_count(), threads + 1)
+        self.assertTrue(count.wait(1))
+
+
+if __name__ == "__main__":
+    unittest.main()